@@ -0,0 +1,353 @@
+"""
+Offline ANPR over recorded footage: a video file or a folder of images, no UI, no camera.
+
+Usage:
+    python batch_anpr.py --input incident.mp4                          # -> incident_plates.csv
+    python batch_anpr.py --input incident.mp4 --every 5 --workers 4 --output plates.jsonl
+    python batch_anpr.py --input logs_images/ --batch 16
+    python batch_anpr.py --input gate1.mp4 --gate "Main Entrance" --start-time "2026-03-01 18:00:00" --backfill
+
+Runs the full pipeline (detector + filters + OCR of every plate) at maximum throughput:
+frames are decoded ahead on a separate thread and pushed through the detector in batches,
+and --workers N splits the input over N processes that share the memory-mapped weights.
+Every read becomes one row (source, frame, time_s, timestamp, plate, score, ocr_conf, box).
+The final summary (frames/s) doubles as the throughput benchmark for new hardware.
+
+--backfill also writes one entry_logs row per vehicle (same plate seen again within
+--event-gap seconds counts once), with the best crop saved to logs_images/ like the
+Entry Dialog does. Re-running the same backfill does not duplicate rows.
+Video timestamps are --start-time + offset; without it the start is estimated as the
+file's modification time minus its duration. Images use their modification time.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import queue
+import argparse
+import threading
+import logging
+import multiprocessing
+from datetime import datetime, timedelta
+import cv2
+from export_model import list_images
+from inference_backends import BACKENDS, PRECISIONS, TORCH_MODES
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # entry_logs.entry_time
+FIELDS = ["source", "frame", "time_s", "timestamp", "plate", "score", "ocr_conf", "x1", "y1", "x2", "y2"]
+
+_engine = None  # One AIEngine per worker process
+_engine_error = None  # Why it did not load (reported by process_chunk)
+
+
+# --- Work items ---
+
+def plan_video(path, workers, every, start_time=None):
+    """Split a video into frame ranges. Returns (chunks, start datetime)"""
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    if start_time is None:
+        # Recorders usually close the file when the clip ends
+        duration = total / fps if total > 0 else 0.0
+        start_time = datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=duration)
+
+    if total <= 0 or workers == 1:
+        ranges = [(0, None)]  # Unknown length (or no need to split): read straight through
+    else:
+        # Several chunks per worker keeps them all busy until the end; aligned to the sampling step
+        size = max(every * 64, total // (workers * 4))
+        size -= size % every
+        ranges = [(start, min(start + size, total)) for start in range(0, total, size)]
+
+    chunks = [{"kind": "video", "path": path, "start": start, "end": end, "every": every, "fps": fps,
+               "start_time": start_time} for start, end in ranges]
+    return chunks, start_time
+
+
+def plan_images(folder, chunk_size=64):
+    paths = list_images(folder)
+    return [{"kind": "images", "paths": paths[i:i + chunk_size], "first_index": i}
+            for i in range(0, len(paths), chunk_size)]
+
+
+def _read_chunk(chunk):
+    """Yields (source, frame index, time_s, datetime, frame) for one work item"""
+    if chunk["kind"] == "images":
+        for i, path in enumerate(chunk["paths"]):
+            frame = cv2.imread(path)
+            if frame is None:
+                logger.warning("Skipping unreadable image %s", path)
+                continue
+            yield os.path.basename(path), chunk["first_index"] + i, None, datetime.fromtimestamp(os.path.getmtime(path)), frame
+        return
+
+    cap = cv2.VideoCapture(chunk["path"])
+    index, end = chunk["start"], chunk["end"]
+    if index:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+    source = os.path.basename(chunk["path"])
+    try:
+        while end is None or index < end:
+            # Frames between samples are only grabbed (FFmpeg still decodes them), never converted to BGR
+            if not cap.grab():
+                break
+            if index % chunk["every"] == 0:
+                ret, frame = cap.retrieve()
+                if ret:
+                    offset = index / chunk["fps"]
+                    yield source, index, offset, chunk["start_time"] + timedelta(seconds=offset), frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def _prefetch(iterable, depth):
+    """Run the decoder on its own thread so it overlaps with inference"""
+    items = queue.Queue(maxsize=depth)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put(item)
+        finally:
+            items.put(done)
+
+    threading.Thread(target=produce, name="Decoder", daemon=True).start()
+    while True:
+        item = items.get()
+        if item is done:
+            return
+        yield item
+
+
+# --- Worker side ---
+
+def _init_worker(config):
+    """
+    Pool initializer (also called directly for --workers 1).
+    Never raises: the pool replaces a worker whose initializer failed, which fails the same way,
+    forever. The error is kept and raised by process_chunk, which the parent does see.
+    """
+    global _engine, _engine_error
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(processName)s | %(message)s")
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(config["num_threads"])
+        from detection_engine import AIEngine
+        engine = AIEngine(config["model"], backend=config["backend"], precision=config["precision"],
+                          torch_mode=config["torch_mode"], mmap_weights=config["workers"] > 1)
+        if engine.model is None:
+            raise RuntimeError(f"Could not load the detector from {config['model']}")
+        engine.warmup()
+        _engine = engine
+    except Exception as e:
+        logger.exception("Worker initialization failed")
+        _engine_error = str(e) or type(e).__name__
+
+
+def process_chunk(chunk, config):
+    """
+    Runs one work item through the pipeline.
+    Returns (rows, events, frames processed, seconds); events are only collected with --backfill.
+    """
+    if _engine is None:
+        raise RuntimeError(_engine_error or "Detector not loaded")
+    batch_size, roi = config["batch"], config["roi"]
+    rows, reads = [], []
+    frames = 0
+    start = time.perf_counter()
+
+    def flush(batch):
+        results = _engine.detect_and_read_all_batch([item[4] for item in batch], [roi] * len(batch))
+        for (source, index, offset, when, _), plates in zip(batch, results):
+            for plate in plates:
+                x1, y1, x2, y2 = plate["box"]
+                rows.append({"source": source, "frame": index,
+                             "time_s": round(offset, 3) if offset is not None else "",
+                             "timestamp": when.strftime(TIME_FORMAT), "plate": plate["text"],
+                             "score": round(plate["score"], 3), "ocr_conf": round(float(plate["ocr_conf"]), 3),
+                             "x1": x1, "y1": y1, "x2": x2, "y2": y2})
+                if config["backfill"]:
+                    reads.append((plate["text"], when, plate["score"], plate["crop"]))
+
+    batch = []
+    for item in _prefetch(_read_chunk(chunk), depth=2 * batch_size):
+        batch.append(item)
+        frames += 1
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    # Only one crop per vehicle travels back to the parent
+    events = group_events(reads, config["event_gap"]) if config["backfill"] else []
+    return rows, events, frames, time.perf_counter() - start
+
+
+def _run_chunk(args):
+    return process_chunk(*args)
+
+
+# --- Parent side ---
+
+def group_events(reads, gap):
+    """
+    reads: (plate, datetime, score, crop) - or events from group_events, to merge chunks.
+    Same plate again within `gap` seconds = same vehicle. Returns events
+    (plate, first seen, best score, best crop, last seen), ordered by first sighting.
+    """
+    events, open_events = [], {}
+    for read in sorted(reads, key=lambda r: r[1]):
+        plate, when, score, crop = read[:4]
+        last = read[4] if len(read) > 4 else when
+        event = open_events.get(plate)
+        if event is not None and (when - event[4]).total_seconds() <= gap:
+            if score > event[2]:
+                event[2], event[3] = score, crop
+            event[4] = max(event[4], last)
+            continue
+        event = [plate, when, score, crop, last]
+        open_events[plate] = event
+        events.append(event)
+    return [tuple(e) for e in events]
+
+
+def write_rows(rows, path):
+    if path.lower().endswith((".jsonl", ".json")):
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+    else:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def backfill(events, gate, status, save_folder="logs_images"):
+    """Best crop of every vehicle to logs_images/, one entry_logs row each"""
+    from database_manager import init_db, backfill_entry_logs
+    init_db()
+    os.makedirs(save_folder, exist_ok=True)
+    entries = []
+    for plate, when, score, crop, _ in events:
+        img_path = "BATCH_ENTRY"
+        if crop is not None:
+            # Same naming as the Entry Dialog: PLATENUMBER_YYYYMMDD_HHMMSS.jpg
+            full_path = os.path.join(save_folder, f"{plate}_{when.strftime('%Y%m%d_%H%M%S')}.jpg")
+            if cv2.imwrite(full_path, crop):
+                img_path = full_path
+        entries.append((plate, when.strftime(TIME_FORMAT), gate, img_path, status))
+    return backfill_entry_logs(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless ANPR over a video file or an image folder")
+    parser.add_argument("--input", required=True, help="Video file or folder of images (jpg/png)")
+    parser.add_argument("--output", help="CSV or .jsonl file (default: <input>_plates.csv)")
+    parser.add_argument("--model", default="./models/rtdetr_best")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--precision", default="fp32", choices=PRECISIONS)
+    parser.add_argument("--torch-mode", default="eager", choices=TORCH_MODES)
+    parser.add_argument("--batch", type=int, default=8, help="Frames per detector forward pass")
+    parser.add_argument("--workers", type=int, default=1, help="Processes (each gets an equal share of the cores)")
+    parser.add_argument("--every", type=int, default=1, help="Video: analyze every Nth frame")
+    parser.add_argument("--gate", default="Batch", help="Gate name for entry_logs; its ROI is used if configured")
+    parser.add_argument("--start-time", help="Video: wall-clock time of the first frame, 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--backfill", action="store_true", help="Also write one entry_logs row per vehicle")
+    parser.add_argument("--status", default="BACKFILL", help="entry_logs status for backfilled rows")
+    parser.add_argument("--event-gap", type=float, default=60.0,
+                        help="Backfill: seconds before the same plate counts as a new entry")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    # 1. Work items
+    workers = max(1, args.workers)
+    every = max(1, args.every)
+    if os.path.isdir(args.input):
+        chunks = plan_images(args.input)
+    else:
+        start_time = datetime.strptime(args.start_time, TIME_FORMAT) if args.start_time else None
+        try:
+            chunks, start_time = plan_video(args.input, workers, every, start_time)
+        except ValueError as e:
+            logger.error("%s", e)
+            return 1
+        logger.info("Video starts at %s", start_time.strftime(TIME_FORMAT))
+    if not chunks:
+        logger.error("Nothing to process in %s", args.input)
+        return 1
+    output = args.output or f"{os.path.splitext(args.input.rstrip(os.sep))[0]}_plates.csv"
+
+    # The gate's lane ROI, if it is a configured gate
+    from database_manager import DB_NAME, get_gate_settings
+    from gate_roi import parse_roi
+    roi = parse_roi(get_gate_settings(args.gate)["roi"]) if os.path.exists(DB_NAME) else None
+
+    from cpu_scheduler import available_cpus
+    workers = min(workers, len(chunks))
+    config = {"model": args.model, "backend": args.backend, "precision": args.precision,
+              "torch_mode": args.torch_mode, "batch": max(1, args.batch), "roi": roi, "workers": workers,
+              "num_threads": max(1, len(available_cpus()) // workers),
+              "backfill": args.backfill, "event_gap": args.event_gap}
+
+    # 2. Run (in-process for one worker, a process pool otherwise)
+    rows, events, frames, busy = [], [], 0, 0.0
+    start = time.perf_counter()
+
+    def collect(result):
+        nonlocal frames, busy
+        chunk_rows, chunk_events, chunk_frames, seconds = result
+        rows.extend(chunk_rows)
+        events.extend(chunk_events)
+        frames += chunk_frames
+        busy += seconds
+        logger.info("%d frames done (%.1f frames/s overall)", frames, frames / (time.perf_counter() - start))
+
+    try:
+        if workers == 1:
+            _init_worker(config)
+            start = time.perf_counter()  # Throughput without the model load
+            for chunk in chunks:
+                collect(process_chunk(chunk, config))
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            with ctx.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+                for result in pool.imap_unordered(_run_chunk, [(chunk, config) for chunk in chunks]):
+                    collect(result)
+    except RuntimeError as e:
+        # Leaving the with block terminates the remaining workers
+        logger.error("Batch run failed: %s", e)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    # 3. Output, in input order
+    rows.sort(key=lambda r: (r["source"], r["frame"]))
+    write_rows(rows, output)
+
+    summary = {"frames": frames, "reads": len(rows), "plates": len({r["plate"] for r in rows}),
+               "seconds": round(elapsed, 1), "fps": round(frames / max(elapsed, 1e-9), 2),
+               # Pipeline only (wall clock fps of a pool also includes loading the models)
+               "fps_per_worker": round(frames / max(busy, 1e-9), 2),
+               "workers": workers, "batch": config["batch"], "threads_per_worker": config["num_threads"]}
+    if args.backfill:
+        vehicles = group_events(events, args.event_gap)  # Vehicles can span chunk boundaries
+        summary["entries_backfilled"] = backfill(vehicles, args.gate, args.status)
+    logger.info("Wrote %d reads to %s", len(rows), output)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
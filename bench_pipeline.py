@@ -0,0 +1,254 @@
+"""
+Per-stage latency benchmark of the detection pipeline (CPU-only friendly).
+
+Usage:
+    python bench_pipeline.py --output bench.json                    # run, save as the baseline
+    python bench_pipeline.py --baseline bench.json                  # run, compare, exit 1 on regressions
+    python bench_pipeline.py --images samples/ --runs 50 --threads 4 --backend onnx
+
+Each stage is timed on its own, on synthetic 720p / 1080p frames with a drawn plate
+(and on the frames in --images, if given):
+    bgr_to_pil          cv2 BGR->RGB + PIL.Image (the original preprocessing)
+    hf_image_processor  RTDetrImageProcessor on that PIL image (the original preprocessing)
+    frame_preprocessor  FramePreprocessor (what the engine uses now)
+    model_forward       detector forward pass on the configured backend
+    hf_post_process     RTDetrImageProcessor.post_process_object_detection
+    post_process        post_process_detections (what the engine uses now)
+    filters             AIEngine._filter_candidates: geometric filters, crop, blur check
+    blur_check          Laplacian variance on one plate crop
+    upscale             INTER_CUBIC upscale of a small crop (PlateRecognizer.min_height)
+    ocr                 recognizer on one plate crop / ocr_batch4 on four
+Reported per stage: p50 / p95 / p99 / mean latency (ms) and throughput (calls/s), as JSON.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import logging
+from types import SimpleNamespace
+import cv2
+import numpy as np
+import torch
+from export_model import list_images
+from inference_backends import BACKENDS, PRECISIONS, TORCH_MODES
+logger = logging.getLogger(__name__)
+
+
+def plate_box(height, width):
+    """A plate-sized box, centered horizontally in the lower part of the frame"""
+    pw, ph = width // 6, width // 24
+    x1, y1 = (width - pw) // 2, int(height * 0.6)
+    return x1, y1, x1 + pw, y1 + ph
+
+
+def synthetic_frame(height, width, seed=0):
+    """Textured background with a sharp, readable plate near the center. Returns (frame, plate box)"""
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (7, 7), 0)
+    x1, y1, x2, y2 = plate_box(height, width)
+    pw, ph = x2 - x1, y2 - y1
+    cv2.rectangle(frame, (x1, y1), (x1 + pw, y1 + ph), (255, 255, 255), -1)
+    cv2.putText(frame, "MH12AB1234", (x1 + 4, y1 + int(ph * 0.75)), cv2.FONT_HERSHEY_SIMPLEX,
+                ph / 40, (0, 0, 0), 2)
+    return frame, (x1, y1, x1 + pw, y1 + ph)
+
+
+def synthetic_results(box):
+    """Detector output for the filter stage: the plate plus boxes each filter rejects"""
+    x1, y1, x2, y2 = box
+    boxes = [box,
+             (x1, y1, x1 + 20, y1 + 10),                     # too small
+             (x1, y1 - 100, x1 + 80, y2),                    # wrong aspect ratio
+             (5, y1, 5 + (x2 - x1), y2)]                     # outside the center band
+    return {"scores": torch.tensor([0.9, 0.8, 0.7, 0.6]), "labels": torch.zeros(4, dtype=torch.long),
+            "boxes": torch.tensor(boxes, dtype=torch.float32)}
+
+
+def time_stage(fn, runs, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    lat = np.array(samples)
+    mean = float(lat.mean())
+    return {"runs": len(samples),
+            "p50_ms": round(float(np.percentile(lat, 50)), 3),
+            "p95_ms": round(float(np.percentile(lat, 95)), 3),
+            "p99_ms": round(float(np.percentile(lat, 99)), 3),
+            "mean_ms": round(mean, 3),
+            "throughput_per_s": round(1000.0 / mean, 2) if mean > 0 else None}
+
+
+def bench_frame(engine, hf_processor, frame, box, runs, warmup):
+    """All frame-level stages on one frame. Returns {stage: samples}"""
+    from PIL import Image
+    from preprocessing import post_process_detections
+    stages = {}
+
+    stages["bgr_to_pil"] = time_stage(lambda: Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)), runs, warmup)
+    pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    stages["hf_image_processor"] = time_stage(lambda: hf_processor(images=pil_img, return_tensors="pt"), runs, warmup)
+    stages["frame_preprocessor"] = time_stage(lambda: engine.preprocessor([frame]), runs, warmup)
+
+    pixel_values, target_sizes = engine.preprocessor([frame])
+    pixel_values = pixel_values.clone()  # The preprocessor reuses its buffer
+    stages["model_forward"] = time_stage(lambda: engine.model(pixel_values), runs, warmup)
+
+    logits, pred_boxes = engine.model(pixel_values)
+    outputs = SimpleNamespace(logits=logits, pred_boxes=pred_boxes)
+    stages["hf_post_process"] = time_stage(
+        lambda: hf_processor.post_process_object_detection(outputs, target_sizes=target_sizes, threshold=0.5),
+        runs, warmup)
+    stages["post_process"] = time_stage(
+        lambda: post_process_detections(logits, pred_boxes, target_sizes, threshold=0.5), runs, warmup)
+
+    results = synthetic_results(box)
+    stages["filters"] = time_stage(lambda: engine._filter_candidates(frame, results), runs, warmup)
+    return stages
+
+
+def bench_crop(engine, crop, runs, warmup):
+    """Plate-level stages on one crop. Returns {stage: samples}"""
+    stages = {}
+
+    def blur():
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return cv2.Laplacian(gray, cv2.CV_64F).var()
+    stages["blur_check"] = time_stage(blur, runs, warmup)
+
+    # Same resize the recognizer applies to crops below its minimum height
+    min_height = engine.ocr.min_height
+    small = cv2.resize(crop, None, fx=(min_height - 6) / crop.shape[0], fy=(min_height - 6) / crop.shape[0],
+                       interpolation=cv2.INTER_AREA)
+    scale = min_height / small.shape[0]
+    stages["upscale"] = time_stage(
+        lambda: cv2.resize(small, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC), runs, warmup)
+
+    stages["ocr"] = time_stage(lambda: engine.read_plates([crop]), runs, warmup)
+    stages["ocr_batch4"] = time_stage(lambda: engine.read_plates([crop] * 4), runs, warmup)
+    return stages
+
+
+def run(args):
+    from transformers import RTDetrImageProcessor
+    from detection_engine import AIEngine
+
+    torch.set_num_threads(args.threads)
+    engine = AIEngine(args.model, backend=args.backend, precision=args.precision, torch_mode=args.torch_mode)
+    if engine.model is None:
+        raise RuntimeError("Could not load the detector")
+    hf_processor = RTDetrImageProcessor.from_pretrained(args.model)
+
+    # 1. Frames: synthetic (always, so runs are comparable everywhere) + optional samples
+    frames = []
+    for height, width in ((720, 1280), (1080, 1920)):
+        frame, box = synthetic_frame(height, width)
+        frames.append((f"synthetic_{width}x{height}", frame, box))
+    if args.images:
+        for path in list_images(args.images)[:args.max_images]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                # No ground truth: the filter stage uses a centered plate-sized box
+                frames.append((os.path.basename(path), frame, plate_box(*frame.shape[:2])))
+
+    # 2. Time every stage; samples of the same stage are pooled across frames of the same set
+    pooled = {}
+    for name, frame, box in frames:
+        logger.info("Benchmarking %s", name)
+        group = "synthetic" if name.startswith("synthetic") else "samples"
+        for stage, samples in bench_frame(engine, hf_processor, frame, box, args.runs, args.warmup).items():
+            key = f"{stage}@{name}" if group == "synthetic" else f"{stage}@samples"
+            pooled.setdefault(key, []).extend(samples)
+
+    x1, y1, x2, y2 = frames[0][2]
+    crop = frames[0][1][y1:y2, x1:x2].copy()
+    for stage, samples in bench_crop(engine, crop, args.runs, args.warmup).items():
+        pooled[stage] = samples
+
+    return {
+        "meta": {"timestamp": time.strftime("%Y-%m-%d %H:%M:%S"), "platform": platform.platform(),
+                 "processor": platform.processor() or platform.machine(), "cpus": os.cpu_count(),
+                 "python": platform.python_version(), "torch": torch.__version__, "opencv": cv2.__version__,
+                 "backend": engine.model.name, "precision": args.precision, "threads": args.threads,
+                 "runs": args.runs},
+        "stages": {key: summarize(samples) for key, samples in pooled.items()},
+    }
+
+
+def compare(report, baseline, threshold):
+    """Rows of (stage, baseline p50, current p50, ratio, regressed) for stages present in both"""
+    rows = []
+    for key, current in report["stages"].items():
+        old = baseline.get("stages", {}).get(key)
+        if not old or not old["p50_ms"]:
+            continue
+        ratio = current["p50_ms"] / old["p50_ms"]
+        rows.append((key, old["p50_ms"], current["p50_ms"], ratio, ratio > 1.0 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the detection pipeline")
+    parser.add_argument("--model", default="./models/rtdetr_best")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--precision", default="fp32", choices=PRECISIONS)
+    parser.add_argument("--torch-mode", default="eager", choices=TORCH_MODES)
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="torch intra-op threads")
+    parser.add_argument("--images", help="Optional folder of sample frames (jpg/png)")
+    parser.add_argument("--max-images", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=30, help="Timed calls per stage and frame")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", help="Write the report as JSON (use it later as --baseline)")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative p50 slowdown that counts as a regression (default 10%%)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    try:
+        report = run(args)
+    except RuntimeError as e:
+        logger.error("%s", e)
+        return 1
+
+    # Human readable table
+    print(f"{'stage':48} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'calls/s':>9}")
+    for key, r in report["stages"].items():
+        print(f"{key:48} {r['p50_ms']:9.3f} {r['p95_ms']:9.3f} {r['p99_ms']:9.3f} {r['throughput_per_s'] or 0:9.1f}")
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        report["comparison"] = {"baseline": args.baseline, "threshold": args.threshold,
+                                "stages": {key: {"baseline_p50_ms": old, "p50_ms": new, "ratio": round(ratio, 3),
+                                                 "regressed": regressed}
+                                           for key, old, new, ratio, regressed in rows}}
+        print(f"\nvs {args.baseline} ({baseline.get('meta', {}).get('timestamp', '?')}):")
+        for key, old, new, ratio, regressed in rows:
+            print(f"{key:48} {old:9.3f} -> {new:9.3f}  {ratio:5.2f}x{'  REGRESSION' if regressed else ''}")
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            logger.error("%d stage(s) slower than the baseline by more than %.0f%%: %s",
+                         len(regressions), args.threshold * 100, ", ".join(regressions))
+            status = 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import math
+from PyQt6.QtWidgets import QWidget, QFrame, QLabel, QVBoxLayout, QGridLayout, QSizePolicy
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import Qt, pyqtSignal
+
+
+class CameraTile(QFrame):
+    """One gate in the live view: name, stream status and the preview image."""
+
+    def __init__(self, gate_name, grid):
+        super().__init__()
+        self.gate_name = gate_name
+        self.grid = grid
+        self.setStyleSheet("background-color: black; border-radius: 8px; border: 2px solid #333;")
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(4, 4, 4, 4)
+        layout.setSpacing(2)
+
+        self.lbl_name = QLabel(gate_name)
+        self.lbl_name.setStyleSheet("color: white; font-weight: bold; border: none; padding: 2px;")
+        layout.addWidget(self.lbl_name)
+
+        self.lbl_video = QLabel("Waiting for camera...")
+        self.lbl_video.setStyleSheet("color: #666; border: none;")
+        self.lbl_video.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        # Ignored: the pixmap must not drive the layout (it is rendered to the label's size)
+        self.lbl_video.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
+        layout.addWidget(self.lbl_video, 1)
+        self.setLayout(layout)
+
+    def preview_size(self):
+        size = self.lbl_video.size()
+        return max(1, size.width()), max(1, size.height())
+
+    def set_image(self, qt_img):
+        self.lbl_video.setPixmap(QPixmap.fromImage(qt_img))
+
+    def set_status(self, status):
+        self.lbl_name.setText(f"{self.gate_name}  ·  {status}" if status else self.gate_name)
+
+    # Visibility / size changes tell the gate what to render (nothing while hidden)
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.grid.tile_changed(self)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.grid.tile_changed(self)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.grid.tile_changed(self)
+
+
+class CameraGrid(QWidget):
+    """
+    Live view with one tile per gate.
+
+    Producers (VideoThread / GateSupervisor) render previews on their own threads, so the
+    grid tells them what it needs through preview_changed(gate_name, fps, width, height):
+    fps is the configured cap while the tile is on screen and 0 while it is hidden (page
+    switched, window minimized), and width x height is the tile size to downscale to
+    before the colour conversion.
+    """
+    preview_changed = pyqtSignal(str, int, int, int)
+
+    def __init__(self, max_fps=10):
+        super().__init__()
+        self.max_fps = max_fps
+        self.tiles = {}
+        self._sent = {}  # gate_name -> last (fps, w, h) sent, to skip repeats during layout passes
+
+        self.layout_grid = QGridLayout()
+        self.layout_grid.setContentsMargins(0, 0, 0, 0)
+        self.layout_grid.setSpacing(6)
+        self.setLayout(self.layout_grid)
+
+    def set_gates(self, gate_names):
+        for tile in self.tiles.values():
+            self.layout_grid.removeWidget(tile)
+            tile.deleteLater()
+        self.tiles.clear()
+        self._sent.clear()
+
+        columns = max(1, math.ceil(math.sqrt(len(gate_names))))
+        for i, name in enumerate(gate_names):
+            tile = CameraTile(name, self)
+            self.tiles[name] = tile
+            self.layout_grid.addWidget(tile, i // columns, i % columns)
+
+    def set_max_fps(self, fps):
+        self.max_fps = fps
+        self.refresh()
+
+    def refresh(self):
+        """Re-send every tile's state (after the producers were (re)started)"""
+        self._sent.clear()
+        for tile in self.tiles.values():
+            self.tile_changed(tile)
+
+    def tile_changed(self, tile):
+        visible = tile.isVisible() and not self.window().isMinimized()
+        fps = self.max_fps if visible else 0
+        width, height = tile.preview_size()
+        state = (fps, width, height)
+        if self._sent.get(tile.gate_name) == state:
+            return
+        self._sent[tile.gate_name] = state
+        self.preview_changed.emit(tile.gate_name, fps, width, height)
+
+    # --- Slots for the producers' signals ---
+
+    def update_tile(self, preview, gate_name):
+        """preview: PreviewFrame (its buffer goes back to the producer's pool once drawn)"""
+        try:
+            tile = self.tiles.get(gate_name)
+            if tile is not None and tile.isVisible():
+                tile.set_image(preview.image)
+        finally:
+            preview.release()
+
+    def set_status(self, gate_name, status):
+        tile = self.tiles.get(gate_name)
+        if tile is not None:
+            tile.set_status(status)
@@ -2,10 +2,11 @@ import cv2
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
     QListWidget, QLineEdit, QMessageBox, QComboBox, 
-    QGroupBox, QFormLayout
+    QGroupBox, QFormLayout, QCheckBox, QDoubleSpinBox
 )
 from PyQt6.QtCore import QThread, pyqtSignal, Qt
-from database_manager import add_or_update_gate, get_all_gates, delete_gate
+from database_manager import add_or_update_gate, get_all_gates, delete_gate, get_gate_settings
+from gate_roi import parse_roi, format_roi
 
 class CameraScanner(QThread):
     found_signal = pyqtSignal(list)
@@ -47,7 +48,7 @@ class CameraSetupDialog(QDialog):
             
             QLabel { font-size: 13px; color: #ccc; }
             
-            QLineEdit, QComboBox, QListWidget { 
+            QLineEdit, QComboBox, QListWidget, QDoubleSpinBox { 
                 background-color: #3a3a3a; 
                 border: 1px solid #555; 
                 border-radius: 4px; 
@@ -77,6 +78,7 @@ class CameraSetupDialog(QDialog):
         
         self.list_gates = QListWidget()
         self.list_gates.setAlternatingRowColors(True)
+        self.list_gates.currentRowChanged.connect(self.fill_form_from_selection)
         self.layout_list.addWidget(self.list_gates)
 
         self.btn_delete = QPushButton("🗑 Remove Selected Gate")
@@ -115,8 +117,52 @@ class CameraSetupDialog(QDialog):
         self.combo_source = QComboBox()
         self.combo_source.setEditable(True) # Allow typing RTSP
         self.combo_source.setPlaceholderText("Select USB Camera or Type RTSP URL")
+        self.combo_source.setToolTip("USB index, rtsp:// URL, or a local video file (replayed in a loop)")
         self.form_layout.addRow("Camera Source:", self.combo_source)
 
+        # Stream options (see stream_reader.py)
+        self.combo_transport = QComboBox()
+        self.combo_transport.addItems(["TCP", "UDP"])
+        self.combo_transport.setToolTip("RTSP transport. UDP has less delay but drops packets on a busy network")
+        self.form_layout.addRow("RTSP Transport:", self.combo_transport)
+
+        self.spin_analysis_fps = QDoubleSpinBox()
+        self.spin_analysis_fps.setRange(0.0, 30.0)
+        self.spin_analysis_fps.setSingleStep(1.0)
+        self.spin_analysis_fps.setDecimals(1)
+        self.spin_analysis_fps.setSuffix(" fps")
+        self.spin_analysis_fps.setSpecialValueText("Unlimited")
+        self.spin_analysis_fps.setValue(5.0)
+        self.spin_analysis_fps.setToolTip("How many frames per second the AI looks at (the preview is not affected).\n"
+                                          "The stream is still decoded at the camera's frame rate: lower that in the\n"
+                                          "camera's encoder settings to save decoding CPU.")
+        self.form_layout.addRow("Analysis Rate:", self.spin_analysis_fps)
+
+        # Motion Gating (skip AI when the gate zone is static)
+        self.chk_motion = QCheckBox("Only run AI when motion is detected")
+        self.chk_motion.setChecked(True)
+        self.form_layout.addRow("Motion Gate:", self.chk_motion)
+
+        self.spin_motion = QDoubleSpinBox()
+        self.spin_motion.setRange(0.1, 50.0)
+        self.spin_motion.setSingleStep(0.5)
+        self.spin_motion.setSuffix(" % changed")
+        self.spin_motion.setValue(2.0)
+        self.spin_motion.setToolTip("Share of the gate zone that must change to wake up the detector")
+        self.form_layout.addRow("Sensitivity:", self.spin_motion)
+
+        # Lane ROI (the detector only sees this part of the frame)
+        self.txt_roi = QLineEdit()
+        self.txt_roi.setPlaceholderText("Full frame  (x1,y1;x2,y2 or polygon x,y;x,y;...)")
+        self.txt_roi.setToolTip("Coordinates are fractions of the frame (0.0 - 1.0)")
+        self.btn_roi = QPushButton("✏ Draw")
+        self.btn_roi.setStyleSheet("background-color: #555; color: white;")
+        self.btn_roi.clicked.connect(self.draw_roi)
+        roi_row = QHBoxLayout()
+        roi_row.addWidget(self.txt_roi)
+        roi_row.addWidget(self.btn_roi)
+        self.form_layout.addRow("Lane ROI:", roi_row)
+
         self.layout_form.addLayout(self.form_layout)
 
         # Spacer to push Save button to bottom
@@ -167,11 +213,29 @@ class CameraSetupDialog(QDialog):
         else:
             source = source_text # It's an RTSP URL
 
-        if add_or_update_gate(name, source):
+        motion_enabled = self.chk_motion.isChecked()
+        motion_threshold = self.spin_motion.value() / 100.0
+
+        roi_text = self.txt_roi.text().strip()
+        roi = parse_roi(roi_text)
+        if roi_text and roi is None:
+            QMessageBox.warning(self, "Error", "Invalid ROI. Use x1,y1;x2,y2 or x,y;x,y;x,y;... with values 0.0 - 1.0")
+            return
+
+        analysis_fps = self.spin_analysis_fps.value()
+        rtsp_transport = self.combo_transport.currentText().lower()
+
+        if add_or_update_gate(name, source, motion_enabled, motion_threshold, format_roi(roi),
+                              analysis_fps, rtsp_transport):
             QMessageBox.information(self, "Success", "Gate Configured!")
             self.load_gates()
             self.txt_name.clear()
             self.combo_source.setEditText("")
+            self.chk_motion.setChecked(True)
+            self.spin_motion.setValue(2.0)
+            self.txt_roi.clear()
+            self.combo_transport.setCurrentIndex(0)
+            self.spin_analysis_fps.setValue(5.0)
         else:
             QMessageBox.warning(self, "Error", "Failed to save. Name might be duplicate.")
 
@@ -181,6 +245,49 @@ class CameraSetupDialog(QDialog):
         for g_id, name, src in gates:
             self.list_gates.addItem(f"{g_id} | {name} | Source: {src}")
 
+    def fill_form_from_selection(self, row):
+        """Load the selected gate into the form so it can be edited and saved again"""
+        if row < 0:
+            return
+        _, name, src = self.list_gates.item(row).text().split(" | ", 2)
+        self.txt_name.setText(name)
+        self.combo_source.setEditText(src.replace("Source: ", "", 1))
+
+        settings = get_gate_settings(name)
+        self.chk_motion.setChecked(settings["motion_enabled"])
+        self.spin_motion.setValue(settings["motion_threshold"] * 100.0)
+        self.txt_roi.setText(settings["roi"])
+        self.combo_transport.setCurrentText(settings["rtsp_transport"].upper())
+        self.spin_analysis_fps.setValue(settings["analysis_fps"])
+
+    def draw_roi(self):
+        """Grab one frame from the source and let the user drag a rectangle over the lane"""
+        source_text = self.combo_source.currentText()
+        if "Index: " in source_text:
+            source_text = source_text.split("Index: ")[1]
+        if not source_text:
+            QMessageBox.warning(self, "Error", "Select a camera source first.")
+            return
+        source = int(source_text) if source_text.isdigit() else source_text
+
+        cap = cv2.VideoCapture(source)
+        ret, frame = cap.read()
+        cap.release()
+        if not ret:
+            QMessageBox.warning(self, "Error", "Could not read a frame from this source.")
+            return
+
+        # OpenCV's built-in selector: drag a box, ENTER/SPACE to confirm, C to cancel
+        window = "Draw lane ROI - ENTER to confirm, C to cancel"
+        x, y, w, h = cv2.selectROI(window, frame, showCrosshair=True)
+        cv2.destroyWindow(window)
+        if w == 0 or h == 0:
+            return
+
+        frame_h, frame_w = frame.shape[:2]
+        roi = parse_roi(f"{x / frame_w},{y / frame_h};{(x + w) / frame_w},{(y + h) / frame_h}")
+        self.txt_roi.setText(format_roi(roi))
+
     def remove_gate(self):
         row = self.list_gates.currentRow()
         if row >= 0:
@@ -0,0 +1,176 @@
+import os
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+
+def available_cpus():
+    """CPUs this process may run on (respects taskset / container cpusets)."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CoreScheduler:
+    """
+    Splits a fixed CPU core budget between the shared inference worker and the camera threads.
+
+    Without it every library sizes its thread pool to the whole machine, and N gates plus
+    torch/OpenCV pools oversubscribe the CPU. The plan:
+      - inference worker (RT-DETR + EasyOCR, torch): most of the budget as intra-op threads,
+        1 inter-op thread
+      - camera threads (capture, motion gate, preview): the rest, OpenCV sized to match
+      - optional pinning (Linux): inference on its own cores; gates with activity get a
+        dedicated capture core, idle gates share what is left. A gate is its analysis thread
+        (native_id) and its capture thread (capture_native_id, the FrameGrabber that grabs,
+        decodes and renders the preview); both are pinned. FFmpeg's decoder threads are
+        created by the capture thread when the stream opens and inherit its affinity, so a
+        gate sizes that pool with decode_threads() and registers again on every reconnect.
+    Rebalanced whenever gates are (re)started or a gate becomes active / idle. A motion
+    toggle only re-pins the gates (and logs at DEBUG) when the core assignment changed; the
+    thread pools are only resized when their sizes change.
+    """
+
+    def __init__(self, core_budget=0, pin_threads=False, capture_share=0.25):
+        self.capture_share = capture_share
+        self.inference = None    # InferenceService
+        self.gate_threads = []   # VideoThreads
+        self.active_gates = set()
+        self.plan = {}           # Last applied allocation (for logs / diagnostics)
+        self._lock = threading.RLock()
+        self.configure(core_budget, pin_threads, rebalance=False)
+
+    def configure(self, core_budget=0, pin_threads=False, rebalance=True):
+        """core_budget: number of cores to use, 0 = every available core"""
+        cpus = available_cpus()
+        budget = len(cpus) if core_budget <= 0 else min(int(core_budget), len(cpus))
+        with self._lock:
+            self.cpus = cpus[:budget]
+            if pin_threads and not hasattr(os, "sched_setaffinity"):
+                logger.warning("Thread pinning is not supported on this platform")
+            was_pinned = getattr(self, "pin_threads", False)
+            self.pin_threads = pin_threads and hasattr(os, "sched_setaffinity")
+            if was_pinned and not self.pin_threads:
+                # Give the threads back to the OS scheduler
+                for thread in [self.inference] + self.gate_threads:
+                    self._set_affinity(thread, cpus)
+            if rebalance:
+                self.rebalance(force=True)
+
+    def attach_inference(self, service):
+        with self._lock:
+            self.inference = service
+            self.rebalance(force=True)
+
+    def set_gates(self, threads):
+        """Called by start_all_cameras with the camera threads that are now running"""
+        with self._lock:
+            self.gate_threads = list(threads)
+            names = {t.gate_name for t in self.gate_threads}
+            self.active_gates &= names
+            self.rebalance(force=True)
+
+    def set_active(self, gate_name, active):
+        """A gate started / stopped seeing motion"""
+        with self._lock:
+            if active == (gate_name in self.active_gates):
+                return
+            if active:
+                self.active_gates.add(gate_name)
+            else:
+                self.active_gates.discard(gate_name)
+            self.rebalance(level=logging.DEBUG)  # Every passing car: keep it quiet
+
+    def thread_started(self, thread):
+        """Camera threads call this once their capture thread runs, and after every (re)connect"""
+        with self._lock:
+            self._pin(thread, self.plan.get("gates", {}).get(thread.gate_name))
+
+    def decode_threads(self):
+        """Decoder threads per gate (FFmpeg), matching the OpenCV share of the capture cores"""
+        with self._lock:
+            return self.plan.get("opencv_threads", 1)
+
+    def rebalance(self, force=False, level=logging.INFO):
+        """
+        Applies the current plan, skipping whatever did not change since the last one.
+        force: apply everything (new threads, new inference service, pinning switched on / off)
+        """
+        with self._lock:
+            plan, previous = self._compute_plan(), self.plan
+            if plan == previous and not force:
+                return
+            self.plan = plan
+
+            # 1. Thread pools (torch rebuilds its OpenMP pool on every resize)
+            pools = ("opencv_threads", "inference_threads")
+            if force or any(plan[key] != previous.get(key) for key in pools):
+                import cv2
+                cv2.setNumThreads(plan["opencv_threads"])
+                if self.inference is not None:
+                    self.inference.set_num_threads(plan["inference_threads"])
+
+            # 2. Affinity
+            if self.inference is not None and (force or plan["inference_cpus"] != previous.get("inference_cpus")):
+                self._pin(self.inference, plan["inference_cpus"])
+            previous_gates = previous.get("gates", {})
+            for thread in self.gate_threads:
+                cpus = plan["gates"].get(thread.gate_name)
+                if force or cpus != previous_gates.get(thread.gate_name):
+                    self._pin(thread, cpus)
+
+        logger.log(level, "CPU plan: %d cores, inference=%s, gates=%s, active=%s, opencv threads=%d",
+                   len(self.cpus), plan["inference_cpus"], plan["gates"],
+                   sorted(self.active_gates), plan["opencv_threads"])
+
+    def _compute_plan(self):
+        budget = len(self.cpus)
+        names = sorted(t.gate_name for t in self.gate_threads)
+
+        # 1. Capture side: a quarter of the budget, never more than one core per gate,
+        #    and inference always keeps at least one core of its own
+        capture = min(len(names), max(1, round(budget * self.capture_share))) if names else 0
+        capture = min(capture, budget - 1)
+        capture_cpus, inference_cpus = self.cpus[:capture], self.cpus[capture:]
+
+        # 2. Active gates first: a dedicated core each while there are enough,
+        #    idle gates (and active ones that did not get a core) share the rest
+        gates = {}
+        if capture_cpus:
+            active = [n for n in names if n in self.active_gates]
+            idle = [n for n in names if n not in self.active_gates]
+            dedicated = min(len(active), len(capture_cpus) - (1 if idle else 0))
+            shared = capture_cpus[dedicated:] or capture_cpus
+            for i, name in enumerate(active):
+                gates[name] = [capture_cpus[i]] if i < dedicated else shared
+            for name in idle:
+                gates[name] = shared
+        else:
+            # Single-core budget: everything shares it
+            gates = {name: list(self.cpus) for name in names}
+
+        # Every camera thread runs its own OpenCV calls; a parallel pool per call only adds contention
+        opencv_threads = max(1, len(capture_cpus) // max(1, len(names)))
+        return {
+            "inference_cpus": inference_cpus,
+            "inference_threads": max(1, len(inference_cpus)),
+            "gates": gates,
+            "opencv_threads": opencv_threads,
+        }
+
+    def _pin(self, thread, cpus):
+        if self.pin_threads:
+            self._set_affinity(thread, cpus)
+
+    def _set_affinity(self, thread, cpus):
+        if not cpus or thread is None:
+            return
+        # Camera threads: the analysis loop and its capture thread
+        for native_id in (getattr(thread, "native_id", None), getattr(thread, "capture_native_id", None)):
+            if native_id is None:
+                continue
+            try:
+                os.sched_setaffinity(native_id, cpus)
+            except OSError:
+                # Thread already exited (camera restarted) or CPU not allowed
+                logger.debug("Could not pin thread %s to %s", native_id, cpus, exc_info=True)
@@ -2,9 +2,12 @@ import sqlite3
 import hashlib
 from datetime import datetime
 import os
+from metrics import stage_histogram
 
 DB_NAME = "smartgate.db"
 
+_DB_WRITE = stage_histogram("db_write")  # Entry log inserts
+
 def init_db():
     """Initialize the database tables and default users."""
     conn = sqlite3.connect(DB_NAME)
@@ -58,6 +61,17 @@ def init_db():
                     is_active INTEGER DEFAULT 1
                 )''')
 
+    # Per-gate pipeline settings (added later, so older databases get the columns added)
+    _add_missing_columns(c, "gates", {
+        "motion_enabled": "INTEGER DEFAULT 1",      # Skip AI on static scenes
+        "motion_threshold": "REAL DEFAULT 0.02",    # Fraction of gate zone pixels that must change
+        "roi": "TEXT DEFAULT ''",                   # Lane region "x,y;x,y;..." (fractions), see gate_roi.py
+        # Frames/s sent to the AI (0 = as fast as it keeps up). Existing gates keep analysing every
+        # frame as before the column existed; new gates get 5 from add_or_update_gate
+        "analysis_fps": "REAL DEFAULT 0",
+        "rtsp_transport": "TEXT DEFAULT 'tcp'",     # 'tcp' or 'udp' for RTSP sources, see stream_reader.py
+    })
+
     # --- SEED USERS ---
     
     # A. Default Admin (admin / admin123)
@@ -78,6 +92,14 @@ def init_db():
     conn.commit()
     conn.close()
 
+def _add_missing_columns(c, table, columns):
+    """Simple migration: ALTER TABLE for every column that doesn't exist yet."""
+    c.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in c.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
 def check_login(username, password):
     """Verify credentials."""
     conn = sqlite3.connect(DB_NAME)
@@ -155,13 +177,35 @@ def add_new_resident(plate, name, flat, phone):
 
 def log_entry_event(plate, gate, image_path, status="INSIDE"):
     """Logs the entry into history"""
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("INSERT INTO entry_logs (plate_number, entry_time, gate_name, image_path, status) VALUES (?, ?, ?, ?, ?)",
-              (plate, now, gate, image_path, status))
-    conn.commit()
-    conn.close()
+    with _DB_WRITE.time():
+        conn = sqlite3.connect(DB_NAME)
+        c = conn.cursor()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        c.execute("INSERT INTO entry_logs (plate_number, entry_time, gate_name, image_path, status) VALUES (?, ?, ?, ?, ?)",
+                  (plate, now, gate, image_path, status))
+        conn.commit()
+        conn.close()
+
+def backfill_entry_logs(events):
+    """
+    Bulk insert of reprocessed entries (batch_anpr.py --backfill).
+    events: list of (plate, entry_time 'YYYY-MM-DD HH:MM:SS', gate, image_path, status)
+    Rows that already exist (same plate, gate and time) are skipped, so a re-run is harmless.
+    Returns the number of rows inserted.
+    """
+    with _DB_WRITE.time():
+        conn = sqlite3.connect(DB_NAME)
+        c = conn.cursor()
+        inserted = 0
+        for plate, entry_time, gate, image_path, status in events:
+            c.execute("""INSERT INTO entry_logs (plate_number, entry_time, gate_name, image_path, status)
+                         SELECT ?, ?, ?, ?, ?
+                         WHERE NOT EXISTS (SELECT 1 FROM entry_logs WHERE plate_number=? AND entry_time=? AND gate_name=?)""",
+                      (plate, entry_time, gate, image_path, status, plate, entry_time, gate))
+            inserted += c.rowcount
+        conn.commit()
+        conn.close()
+    return inserted
 
 def search_entry_logs(from_date=None, to_date=None, plate=None, flat=None, gate=None):
     """
@@ -214,13 +258,18 @@ def search_entry_logs(from_date=None, to_date=None, plate=None, flat=None, gate=
     return results 
     # Returns list of tuples: (time, flat, plate, image_path, gate)
 
-def add_or_update_gate(name, source):
+def add_or_update_gate(name, source, motion_enabled=True, motion_threshold=0.02, roi="",
+                       analysis_fps=5.0, rtsp_transport="tcp"):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
     try:
         # Insert or Replace
-        c.execute("INSERT OR REPLACE INTO gates (gate_name, camera_source, is_active) VALUES (?, ?, 1)", 
-                  (name, str(source)))
+        c.execute('''INSERT OR REPLACE INTO gates
+                     (gate_name, camera_source, is_active, motion_enabled, motion_threshold, roi,
+                      analysis_fps, rtsp_transport)
+                     VALUES (?, ?, 1, ?, ?, ?, ?, ?)''',
+                  (name, str(source), int(motion_enabled), float(motion_threshold), roi or "",
+                   float(analysis_fps), rtsp_transport))
         conn.commit()
         return True
     except Exception as e:
@@ -237,6 +286,24 @@ def get_all_gates():
     conn.close()
     return gates # List of (id, name, source)
 
+def get_gate_settings(gate_name):
+    """Per-gate pipeline settings as a dict (defaults if the gate is unknown)"""
+    settings = {"motion_enabled": True, "motion_threshold": 0.02, "roi": "",
+                "analysis_fps": 5.0, "rtsp_transport": "tcp"}
+    conn = sqlite3.connect(DB_NAME)
+    c = conn.cursor()
+    c.execute("""SELECT motion_enabled, motion_threshold, roi, analysis_fps, rtsp_transport
+                 FROM gates WHERE gate_name=?""", (gate_name,))
+    row = c.fetchone()
+    conn.close()
+    if row:
+        settings["motion_enabled"] = bool(row[0]) if row[0] is not None else True
+        settings["motion_threshold"] = row[1] if row[1] is not None else 0.02
+        settings["roi"] = row[2] or ""
+        settings["analysis_fps"] = row[3] if row[3] is not None else 0.0
+        settings["rtsp_transport"] = row[4] or "tcp"
+    return settings
+
 def delete_gate(gate_id):
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
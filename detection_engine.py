@@ -1,51 +1,189 @@
 import torch
 import cv2
 import easyocr
-import re
 import numpy as np
-from PIL import Image
-from transformers import RTDetrForObjectDetection, RTDetrImageProcessor
+from preprocessing import FramePreprocessor, post_process_detections
+from inference_backends import load_detector
+from gate_roi import roi_bounds, roi_contour
+from plate_ocr import PlateRecognizer
+from metrics import REGISTRY, stage_histogram
 import logging
 logger = logging.getLogger(__name__)
 
+_PREPROCESS = stage_histogram("preprocess")
+_INFERENCE = stage_histogram("inference")
+_OCR = stage_histogram("ocr")
+_REJECTED = {name: REGISTRY.counter("smartgate_detections_rejected_total", "Detections dropped by the plate filters",
+                                    filter=name)
+             for name in ("size", "aspect", "center", "blur")}
+_OCR_REJECTS = REGISTRY.counter("smartgate_ocr_rejects_total", "Plate crops without a valid read")
+
 
 class AIEngine:
-    def __init__(self, model_path="./models/rtdetr_best"):
+    def __init__(self, model_path="./models/rtdetr_best", backend="torch", precision="fp32", torch_mode="eager",
+                 mmap_weights=False, progress=None):
+        """
+        progress: optional callback(message, percent) used by the background model loader
+        mmap_weights: map model.safetensors instead of reading it (one shared copy across gate processes;
+                      torch fp32 only, see TorchDetector)
+        """
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        progress = progress or (lambda message, percent: None)
         
-        logger.info("AI Engine loading on: %s", self.device)
+        logger.info("AI Engine loading on: %s (requested backend: %s, %s)", self.device, backend, precision)
         
-        # 1. Load RT-DETR
+        # 1. Load RT-DETR (torch / onnx / openvino, falls back to torch)
+        progress("Loading plate detector...", 20)
         try:
-            self.processor = RTDetrImageProcessor.from_pretrained(model_path)
-            self.model = RTDetrForObjectDetection.from_pretrained(model_path).to(self.device)
-            logger.info("Custom RT-DETR model loaded")
+            self.preprocessor = FramePreprocessor(model_path)
+            self.model = load_detector(backend, model_path, self.device, precision=precision,
+                                       torch_mode=torch_mode, mmap_weights=mmap_weights)
+            logger.info("Custom RT-DETR model loaded (backend: %s)", self.model.name)
         except Exception as e:
             logger.exception("Failed to load RT-DETR")
             self.model = None
 
         # 2. Load EasyOCR
         # 'en' is usually sufficient for Indian plates (A-Z, 0-9)
-        self.reader = easyocr.Reader(['en'], gpu=(self.device == 'cuda'))
+        progress("Loading OCR...", 60)
+        # Recognizer only: RT-DETR already finds the plate, so the CRAFT text detector is never loaded
+        self.reader = easyocr.Reader(['en'], gpu=(self.device == 'cuda'), detector=False)
+        self.ocr = PlateRecognizer(self.reader)
         logger.info("EasyOCR loaded")
 
-    def detect_and_read(self, frame):
+    def warmup(self, frame_size=(720, 1280), runs=2):
+        """
+        Push dummy data through the detector and the recognizer once, so the first real
+        car doesn't pay for lazy allocations / kernel selection.
+        """
+        dummy_frame = np.zeros((frame_size[0], frame_size[1], 3), dtype=np.uint8)
+        dummy_plate = np.full((60, 240, 3), 255, dtype=np.uint8)
+        cv2.putText(dummy_plate, "MH12AB1234", (5, 42), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+        for _ in range(runs):
+            self.detect_plates_batch([dummy_frame])
+            self.read_plates([dummy_plate])
+
+    def self_test(self, runs=10):
         """
+        Speedup of the optimized PyTorch mode over eager fp32 (see TorchDetector.self_test).
+        Returns None for other backends / eager mode. Safe while the engine is serving:
+        the input is built here, not by the shared preprocessor (its buffers are reused).
+        """
+        if self.model is None or not hasattr(self.model, "self_test"):
+            return None
+        generator = torch.Generator().manual_seed(0)
+        pixel_values = torch.rand((1, 3, self.preprocessor.height, self.preprocessor.width), generator=generator)
+        return self.model.self_test(pixel_values, runs=runs)
+
+    def load_self_test(self):
+        """Self-test result saved by an earlier start (same torch build and weights), or None"""
+        if self.model is None or not hasattr(self.model, "load_self_test"):
+            return None
+        return self.model.load_self_test()
+
+    def detect_and_read(self, frame, roi=None):
+        """
+        roi: optional gate region (list of (x, y) fractions, see gate_roi.py)
         Returns: (detected_text, confidence, cropped_plate_image)
         """
-        if self.model is None: return None, 0, None
+        return self.detect_and_read_batch([frame], [roi])[0]
 
-        # 1. Preprocess for RT-DETR
-        pil_img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-        inputs = self.processor(images=pil_img, return_tensors="pt").to(self.device)
+    def detect_and_read_all(self, frame, roi=None):
+        """
+        Every valid plate in the frame (e.g. two lanes), not just the first.
+        Returns: list of candidate dicts (see detect_plates_batch) with "text" and "ocr_conf" added,
+                 best detector score first
+        """
+        return self.detect_and_read_all_batch([frame], [roi])[0]
+
+    def detect_and_read_all_batch(self, frames, rois=None):
+        """
+        detect_and_read_all for several frames: ONE detector pass, and every surviving
+        crop of every frame OCR'd in ONE recognizer batch.
+        """
+        return self.read_all_plates(self.detect_plates_batch(frames, rois))
+
+    def read_all_plates(self, all_candidates):
+        """
+        all_candidates: per-frame candidate lists from detect_plates_batch
+        Returns: per-frame lists of the candidates that produced a valid read (OCR'd in one batch)
+        """
+        flat = [c for candidates in all_candidates for c in candidates]
+        reads = iter(self.read_plates([c["crop"] for c in flat]))
 
-        # 2. Inference
-        with torch.no_grad():
-            outputs = self.model(**inputs)
+        results = []
+        for candidates in all_candidates:
+            plates = []
+            for candidate in candidates:
+                clean_text, ocr_conf, _ = next(reads)
+                if clean_text:
+                    plates.append(dict(candidate, text=clean_text, ocr_conf=ocr_conf))
+            results.append(plates)
+        return results
 
-        # 3. Post-process (Filter low confidence)
-        target_sizes = torch.tensor([pil_img.size[::-1]]).to(self.device)
-        results = self.processor.post_process_object_detection(outputs, target_sizes=target_sizes, threshold=0.5)[0]
+    def detect_and_read_batch(self, frames, rois=None):
+        """
+        Runs ONE RT-DETR forward pass over a list of frames (from any gates).
+        rois: optional list (one per frame) of gate regions; the detector only sees that region.
+        Returns: list of (detected_text, confidence, cropped_plate_image), one per frame
+        """
+        return [self.read_best_plate(candidates) for candidates in self.detect_plates_batch(frames, rois)]
+
+    def detect_plates_batch(self, frames, rois=None):
+        """
+        Detector + geometric/blur filters only (no OCR), ONE forward pass for all frames.
+        Returns: list (one per frame) of candidate lists, best score first. Each candidate is a dict:
+                 {"box": (x1, y1, x2, y2) in full-frame pixels, "score": float, "blur": float, "crop": ndarray}
+        """
+        if self.model is None or not frames: return [[] for _ in frames]
+        if rois is None: rois = [None] * len(frames)
+
+        # 0. Crop each frame to its gate ROI before preprocessing (numpy view, no copy).
+        # The lane fills the fixed 640x640 input, so small plates keep more pixels.
+        views, zones, offsets = [], [], []
+        for frame, roi in zip(frames, rois):
+            if roi:
+                frame_h, frame_w = frame.shape[:2]
+                x1, y1, x2, y2 = roi_bounds(roi, frame_w, frame_h)
+                views.append(frame[y1:y2, x1:x2])
+                zones.append(roi_contour(roi, frame_w, frame_h, offset=(x1, y1)))
+                offsets.append((x1, y1))
+            else:
+                views.append(frame)
+                zones.append(None)
+                offsets.append((0, 0))
+
+        # 1. Preprocess for RT-DETR (BGR ndarray -> preallocated float tensor, no PIL)
+        with _PREPROCESS.time():
+            pixel_values, target_sizes = self.preprocessor(views)
+
+        # 2. Inference (backend returns CPU tensors)
+        with _INFERENCE.time():
+            logits, pred_boxes = self.model(pixel_values)
+
+        # 3. Post-process (Filter low confidence). Boxes are rescaled on tensors.
+        batch_results = post_process_detections(logits, pred_boxes, target_sizes, threshold=0.5)
+
+        return [self._filter_candidates(view, results, zone, offset)
+                for view, results, zone, offset in zip(views, batch_results, zones, offsets)]
+
+    def read_best_plate(self, candidates):
+        """OCR all candidates in one batch and return the best-scored valid plate: (text, confidence, crop)"""
+        for candidate in candidates:
+            logger.info("Processing plate (conf=%.2f, blur=%.0f)", candidate["score"], candidate["blur"])
+        reads = self.read_plates([c["crop"] for c in candidates])
+        for candidate, (clean_text, _, _) in zip(candidates, reads):
+            if clean_text:
+                return clean_text, candidate["score"], candidate["crop"]
+        return None, 0, None
+
+    def _filter_candidates(self, frame, results, zone=None, offset=(0, 0)):
+        """
+        Applies the plate filters to the detections of a single frame.
+        zone: ROI polygon in this frame's pixel coordinates (replaces the center band check)
+        offset: position of this frame (ROI view) inside the full camera frame
+        """
+        candidates = []
 
         # Screen dimensions for Position Filter
         frame_h, frame_w, _ = frame.shape
@@ -67,7 +205,9 @@ class AIEngine:
             # --- FILTER 1: Aspect Ratio & Size ---
             w_box = x2 - x
             h_box = y2 - y
-            if w_box == 0 or h_box == 0: continue
+            if w_box <= 0 or h_box <= 0:
+                _REJECTED["size"].inc()
+                continue
             
             area = w_box * h_box
             aspect_ratio = w_box / h_box
@@ -75,19 +215,28 @@ class AIEngine:
             # Reject if too small (far away)
             if area < 3000: 
                 # print(f"Skipping: Too small (Area: {area})")
+                _REJECTED["size"].inc()
                 continue
             
             # Reject if weird shape (Indian plates are approx 2.0 to 4.5 ratio)
             # We allow 1.5 to 6.0 to be safe
             if aspect_ratio < 1.5 or aspect_ratio > 6.0:
                 # print(f"Skipping: Bad shape (Ratio: {aspect_ratio:.2f})")
+                _REJECTED["aspect"].inc()
                 continue
 
-            # --- FILTER 2: Center Screen Check ---
+            # --- FILTER 2: Center Screen / Gate ROI Check ---
             plate_center_x = x + (w_box / 2)
+            if zone is not None:
+                # Plate center must be inside the gate's ROI polygon
+                plate_center_y = y + (h_box / 2)
+                if cv2.pointPolygonTest(zone, (float(plate_center_x), float(plate_center_y)), False) < 0:
+                    _REJECTED["center"].inc()
+                    continue
             # Only process if plate is mostly in the center zone
-            if not (center_x_min < plate_center_x < center_x_max):
+            elif not (center_x_min < plate_center_x < center_x_max):
                 # print("Skipping: Plate on edge")
+                _REJECTED["center"].inc()
                 continue
 
             # Crop Plate
@@ -102,38 +251,36 @@ class AIEngine:
             # Threshold: < 100 is usually blurry. 
             if blur_score < 80: 
                 # print(f"Skipping: Too blurry (Score: {blur_score:.1f})")
+                _REJECTED["blur"].inc()
                 continue
-            
-            # === PASSED ALL CHECKS -> RUN OCR ===
-            logger.info("Processing plate (conf=%.2f, blur=%.0f)", float(score), float(blur_score))
 
-            # A. Upscale for better OCR
-            scale = 2.0
-            enhanced = cv2.resize(plate_crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
-            
-            # B. Run EasyOCR
-            # Returns: [(bbox, text, prob), ...]
-            ocr_results = self.reader.readtext(enhanced)
-            
-            # C. Collect Valid Segments
-            valid_segments = []
-            for (bbox, text, prob) in ocr_results:
-                if prob > 0.3: # Filter garbage reads
-                    x_start = bbox[0][0]
-                    valid_segments.append((x_start, text, prob))
-
-            # D. CRITICAL: SORT LEFT-TO-RIGHT
-            # This fixes "01 MH" -> "MH 01" issue
-            valid_segments.sort(key=lambda x: x[0])
-
-            # E. Join and Clean
-            full_text = "".join([seg[1] for seg in valid_segments])
-            clean_text = re.sub(r'[^A-Z0-9]', '', full_text.upper())
-            
-            # F. Final Check
-            if len(clean_text) > 4:
-                return clean_text, score.item(), plate_crop
+            # === PASSED ALL CHECKS ===
+            ox, oy = offset
+            candidates.append({
+                "box": (x + ox, y + oy, x2 + ox, y2 + oy),
+                "score": score.item(),
+                "blur": float(blur_score),
+                # Own copy: the frame may be a FrameRing slot that gets recycled, the tracker keeps crops
+                "crop": plate_crop.copy(),
+            })
 
-        return None, 0, None
+        return candidates
 
+    def read_plate(self, plate_crop):
+        """
+        OCR one plate crop (recognition only, A-Z0-9).
+        Returns: (clean_text, ocr_confidence, char_confidences) or (None, 0, []) if nothing valid was read
+                 The recognizer scores whole lines, so each character gets its line's confidence.
+        """
+        return self.read_plates([plate_crop])[0]
 
+    def read_plates(self, plate_crops):
+        """OCR a batch of plate crops in ONE recognizer call. Returns a list of read_plate() results."""
+        if not plate_crops:
+            return []
+        with _OCR.time():
+            reads = self.ocr.read_batch(plate_crops)
+        rejects = sum(1 for text, _, _ in reads if not text)
+        if rejects:
+            _OCR_REJECTS.inc(rejects)
+        return reads
@@ -0,0 +1,189 @@
+"""
+Accuracy / speed report: INT8 detector vs the fp32 model on a local image set.
+
+Usage:
+    python evaluate_quantization.py --images samples/ [--labels samples/labels.csv] [--backend onnx]
+
+labels.csv (optional) columns: filename,plate,x1,y1,x2,y2
+    - one row per plate; leave the box empty if only the plate text is known
+Without labels the report compares INT8 against fp32 (read-rate + text agreement) only.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+import cv2
+import numpy as np
+from detection_engine import AIEngine
+from preprocessing import post_process_detections
+from export_model import list_images
+logger = logging.getLogger(__name__)
+
+
+def load_labels(path):
+    """Returns {filename: {"plates": set(), "boxes": [[x1,y1,x2,y2], ...]}}"""
+    labels = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            entry = labels.setdefault(row["filename"], {"plates": set(), "boxes": []})
+            if row.get("plate"):
+                entry["plates"].add(row["plate"].strip().upper())
+            if row.get("x1"):
+                entry["boxes"].append([float(row[k]) for k in ("x1", "y1", "x2", "y2")])
+    return labels
+
+
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def average_precision(detections, labels, iou_threshold=0.5):
+    """
+    Single-class VOC-style AP (all-point interpolation).
+    detections: list of (filename, score, box)
+    """
+    num_gt = sum(len(v["boxes"]) for v in labels.values())
+    if num_gt == 0:
+        return None
+
+    matched = {name: [False] * len(v["boxes"]) for name, v in labels.items()}
+    tp, fp = [], []
+    for name, score, box in sorted(detections, key=lambda d: -d[1]):
+        gt_boxes = labels.get(name, {"boxes": []})["boxes"]
+        best_iou, best_idx = 0.0, -1
+        for idx, gt in enumerate(gt_boxes):
+            iou = box_iou(box, gt)
+            if iou > best_iou:
+                best_iou, best_idx = iou, idx
+        if best_iou >= iou_threshold and not matched[name][best_idx]:
+            matched[name][best_idx] = True
+            tp.append(1); fp.append(0)
+        else:
+            tp.append(0); fp.append(1)
+
+    tp, fp = np.cumsum(tp), np.cumsum(fp)
+    recall = tp / num_gt
+    precision = tp / np.maximum(tp + fp, 1e-9)
+
+    # Precision envelope, then area under the PR curve
+    mrec = np.concatenate([[0.0], recall, [1.0]])
+    mpre = np.concatenate([[0.0], precision, [0.0]])
+    for i in range(len(mpre) - 2, -1, -1):
+        mpre[i] = max(mpre[i], mpre[i + 1])
+    idx = np.where(mrec[1:] != mrec[:-1])[0]
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def expected_backend(backend, precision):
+    """Detector name load_detector reports when the requested model really loaded (see inference_backends)"""
+    return backend + ("-int8" if precision == "int8" else "")
+
+
+def evaluate(engine, paths, labels, warmup=2):
+    """Runs one engine over the image set. Returns (summary dict, {filename: plate text})"""
+    latencies, detections, reads = [], [], {}
+
+    frames = [(os.path.basename(p), cv2.imread(p)) for p in paths]
+    frames = [(name, frame) for name, frame in frames if frame is not None]
+
+    # Warm-up so the first (allocation heavy) passes don't skew the latency numbers
+    for _, frame in frames[:warmup]:
+        engine.detect_and_read(frame)
+
+    for name, frame in frames:
+        # 1. Detector only (preprocess + forward), timed
+        pixel_values, target_sizes = engine.preprocessor([frame])
+        start = time.perf_counter()
+        logits, pred_boxes = engine.model(pixel_values)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        results = post_process_detections(logits, pred_boxes, target_sizes, threshold=0.05)[0]
+        for score, box in zip(results["scores"].tolist(), results["boxes"].tolist()):
+            detections.append((name, score, box))
+
+        # 2. Full pipeline (filters + OCR)
+        text, _, _ = engine.detect_and_read(frame)
+        reads[name] = text
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    summary = {
+        "backend": engine.model.name,
+        "images": len(frames),
+        "latency_ms_p50": round(float(np.percentile(lat, 50)), 1),
+        "latency_ms_p95": round(float(np.percentile(lat, 95)), 1),
+        "read_rate": round(sum(1 for t in reads.values() if t) / max(len(frames), 1), 3),
+    }
+    if labels:
+        summary["mAP50"] = average_precision(detections, labels)
+        labelled = [n for n in reads if labels.get(n, {}).get("plates")]
+        if labelled:
+            correct = sum(1 for n in labelled if reads[n] in labels[n]["plates"])
+            summary["plate_accuracy"] = round(correct / len(labelled), 3)
+    return summary, reads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the INT8 detector against fp32")
+    parser.add_argument("--images", required=True, help="Folder of frames (jpg/png)")
+    parser.add_argument("--labels", help="Optional labels.csv (filename,plate,x1,y1,x2,y2)")
+    parser.add_argument("--model", default="./models/rtdetr_best")
+    parser.add_argument("--backend", default="onnx", choices=["torch", "onnx"])
+    parser.add_argument("--output", help="Also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    paths = list_images(args.images)
+    if not paths:
+        logger.error("No images found in %s", args.images)
+        return 1
+    labels = load_labels(args.labels) if args.labels else {}
+
+    report = {}
+    all_reads = {}
+    for precision in ("fp32", "int8"):
+        engine = AIEngine(args.model, backend=args.backend, precision=precision)
+        if engine.model is None:
+            logger.error("Could not load the %s model", precision)
+            return 1
+        # load_detector falls back to PyTorch when the ONNX model isn't exported; comparing
+        # torch against torch would report a meaningless "INT8" result
+        loaded = engine.model.name.replace("-optimized", "")
+        if loaded != expected_backend(args.backend, precision):
+            logger.error("Requested the %s %s model but %s was loaded; export it first "
+                         "(python export_model.py --format onnx / --quantize dynamic)",
+                         args.backend, precision, engine.model.name)
+            return 1
+        report[precision], all_reads[precision] = evaluate(engine, paths, labels)
+
+    # Agreement: how often INT8 reads the same plate as fp32 (useful without labels)
+    names = all_reads["fp32"].keys()
+    same = sum(1 for n in names if all_reads["fp32"][n] == all_reads["int8"].get(n))
+    report["int8_vs_fp32_agreement"] = round(same / max(len(names), 1), 3)
+    report["speedup"] = round(report["fp32"]["latency_ms_p50"] / max(report["int8"]["latency_ms_p50"], 1e-6), 2)
+
+    # Human readable table
+    print(f"{'':8} {'backend':12} {'p50 ms':>8} {'p95 ms':>8} {'read rate':>10} {'mAP50':>7} {'plate acc':>10}")
+    for precision in ("fp32", "int8"):
+        r = report[precision]
+        m_ap = f"{r['mAP50']:.3f}" if r.get("mAP50") is not None else "-"
+        acc = f"{r['plate_accuracy']:.3f}" if "plate_accuracy" in r else "-"
+        print(f"{precision:8} {r['backend']:12} {r['latency_ms_p50']:8.1f} {r['latency_ms_p95']:8.1f} "
+              f"{r['read_rate']:10.3f} {m_ap:>7} {acc:>10}")
+    print(f"INT8 speedup: {report['speedup']}x | INT8/fp32 plate agreement: {report['int8_vs_fp32_agreement']:.1%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Export the RT-DETR plate detector for the optimized CPU backends.
+
+Usage:
+    python export_model.py                      # ONNX only  -> models/rtdetr_best/model.onnx
+    python export_model.py --format openvino    # ONNX + OpenVINO IR -> models/rtdetr_best/openvino/model.xml
+    python export_model.py --quantize dynamic   # + INT8 weights -> models/rtdetr_best/model_int8.onnx
+    python export_model.py --quantize static --calib-dir logs_images   # INT8 calibrated on saved frames/crops
+
+Then pick the backend / precision in Settings (or AIEngine(backend="onnx", precision="int8")).
+Use evaluate_quantization.py to compare the INT8 model against fp32 before shipping it.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import logging
+import cv2
+import numpy as np
+import torch
+from transformers import RTDetrForObjectDetection
+from preprocessing import FramePreprocessor
+from inference_backends import ONNX_FILE, ONNX_INT8_FILE, OPENVINO_FILE
+logger = logging.getLogger(__name__)
+
+
+class _ExportWrapper(torch.nn.Module):
+    """Returns plain tensors (logits, pred_boxes) instead of the HF output object."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        outputs = self.model(pixel_values=pixel_values)
+        return outputs.logits, outputs.pred_boxes
+
+
+def export_onnx(model_path, opset=17):
+    onnx_path = os.path.join(model_path, ONNX_FILE)
+    preprocessor = FramePreprocessor(model_path)
+
+    model = RTDetrForObjectDetection.from_pretrained(model_path).eval()
+    dummy = torch.zeros((1, 3, preprocessor.height, preprocessor.width), dtype=torch.float32)
+
+    logger.info("Exporting ONNX to %s (opset %d)", onnx_path, opset)
+    with torch.no_grad():
+        torch.onnx.export(
+            _ExportWrapper(model), (dummy,), onnx_path,
+            input_names=["pixel_values"],
+            output_names=["logits", "pred_boxes"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}, "pred_boxes": {0: "batch"}},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    verify_onnx(model, onnx_path, dummy.shape)
+    return onnx_path
+
+
+def verify_onnx(torch_model, onnx_path, input_shape):
+    """Compare ONNX Runtime against PyTorch on a random input and report the latency of both."""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        logger.warning("onnxruntime not installed, skipping verification")
+        return
+
+    x = torch.rand(input_shape)
+    with torch.no_grad():
+        start = time.perf_counter()
+        ref = torch_model(pixel_values=x)
+        torch_ms = (time.perf_counter() - start) * 1000
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+    session.run(None, {"pixel_values": x.numpy()})  # Warm-up
+    start = time.perf_counter()
+    logits, boxes = session.run(["logits", "pred_boxes"], {"pixel_values": x.numpy()})
+    ort_ms = (time.perf_counter() - start) * 1000
+
+    max_diff = max(np.abs(logits - ref.logits.numpy()).max(), np.abs(boxes - ref.pred_boxes.numpy()).max())
+    logger.info("ONNX check: max abs diff %.2e | torch %.0f ms | onnxruntime %.0f ms", max_diff, torch_ms, ort_ms)
+
+
+def export_openvino(model_path, onnx_path):
+    import openvino as ov
+
+    xml_path = os.path.join(model_path, OPENVINO_FILE)
+    os.makedirs(os.path.dirname(xml_path), exist_ok=True)
+    logger.info("Converting %s to OpenVINO IR at %s", onnx_path, xml_path)
+    ov.save_model(ov.convert_model(onnx_path), xml_path)
+    return xml_path
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def list_images(folder):
+    """All images in a folder (non-recursive), sorted for reproducible runs."""
+    return sorted(p for p in glob.glob(os.path.join(folder, "*")) if p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def _make_calibration_reader(model_path, calib_dir, max_images):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class FolderCalibrationReader(CalibrationDataReader):
+        """Feeds saved frames/crops through the same preprocessing as the live pipeline."""
+
+        def __init__(self):
+            self.preprocessor = FramePreprocessor(model_path)
+            self.paths = list_images(calib_dir)[:max_images]
+            if not self.paths:
+                raise FileNotFoundError(f"No calibration images found in {calib_dir}")
+            logger.info("Calibrating on %d images from %s", len(self.paths), calib_dir)
+            self._iter = iter(self.paths)
+
+        def get_next(self):
+            for path in self._iter:
+                frame = cv2.imread(path)
+                if frame is None:
+                    continue
+                pixel_values, _ = self.preprocessor([frame])
+                return {"pixel_values": pixel_values.numpy().copy()}
+            return None
+
+        def rewind(self):
+            self._iter = iter(self.paths)
+
+    return FolderCalibrationReader()
+
+
+def quantize_onnx(model_path, onnx_path, mode="dynamic", calib_dir=None, max_calib_images=200):
+    """
+    dynamic: INT8 weights for MatMul/Gemm, activations quantized at runtime (no data needed)
+    static : INT8 weights + activations (QDQ), ranges calibrated on images from calib_dir
+    """
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantFormat, QuantType
+
+    int8_path = os.path.join(model_path, ONNX_INT8_FILE)
+    logger.info("Quantizing (%s) %s -> %s", mode, onnx_path, int8_path)
+
+    if mode == "static":
+        if not calib_dir:
+            raise ValueError("--quantize static needs --calib-dir with saved frames or plate crops")
+        reader = _make_calibration_reader(model_path, calib_dir, max_calib_images)
+        quantize_static(
+            onnx_path, int8_path, reader,
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+    else:
+        quantize_dynamic(
+            onnx_path, int8_path,
+            op_types_to_quantize=["MatMul", "Gemm"],
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+        )
+
+    size_fp32 = os.path.getsize(onnx_path) / 1e6
+    size_int8 = os.path.getsize(int8_path) / 1e6
+    logger.info("INT8 model written: %.0f MB -> %.0f MB", size_fp32, size_int8)
+    return int8_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the RT-DETR plate detector to ONNX / OpenVINO")
+    parser.add_argument("--model", default="./models/rtdetr_best", help="HF model folder")
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--quantize", choices=["dynamic", "static"], help="Also write an INT8 ONNX model")
+    parser.add_argument("--calib-dir", help="Folder of frames/crops for static INT8 calibration")
+    parser.add_argument("--calib-images", type=int, default=200, help="Max calibration images")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    onnx_path = export_onnx(args.model, args.opset)
+    if args.format == "openvino":
+        export_openvino(args.model, onnx_path)
+    if args.quantize:
+        quantize_onnx(args.model, onnx_path, args.quantize, args.calib_dir, args.calib_images)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
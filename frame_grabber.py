@@ -0,0 +1,216 @@
+import time
+import threading
+import logging
+from frame_ring import read_into_ring
+from metrics import stage_histogram
+from profiler import PROFILER
+logger = logging.getLogger(__name__)
+
+# Grab times kept for the last N retrieved frames (far more than a held frame can fall behind)
+_CAPTURE_TIMES = 256
+
+_CAPTURE = stage_histogram("capture")  # Decode of a grabbed frame into the ring
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Latest-frame-wins capture, decoupled from inference.
+
+    Runs its own loop that grab()s every frame as it arrives, so the camera / RTSP buffer
+    never backs up while the detector is busy. grab() takes the frame off the device or
+    stream; for FFmpeg sources (RTSP, files) that already includes decoding, as inter-frame
+    codecs need every frame. A grabbed frame is only retrieve()d - converted to BGR and
+    copied into the FrameRing - when someone wants it: the analysis loop asking for the
+    newest frame, or the preview at preview_fps. analysis_fps caps how often the analysis
+    loop gets a frame (0 = whenever it is free), so a 30 fps camera is converted for
+    analysis at e.g. 5 fps.
+
+    Frames that are never analyzed are counted in two groups: frames_skipped (the analysis
+    rate cap or the lockstep stride left them out by design) and frames_dropped (they went
+    stale while the detector was busy - the number to watch).
+
+    lockstep (deterministic replays): no frame is dropped for being stale. Every n-th frame
+    (n from the source fps and analysis_fps) goes to analysis and the grabber waits until it
+    was taken, so the same recording always yields the same analyzed frames.
+    """
+
+    def __init__(self, cap, ring_slots=8, preview_fps=15, on_preview=None, analysis_fps=0,
+                 name="FrameGrabber", lockstep=False):
+        super().__init__(name=name, daemon=True)
+        self.cap = cap
+        self.ring = None
+        self.ring_slots = ring_slots
+        self._held = {}  # seq -> ring it was acquired from (the ring is replaced on a resolution change)
+        self.preview_interval = None
+        self.set_preview_fps(preview_fps)
+        self.on_preview = on_preview  # callback(seq, frame view), called from this thread
+        self.analysis_interval = 1.0 / analysis_fps if analysis_fps else 0.0
+        self._next_analysis = 0.0
+        self.lockstep = lockstep
+        self.lockstep_stride = 1
+        self._taken_seq = 0
+        self._capture_times = [0.0] * _CAPTURE_TIMES  # monotonic grab time, by seq
+        self._media_times = [0.0] * _CAPTURE_TIMES    # lockstep: recording time, by seq
+
+        self.running = True
+        self.ended = False
+        self.latest_seq = 0
+        self._want = threading.Event()
+        self._cond = threading.Condition()
+
+        # Counters (read by the UI / diagnostics)
+        self.frames_grabbed = 0
+        self.frames_retrieved = 0
+        self.frames_analyzed = 0
+        self.frames_skipped = 0  # Not analyzed by design (analysis_fps cap, lockstep stride)
+
+    @property
+    def frames_dropped(self):
+        """Frames that arrived but were never analyzed because the detector was still busy"""
+        return max(0, self.frames_grabbed - self.frames_analyzed - self.frames_skipped)
+
+    def run(self):
+        if self.lockstep:
+            self._run_lockstep()
+            return
+        next_preview = 0.0
+        try:
+            while self.running:
+                PROFILER.poll()
+                # 1. Always take the frame off the device / stream (no BGR conversion yet)
+                if not self.cap.grab():
+                    break
+                self.frames_grabbed += 1
+                now = time.monotonic()
+                if not self._want.is_set() and now < self._next_analysis:
+                    self.frames_skipped += 1  # Between two analysis slots: not stale, just not due
+
+                # 2. Convert only what somebody will look at
+                preview_due = (self.on_preview is not None and self.preview_interval is not None
+                               and now >= next_preview)
+                if not preview_due and not self._want.is_set():
+                    continue
+
+                with _CAPTURE.time():
+                    self.ring, seq, frame = read_into_ring(self.ring, self.cap, self.ring_slots, retrieve=True)
+                if frame is None:
+                    continue
+                self.frames_retrieved += 1
+                self._capture_times[seq % _CAPTURE_TIMES] = now
+                with self._cond:
+                    self.latest_seq = seq
+                    self._cond.notify_all()
+
+                if preview_due:
+                    next_preview = now + self.preview_interval
+                    self.on_preview(seq, frame)
+        except Exception:
+            logger.exception("Capture loop failed (%s)", self.name)
+        finally:
+            with self._cond:
+                self.ended = True
+                self._cond.notify_all()
+
+    def _run_lockstep(self):
+        try:
+            while self.running:
+                PROFILER.poll()
+                if not self.cap.grab():
+                    break
+                now = time.monotonic()
+                self.frames_grabbed += 1
+                if self.frames_grabbed == 1:
+                    # Every n-th frame of the source: the same frames on every run, at any speed
+                    source_fps = getattr(self.cap, "fps", 0)  # Known once the stream is open
+                    if self.analysis_interval and source_fps:
+                        self.lockstep_stride = max(1, round(source_fps * self.analysis_interval))
+                if (self.frames_grabbed - 1) % self.lockstep_stride:
+                    self.frames_skipped += 1
+                    continue
+
+                with _CAPTURE.time():
+                    self.ring, seq, frame = read_into_ring(self.ring, self.cap, self.ring_slots, retrieve=True)
+                if frame is None:
+                    continue
+                self.frames_retrieved += 1
+                self._capture_times[seq % _CAPTURE_TIMES] = now
+                self._media_times[seq % _CAPTURE_TIMES] = getattr(self.cap, "media_time", now)
+                with self._cond:
+                    self.latest_seq = seq
+                    self._cond.notify_all()
+                    # Hold the stream until the analysis loop has this frame (no preview here:
+                    # it would take ring slots at wall-clock times)
+                    while self.running and self._taken_seq < seq:
+                        self._cond.wait(0.5)
+        except Exception:
+            logger.exception("Capture loop failed (%s)", self.name)
+        finally:
+            with self._cond:
+                self.ended = True
+                self._cond.notify_all()
+
+    def set_preview_fps(self, fps):
+        """Preview rate cap; 0 pauses the preview (nothing is retrieved for it). Safe from any thread."""
+        self.preview_interval = 1.0 / fps if fps else None
+
+    def latest(self, after_seq=0, timeout=1.0):
+        """
+        Newest frame retrieved after `after_seq`, waiting up to `timeout` for one.
+        Returns (seq, frame view) held for the caller - call release(seq) when done -
+        or (None, None) on timeout / end of stream.
+        """
+        # Analysis rate cap: nothing is converted for analysis before the next frame is due
+        delay = 0 if self.lockstep else self._next_analysis - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if delay > timeout:
+                return None, None
+        self._want.set()
+        with self._cond:
+            self._cond.wait_for(lambda: self.latest_seq > after_seq or self.ended, timeout)
+            seq = self.latest_seq
+        if seq <= after_seq:
+            return None, None
+        self._want.clear()
+
+        ring = self.ring
+        frame = ring.acquire(seq) if ring is not None else None
+        if frame is not None:
+            self._held[seq] = ring
+        if self.lockstep:
+            with self._cond:
+                self._taken_seq = seq
+                self._cond.notify_all()
+        if frame is None:
+            return None, None
+        self.frames_analyzed += 1
+        if self.analysis_interval and not self.lockstep:
+            now = time.monotonic()
+            # Keep the cadence, but do not bank up frames after a slow detection
+            self._next_analysis = max((self._next_analysis or now) + self.analysis_interval, now)
+        return seq, frame
+
+    def capture_time(self, seq):
+        """time.monotonic() at which frame `seq` was grabbed (valid while it is held)"""
+        return self._capture_times[seq % _CAPTURE_TIMES]
+
+    def media_time(self, seq):
+        """Lockstep: the frame's time in the recording, a clock that does not depend on replay speed"""
+        return self._media_times[seq % _CAPTURE_TIMES]
+
+    def release(self, seq):
+        """Release a frame returned by latest(), on the ring it came from"""
+        ring = self._held.pop(seq, None)
+        if ring is not None:
+            ring.release(seq)
+
+    def stop(self):
+        self.running = False
+        self.join(timeout=5)
+        if self.is_alive():
+            # Stuck inside grab() on a dead stream; it is a daemon thread and still owns the ring
+            logger.warning("%s did not stop", self.name)
+            return
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -0,0 +1,179 @@
+import logging
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+logger = logging.getLogger(__name__)
+
+_HEADER_ALIGN = 64
+
+
+class FrameRing:
+    """
+    Fixed ring of preallocated frame slots in shared memory.
+
+    The capture loop decodes straight into the next slot (cap.read(image=slot)), and
+    inference, preview and recapture read that same buffer through numpy views: no
+    per-frame allocation and no copies. Works across processes (attach by name).
+
+    Every slot carries a sequence number (the frame counter) as a seqlock: the writer
+    sets it to 0 before touching the pixels and to the frame number once done. A reader
+    that used a view re-checks the number afterwards (is_valid) - if it changed, the
+    slot was recycled under it. A reader that needs a frame for longer (inference while
+    capture keeps running) holds it with acquire()/release(); the writer skips held slots.
+    Anything kept beyond that (plate crops, the recapture image) must be copied out.
+    """
+
+    def __init__(self, shape, slots=8, name=None, create=True, first_seq=1):
+        self.shape = tuple(shape)
+        self.slots = int(slots)
+        frame_bytes = int(np.prod(self.shape))
+        # Header: [latest committed frame number, seq per slot..., hold count per slot...]
+        header_bytes = -(-8 * (2 * self.slots + 1) // _HEADER_ALIGN) * _HEADER_ALIGN
+
+        self.owner = create
+        # Readers attach from processes spawned by the app, which share the creator's resource
+        # tracker: whatever a crashed writer leaves behind is unlinked when the app exits
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=header_bytes + frame_bytes * self.slots)
+
+        self._header = np.ndarray((2 * self.slots + 1,), dtype=np.int64, buffer=self.shm.buf)
+        self._holds = self._header[1 + self.slots:]
+        self._frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if create:
+            self._header[:] = 0
+        # A ring that replaces another (resolution change) continues its frame numbers
+        self._next = max(int(self._header[0]) + 1, first_seq)
+        self._lock = threading.Lock()  # Hold check vs. slot invalidation (writer and readers in this process)
+
+    @classmethod
+    def attach(cls, name, shape, slots):
+        return cls(shape, slots, name=name, create=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def latest_seq(self):
+        return int(self._header[0])
+
+    # --- Writer (one per ring) ---
+
+    def begin_write(self):
+        """Returns (seq, slot view) to decode the next frame into. Call commit(seq) when done."""
+        with self._lock:
+            seq = self._next
+            # Skip slots a reader is holding (their frame numbers are simply never used)
+            for _ in range(self.slots - 1):
+                if self._holds[seq % self.slots] <= 0:
+                    break
+                seq += 1
+            index = seq % self.slots
+            self._header[1 + index] = 0  # Readers of the old frame in this slot now see it as invalid
+        return seq, self._frames[index]
+
+    def commit(self, seq):
+        self._header[1 + seq % self.slots] = seq
+        self._header[0] = seq
+        self._next = seq + 1
+
+    def read_from(self, cap, retrieve=False):
+        """cap.read() (or cap.retrieve() after a grab()) straight into the next slot. Returns (ret, seq, frame view)"""
+        seq, slot = self.begin_write()
+        ret, frame = cap.retrieve(slot) if retrieve else cap.read(slot)
+        if not ret:
+            return False, None, None
+        if frame.shape != self.shape or frame.__array_interface__["data"][0] != slot.__array_interface__["data"][0]:
+            # Stream changed resolution: OpenCV allocated a new buffer instead
+            return True, None, frame
+        self.commit(seq)
+        return True, seq, slot
+
+    # --- Readers (any thread / process) ---
+
+    def get(self, seq):
+        """View of frame `seq`, or None if it is not (or no longer) in the ring"""
+        if seq is None or seq <= 0:
+            return None
+        index = seq % self.slots
+        if self._header[1 + index] != seq:
+            return None
+        return self._frames[index]
+
+    def acquire(self, seq):
+        """Like get(), but the writer will not reuse the slot until release(seq)"""
+        with self._lock:
+            frame = self.get(seq)
+            if frame is not None:
+                self._holds[seq % self.slots] += 1
+            return frame
+
+    def release(self, seq):
+        """Undo one acquire(seq) on THIS ring"""
+        with self._lock:
+            if self._holds is None:  # Closed (replaced after a resolution change) meanwhile
+                return
+            index = seq % self.slots
+            if self._holds[index] <= 0:
+                # A negative count would leave the next holder of this slot unprotected
+                logger.warning("Frame ring %s: release(%d) without a hold", self.shm.name, seq)
+                return
+            self._holds[index] -= 1
+
+    def latest(self):
+        """(seq, view) of the newest complete frame, or (None, None)"""
+        seq = self.latest_seq
+        frame = self.get(seq)
+        return (seq, frame) if frame is not None else (None, None)
+
+    def is_valid(self, seq):
+        """True while frame `seq` has not been overwritten (check after using a view)"""
+        return seq is not None and seq > 0 and self._header[1 + seq % self.slots] == seq
+
+    def copy(self, seq):
+        """Private copy of frame `seq`, or None if it was already recycled"""
+        frame = self.get(seq)
+        if frame is None:
+            return None
+        copy = frame.copy()
+        return copy if self.is_valid(seq) else None
+
+    def close(self):
+        # Views must go before the buffer can be released
+        self._header = self._holds = self._frames = None
+        try:
+            if self.owner:
+                self.shm.unlink()  # The name goes now, the memory once the last mapping is closed
+            self.shm.close()
+        except (BufferError, FileNotFoundError):
+            # A reader still holds a view (freed with it) or the segment is already gone
+            logger.debug("Frame ring %s already released", self.shm.name, exc_info=True)
+
+
+def read_into_ring(ring, cap, slots=8, retrieve=False):
+    """
+    Decode the next frame of `cap` into `ring`, creating (or re-sizing) the ring from the
+    first frame. retrieve=True: the frame was already grab()bed, only retrieve it.
+    Returns (ring, seq, frame view); frame is None at the end of the stream.
+    """
+    if ring is not None:
+        ret, seq, frame = ring.read_from(cap, retrieve)
+        if not ret:
+            return ring, None, None
+        if seq is not None:
+            return ring, seq, frame
+    else:
+        ret, frame = cap.retrieve() if retrieve else cap.read()
+        if not ret:
+            return ring, None, None
+
+    # First frame, or the stream changed resolution: size a new ring to it
+    first_seq = 1
+    if ring is not None:
+        first_seq = ring.latest_seq + 1  # Readers wait for numbers above the last one they saw
+        ring.close()
+    ring = FrameRing(frame.shape, slots, first_seq=first_seq)
+    logger.info("Frame ring %s: %d slots of %s", ring.name, slots, frame.shape)
+    seq, slot = ring.begin_write()
+    slot[...] = frame
+    ring.commit(seq)
+    return ring, seq, slot
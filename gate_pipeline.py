@@ -0,0 +1,82 @@
+import logging
+from motion_gate import MotionGate
+from gate_roi import parse_roi
+from plate_tracker import PlateTracker
+from metrics import REGISTRY
+logger = logging.getLogger(__name__)
+
+
+class GatePipeline:
+    """
+    Per-gate analysis: motion gate -> detector -> tracker -> batched OCR -> one event per vehicle.
+
+    Used by the in-process VideoThread and by the gate worker processes alike.
+    ai: anything with the InferenceService API (detect / read_plates / detect_and_read).
+    settings: dict from database_manager.get_gate_settings
+    """
+
+    def __init__(self, gate_name, ai, settings):
+        self.gate_name = gate_name
+        self.ai = ai
+
+        # Cheap change detector in front of the AI (configured per gate in Camera Setup)
+        self.motion_gate = MotionGate(enabled=settings["motion_enabled"],
+                                      threshold=settings["motion_threshold"])
+
+        # Lane region: the detector (and the motion gate) only look inside it
+        self.roi = parse_roi(settings["roi"])
+        self.motion_gate.set_zone_from_roi(self.roi)
+
+        # One track per vehicle: OCR a bounded number of times, emit exactly once
+        self.tracker = PlateTracker()
+
+        self.frames_seen = REGISTRY.counter("smartgate_frames_seen_total", "Frames analyzed per gate", gate=gate_name)
+        self.frames_gated = REGISTRY.counter("smartgate_frames_gated_total",
+                                             "Frames skipped by the motion gate (detector not run)", gate=gate_name)
+
+    def process(self, frame, now=None):
+        """
+        Feed every captured frame (the motion gate keeps its background current).
+        now: frame time in seconds (default: wall clock; replays pass the recording's time)
+        Returns: (has_motion, [(plate_text, best_crop), ...] plates to report now)
+        """
+        # Only run AI if something moved in the gate zone
+        self.frames_seen.inc()
+        if not self.motion_gate.update(frame, now):
+            self.frames_gated.inc()
+            # The scene went static: tracks still age, so a pending read is reported anyway
+            self.tracker.expire(now)
+            return False, self.report_ready(now)
+        return True, self.process_detections(frame, now)
+
+    def process_detections(self, frame, now=None):
+        # A. Detector only (no OCR yet)
+        candidates = self.ai.detect(frame, self.gate_name, self.roi)
+
+        # B. Match plates to vehicles seen in previous frames
+        active = self.tracker.update(candidates, now)
+
+        # C. OCR only tracks that have not been decided yet (bounded attempts per vehicle).
+        #    Reads from several frames are fused per character before the plate is reported.
+        #    All crops of this frame are recognized in one batch.
+        to_read = [track for track in active if self.tracker.needs_ocr(track)]
+        reads = self.ai.read_plates([track.crop for track in to_read], self.gate_name)
+        for track, (text, ocr_conf, char_confs) in zip(to_read, reads):
+            track.add_read(text, char_confs, now)
+
+        # D. Exactly one event per vehicle
+        return self.report_ready(now)
+
+    def report_ready(self, now=None):
+        plates = []
+        for track in self.tracker.ready_tracks(now):
+            if self.tracker.mark_emitted(track, now):
+                logger.info("Detected plate: %s (gate %s, track %d, conf=%.2f, %d reads)", track.text,
+                            self.gate_name, track.track_id, track.confidence, track.consensus.num_reads)
+                plates.append((track.text, track.best_crop))
+        return plates
+
+    def recapture(self, frame):
+        """Guard asked for a fresh read. Returns (plate crop, or the whole frame if none found; text)"""
+        text, conf, crop_img = self.ai.detect_and_read(frame, self.gate_name, self.roi)
+        return (crop_img if crop_img is not None else frame), text
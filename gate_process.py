@@ -0,0 +1,253 @@
+import time
+import queue
+import threading
+import logging
+import multiprocessing
+from PyQt6.QtCore import QThread, pyqtSignal
+from gate_worker import (run_gate_worker, STATUS, FRAME, HEARTBEAT, PLATE, RECAPTURE, CMD_STOP, CMD_RECAPTURE,
+                         CMD_PREVIEW, CMD_PROFILE)
+from frame_ring import FrameRing
+from preview_buffer import PreviewBufferPool
+from metrics import REGISTRY
+from profiler import PROFILER
+logger = logging.getLogger(__name__)
+
+
+class _Worker:
+    """UI-side bookkeeping for one gate process."""
+
+    def __init__(self, config):
+        self.config = config
+        self.process = None
+        self.commands = None
+        self.status = "starting"
+        self.last_message = 0.0
+        self.running_since = None   # Set once the worker reports "running" (models loaded)
+        self.restart_at = 0.0
+        self.backoff = 1.0
+        self.restarts = 0
+        self.ring = None            # The worker's frame ring, attached on its first preview
+        self.preview_pool = PreviewBufferPool()
+        self.preview_size = (800, 600)  # Live view tile to fit the preview into
+
+
+class GateSupervisor(QThread):
+    """
+    Multiprocess mode: runs every gate pipeline in its own worker process (gate_worker.py)
+    and relays their results to the UI through the same signals a VideoThread has.
+
+    A worker that dies (decoder crash, stream ended) or stops sending anything (hung
+    decoder) is killed and restarted with exponential backoff; the dashboard keeps running.
+    """
+    change_pixmap_signal = pyqtSignal(object, str)  # PreviewFrame, gate_name
+    plate_detected_signal = pyqtSignal(str, object, str)
+    status_signal = pyqtSignal(str, str)  # gate_name, status
+
+    def __init__(self, gate_configs, hang_timeout=15.0, load_timeout=600.0, max_backoff=60.0):
+        super().__init__()
+        # spawn, not fork: the UI process already runs Qt / torch threads
+        self.ctx = multiprocessing.get_context("spawn")
+        self.results = self.ctx.Queue()
+        self.workers = {c["gate_name"]: _Worker(c) for c in gate_configs}
+        self.hang_timeout = hang_timeout    # No message for this long while running = hung
+        self.load_timeout = load_timeout    # First start may compile / load models for a while
+        self.max_backoff = max_backoff
+        self.running = True
+
+        self._recapture_lock = threading.Lock()
+        self._recapture_done = threading.Event()
+        self._recapture_gate = None
+        self._recapture_result = (None, None)
+
+    def run(self):
+        threading.current_thread().name = "GateSupervisor"  # For profiles and thread dumps
+        for worker in self.workers.values():
+            self._start_worker(worker)
+
+        while self.running:
+            try:
+                PROFILER.poll()
+                kind, gate_name, payload = self.results.get(timeout=0.2)
+                self._dispatch(kind, gate_name, payload)
+            except queue.Empty:
+                pass
+            self._check_workers()
+
+    def _start_worker(self, worker):
+        worker.commands = self.ctx.Queue()
+        worker.process = self.ctx.Process(target=run_gate_worker, name=f"gate-{worker.config['gate_name']}",
+                                          args=(worker.config, self.results, worker.commands), daemon=True)
+        worker.process.start()
+        worker.last_message = time.monotonic()
+        worker.running_since = None
+        worker.status = "starting"
+        logger.info("Started gate worker %s (pid %d)", worker.config["gate_name"], worker.process.pid)
+
+    def _dispatch(self, kind, gate_name, payload):
+        worker = self.workers.get(gate_name)
+        if worker is None:
+            return
+        worker.last_message = time.monotonic()
+
+        if kind == FRAME:
+            self._emit_preview(worker, *payload)
+        elif kind == HEARTBEAT:
+            REGISTRY.set_remote(gate_name, payload)
+        elif kind == PLATE:
+            text, crop = payload
+            self.plate_detected_signal.emit(text, crop, gate_name)
+        elif kind == RECAPTURE:
+            if gate_name == self._recapture_gate:
+                self._recapture_result = payload
+                self._recapture_done.set()
+        elif kind == STATUS:
+            worker.status = payload
+            if payload == "running":
+                worker.running_since = worker.last_message
+            logger.info("Gate worker %s: %s", gate_name, payload)
+            self.status_signal.emit(gate_name, payload)
+
+    def _emit_preview(self, worker, ring_name, shape, slots, seq):
+        """Preview straight from the worker's shared frame ring (only the slot number was queued)"""
+        if not worker.config["preview_fps"]:
+            return  # Tile hidden; the worker stops sending once it sees the command
+        if worker.ring is None or worker.ring.name != ring_name:
+            self._release_ring(worker)
+            try:
+                worker.ring = FrameRing.attach(ring_name, shape, slots)
+            except FileNotFoundError:
+                return  # Worker already replaced that ring
+
+        frame = worker.ring.get(seq)
+        if frame is None:
+            return  # Already recycled: a newer preview is on its way
+        # Downscaled to the tile, then converted into a pooled buffer (no per-frame allocation)
+        preview = worker.preview_pool.render(frame, worker.preview_size)
+        if preview is None:
+            return  # GUI still drawing the previous ones
+        if not worker.ring.is_valid(seq):
+            preview.release()
+            return  # Overwritten while we were reading it
+        self.change_pixmap_signal.emit(preview, worker.config["gate_name"])
+
+    def _release_ring(self, worker, unlink=False):
+        if worker.ring is None:
+            return
+        if unlink:
+            # The worker died without cleaning up its shared memory
+            try:
+                worker.ring.shm.unlink()
+            except FileNotFoundError:
+                pass
+        worker.ring.close()
+        worker.ring = None
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for gate_name, worker in self.workers.items():
+            process = worker.process
+            if process is None:
+                # Waiting for the backoff to expire
+                if now >= worker.restart_at:
+                    worker.restarts += 1
+                    self._start_worker(worker)
+                continue
+
+            timeout = self.hang_timeout if worker.running_since else self.load_timeout
+            hung = process.is_alive() and now - worker.last_message > timeout
+            if process.is_alive() and not hung:
+                # Healthy for a minute: forget earlier failures
+                if worker.running_since and now - worker.running_since > 60:
+                    worker.backoff = 1.0
+                continue
+
+            if hung:
+                logger.error("Gate worker %s sent nothing for %.0fs, killing it", gate_name, now - worker.last_message)
+                process.kill()
+            process.join(timeout=2)
+            logger.error("Gate worker %s exited (code %s), restarting in %.0fs",
+                         gate_name, process.exitcode, worker.backoff)
+            self.status_signal.emit(gate_name, "restarting")
+            self._release_ring(worker, unlink=True)
+            worker.process = None
+            worker.restart_at = now + worker.backoff
+            worker.backoff = min(worker.backoff * 2, self.max_backoff)
+
+    def set_preview(self, gate_name, fps, size):
+        """Live view tile state: the worker stops retrieving previews while fps is 0"""
+        worker = self.workers.get(gate_name)
+        if worker is None:
+            return
+        worker.preview_size = size
+        worker.config["preview_fps"] = fps  # Also for a restarted worker
+        if self.is_alive(gate_name):
+            worker.commands.put((CMD_PREVIEW, fps))
+
+    def start_profiling(self, mode, duration, allocations):
+        """Every running worker profiles itself for `duration` s (files in logs/, tagged per gate)"""
+        for gate_name, worker in self.workers.items():
+            if self.is_alive(gate_name):
+                worker.commands.put((CMD_PROFILE, mode, duration, allocations))
+
+    def is_alive(self, gate_name):
+        worker = self.workers.get(gate_name)
+        return bool(worker and worker.process and worker.process.is_alive())
+
+    def recapture(self, gate_name, timeout=5.0):
+        """Blocking: the gate's worker reads its latest frame. Returns (image, text)"""
+        worker = self.workers.get(gate_name)
+        if worker is None or not self.is_alive(gate_name):
+            return None, None
+        with self._recapture_lock:
+            self._recapture_gate = gate_name
+            self._recapture_result = (None, None)
+            self._recapture_done.clear()
+            worker.commands.put(CMD_RECAPTURE)
+            if not self._recapture_done.wait(timeout):
+                logger.warning("Recapture on %s timed out", gate_name)
+            self._recapture_gate = None
+            return self._recapture_result
+
+    def stop(self):
+        self.running = False
+        self.wait()
+        for worker in self.workers.values():
+            if worker.process is not None and worker.process.is_alive():
+                worker.commands.put(CMD_STOP)
+        # Keep draining: a worker cannot exit while its last previews are stuck in the pipe
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and any(self.is_alive(name) for name in self.workers):
+            try:
+                self.results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for worker in self.workers.values():
+            if worker.process is not None and worker.process.is_alive():
+                logger.warning("Gate worker %s did not stop, killing it", worker.config["gate_name"])
+                worker.process.kill()
+                worker.process.join(timeout=2)
+            self._release_ring(worker, unlink=True)
+
+
+class GateProcessHandle:
+    """Stands in for a VideoThread in SmartGateApp.camera_threads when gates run as processes."""
+    native_id = None
+
+    def __init__(self, supervisor, gate_name):
+        self.supervisor = supervisor
+        self.gate_name = gate_name
+
+    def recapture(self):
+        return self.supervisor.recapture(self.gate_name)
+
+    def set_preview(self, fps, size):
+        self.supervisor.set_preview(self.gate_name, fps, size)
+
+    def isRunning(self):
+        return self.supervisor.is_alive(self.gate_name)
+
+    def stop(self):
+        pass  # The supervisor stops all workers together
+
+    def wait(self):
+        return True
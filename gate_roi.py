@@ -0,0 +1,49 @@
+import numpy as np
+
+# A gate ROI is stored in the gates table as text: "x,y;x,y;..." with coordinates as
+# fractions of the frame (0.0 - 1.0), so it survives camera resolution changes.
+#   2 points -> rectangle (top-left; bottom-right)
+#   3+ points -> polygon
+
+
+def parse_roi(text):
+    """Returns a list of (x, y) fractions, or None if the text is empty / invalid."""
+    if not text or not text.strip():
+        return None
+    try:
+        points = [tuple(float(v) for v in pair.split(",")) for pair in text.strip().split(";") if pair.strip()]
+    except ValueError:
+        return None
+    if len(points) < 2 or any(len(p) != 2 for p in points):
+        return None
+    points = [(min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)) for x, y in points]
+
+    if len(points) == 2:
+        (x1, y1), (x2, y2) = points
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        if x2 - x1 <= 0 or y2 - y1 <= 0:
+            return None
+        points = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+    return points
+
+
+def format_roi(points):
+    if not points:
+        return ""
+    return ";".join(f"{x:.3f},{y:.3f}" for x, y in points)
+
+
+def roi_bounds(points, frame_w, frame_h):
+    """Pixel bounding rectangle (x1, y1, x2, y2) of the ROI for a given frame size."""
+    xs = [x * frame_w for x, _ in points]
+    ys = [y * frame_h for _, y in points]
+    x1, y1 = max(0, int(min(xs))), max(0, int(min(ys)))
+    x2, y2 = min(frame_w, int(np.ceil(max(xs)))), min(frame_h, int(np.ceil(max(ys))))
+    return x1, y1, max(x2, x1 + 1), max(y2, y1 + 1)
+
+
+def roi_contour(points, frame_w, frame_h, offset=(0, 0)):
+    """ROI polygon in pixels (optionally shifted into a crop's coordinates), for cv2.pointPolygonTest."""
+    ox, oy = offset
+    return np.array([[x * frame_w - ox, y * frame_h - oy] for x, y in points], dtype=np.float32)
@@ -0,0 +1,152 @@
+"""
+Gate worker process (multiprocess mode).
+
+One process per gate runs capture -> motion gate -> RT-DETR -> tracker -> OCR on its own
+GIL, with the detector weights memory-mapped so every worker shares one physical copy
+(PyTorch fp32 models; INT8 quantization gives each worker its own copy).
+Results go back to the UI process over a multiprocessing queue (see gate_process.GateSupervisor).
+Nothing in here imports Qt.
+"""
+import os
+import re
+import threading
+import queue
+import logging
+import cv2
+logger = logging.getLogger(__name__)
+
+# Worker -> UI messages: (kind, gate_name, payload)
+STATUS = "status"        # payload: str ("loading", "running", "stream ended", ...)
+FRAME = "frame"          # payload: (ring name, shape, slots, seq) of the newest frame (also the heartbeat)
+HEARTBEAT = "heartbeat"  # payload: metrics snapshot of this process, every few seconds while capture runs
+PLATE = "plate"          # payload: (plate_text, best_crop)
+RECAPTURE = "recapture"  # payload: (image, text) answer to a "recapture" command, (None, None) if no frame came
+
+# UI -> worker commands
+CMD_STOP = "stop"
+CMD_RECAPTURE = "recapture"
+CMD_PREVIEW = "preview"  # sent as (CMD_PREVIEW, fps): live view tile shown (fps) / hidden (0)
+CMD_PROFILE = "profile"  # sent as (CMD_PROFILE, mode, duration, allocations): profile this worker too
+
+
+def run_gate_worker(config, results, commands):
+    """
+    Process entry point (spawned, so it must stay importable without the UI).
+    config: gate_name, source, settings (get_gate_settings dict), backend, precision,
+            torch_mode, num_threads, preview_fps, ring_slots
+    """
+    from app_logging import setup_logging
+    gate_name = config["gate_name"]
+    # One file per gate: rotating handlers in several processes must not share a file
+    setup_logging(log_dir="logs", log_file_name=f"gate_{re.sub(r'[^A-Za-z0-9_-]', '_', gate_name)}.log")
+    logger.info("Gate worker %s started (pid %d)", gate_name, os.getpid())
+
+    # 1. This process only serves one gate: size the thread pools to its share of the cores
+    cv2.setNumThreads(1)
+    import torch
+    torch.set_num_threads(max(1, config["num_threads"]))
+
+    # 2. Models (weights mapped, not copied)
+    results.put((STATUS, gate_name, "loading"))
+    from detection_engine import AIEngine
+    from inference_service import InferenceService
+    from gate_pipeline import GatePipeline
+    from frame_grabber import FrameGrabber
+    from stream_reader import StreamReader
+    from metrics import REGISTRY
+    from profiler import PROFILER
+    engine = AIEngine(backend=config["backend"], precision=config["precision"],
+                      torch_mode=config["torch_mode"], mmap_weights=True)
+    if engine.model is None:
+        results.put((STATUS, gate_name, "model failed to load"))
+        return
+    engine.warmup()
+    ai = InferenceService(engine, max_batch=1, max_wait_ms=0)
+    ai.start()
+    pipeline = GatePipeline(gate_name, ai, config["settings"])
+
+    # 3. Capture thread (latest frame wins) decodes into a shared-memory ring; the UI reads
+    #    the preview straight from it, only the slot number travels over the queue
+    settings = config["settings"]
+    reader = StreamReader(config["source"], settings["rtsp_transport"], name=f"Camera {gate_name}",
+                          on_status=lambda status: results.put((STATUS, gate_name, f"stream {status}")))
+
+    def send_preview(seq, frame):
+        ring = grabber.ring
+        results.put((FRAME, gate_name, (ring.name, ring.shape, ring.slots, seq)))
+
+    grabber = FrameGrabber(reader, config["ring_slots"], config["preview_fps"], on_preview=send_preview,
+                           analysis_fps=settings["analysis_fps"], name=f"Capture-{gate_name}")
+    grabber.start()
+    results.put((STATUS, gate_name, "running"))
+
+    # 4. Analysis loop on the newest frame
+    # Keep the supervisor's watchdog fed while no previews go out (tile hidden, stream reconnecting,
+    # a slow detection) - but only while capture makes progress, so a hung decoder is still caught.
+    # Carries this process's metrics to the UI (diagnostics panel / Prometheus file)
+    heartbeat_stop = threading.Event()
+
+    def heartbeat():
+        last_grabbed = -1
+        while not heartbeat_stop.wait(5):
+            if grabber.frames_grabbed != last_grabbed or not reader.connected:
+                results.put((HEARTBEAT, gate_name, REGISTRY.snapshot()))
+            last_grabbed = grabber.frames_grabbed
+
+    threading.Thread(target=heartbeat, name=f"Heartbeat-{gate_name}", daemon=True).start()
+
+    seq = 0
+    recapture_pending = False  # Answered with the next frame (or "no frame" if none arrives)
+    try:
+        while True:
+            try:
+                command = commands.get_nowait()
+            except queue.Empty:
+                command = None
+            if command == CMD_STOP:
+                break
+            if command == CMD_RECAPTURE:
+                recapture_pending = True
+            if isinstance(command, tuple) and command[0] == CMD_PREVIEW:
+                grabber.set_preview_fps(command[1])
+            if isinstance(command, tuple) and command[0] == CMD_PROFILE:
+                # Results go to logs/ like the UI process's, tagged with the gate
+                _, mode, duration, allocations = command
+                PROFILER.start(mode, duration, allocations, tag=f"gate_{re.sub(r'[^A-Za-z0-9_-]', '_', gate_name)}")
+
+            new_seq, frame = grabber.latest(seq)
+            if frame is None:
+                if recapture_pending:
+                    # Stalled / reconnecting stream: say so instead of letting the supervisor time out
+                    results.put((RECAPTURE, gate_name, (None, None)))
+                    recapture_pending = False
+                if grabber.ended:
+                    results.put((STATUS, gate_name, "stream ended"))
+                    break
+                continue
+            seq = new_seq
+
+            try:
+                PROFILER.poll()
+                if recapture_pending:
+                    # Copy: the answer outlives the slot
+                    results.put((RECAPTURE, gate_name, pipeline.recapture(frame.copy())))
+                    recapture_pending = False
+                _, plates = pipeline.process(frame)
+            except Exception:
+                # One bad frame must not cost the worker a restart (and a model reload)
+                logger.exception("Gate worker %s: processing frame %d failed", gate_name, seq)
+                continue
+            finally:
+                grabber.release(seq)
+            for text, crop in plates:
+                results.put((PLATE, gate_name, (text, crop)))
+    finally:
+        logger.info("Gate worker %s stopping (%d frames, %d skipped by the analysis rate, %d dropped as stale)",
+                    gate_name, grabber.frames_grabbed, grabber.frames_skipped, grabber.frames_dropped)
+        heartbeat_stop.set()
+        reader.stop()
+        grabber.stop()
+        if not grabber.is_alive():
+            reader.release()
+        ai.stop()
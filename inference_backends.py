@@ -0,0 +1,448 @@
+import os
+import json
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+# NOTE: torch / onnxruntime / openvino are imported inside the classes, so the UI can
+# import the constants below without paying for the heavy imports at startup.
+
+# Backend names accepted by AIEngine(backend=...)
+BACKENDS = ("torch", "onnx", "openvino")
+PRECISIONS = ("fp32", "int8")
+# PyTorch backend execution: plain eager, or inference_mode + channels_last + torch.compile (+ bf16 autocast)
+TORCH_MODES = ("eager", "optimized")
+
+# Where export_model.py writes the converted models (relative to the model folder)
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model_int8.onnx"
+OPENVINO_FILE = os.path.join("openvino", "model.xml")
+SAFETENSORS_FILE = "model.safetensors"
+# torch.compile artifacts (Inductor FX graph / kernel cache), reused by later starts
+TORCH_COMPILE_CACHE_DIR = "torch_compile_cache"
+# Optimized-mode self-test result, kept with the compile cache (re-run when torch or the model changes)
+SELF_TEST_FILE = "self_test.json"
+# Largest optimized-vs-eager deviation of the top detections accepted (bf16 autocast moves
+# sigmoid scores by ~1e-2; boxes are normalized cxcywh)
+SELF_TEST_TOP_K = 10
+SELF_TEST_MAX_SCORE_DIFF = 0.05
+SELF_TEST_MAX_BOX_DIFF = 0.02
+
+
+# safetensors dtype codes -> torch dtype names
+_SAFETENSORS_DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8", "U8": "uint8", "BOOL": "bool",
+}
+
+
+def load_safetensors_mmap(path):
+    """
+    State dict whose tensors point straight into a copy-on-write mmap of the file (no read, no copy).
+    Every process mapping the same file shares its page-cache pages, so N gate workers keep
+    ONE physical copy of the weights (a page only becomes private if a tensor is written to).
+    """
+    import mmap
+    import struct
+    import torch
+
+    # File layout: u64 header size, JSON header {name: {dtype, shape, data_offsets}}, raw data
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    data_start = 8 + header_size
+
+    state = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = getattr(torch, _SAFETENSORS_DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        count = (end - begin) // dtype.itemsize
+        if count == 0:
+            state[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        # frombuffer keeps the mmap alive for as long as the tensor exists
+        state[name] = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin).view(info["shape"])
+    return state
+
+
+def _rename_checkpoint_keys(state, model_type):
+    """Apply the key renames newer transformers versions do when loading older checkpoints."""
+    import re
+    try:
+        from transformers.conversion_mapping import get_checkpoint_conversion_mapping
+        renames = get_checkpoint_conversion_mapping(model_type) or []
+    except Exception:
+        return state
+
+    renamed = {}
+    for name, tensor in state.items():
+        for rename in renames:
+            for source, target in zip(getattr(rename, "source_patterns", []), getattr(rename, "target_patterns", [])):
+                name = re.sub(source, target, name)
+        renamed[name] = tensor
+    return renamed
+
+
+def load_mmap_model(model_path):
+    """
+    RT-DETR whose parameters ARE the mmap-backed tensors: the module is built on the meta
+    device (no weight allocation) and load_state_dict(assign=True) adopts the mapped tensors.
+    """
+    import itertools
+    import torch
+    from transformers import AutoConfig, RTDetrForObjectDetection
+
+    config = AutoConfig.from_pretrained(model_path)
+    with torch.device("meta"):
+        model = RTDetrForObjectDetection(config)
+
+    state = load_safetensors_mmap(os.path.join(model_path, SAFETENSORS_FILE))
+    expected = set(model.state_dict())
+    if not expected <= set(state):
+        state = _rename_checkpoint_keys(state, config.model_type)
+    missing = expected - set(state)
+    if missing:
+        raise KeyError(f"{len(missing)} weights missing from {SAFETENSORS_FILE}, e.g. {sorted(missing)[:3]}")
+
+    model.load_state_dict({name: state[name] for name in expected}, assign=True)
+    if any(t.is_meta for t in itertools.chain(model.parameters(), model.buffers())):
+        raise RuntimeError("Model has tensors that are not in the checkpoint")
+    return model
+
+
+def cpu_supports_bf16():
+    """True when oneDNN has fast bf16 kernels on this CPU (AVX512-BF16 / AMX)."""
+    import torch
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except Exception:
+        return False
+
+
+class TorchDetector:
+    """
+    PyTorch RT-DETR (the original path). Always available.
+
+    mode="optimized" (CPU only) runs under torch.inference_mode with channels_last
+    tensors, compiles the model with torch.compile (artifacts cached next to the model,
+    so only the first start pays the compile time) and uses bf16 autocast when the CPU
+    has native bf16 support. Any compile failure falls back to eager.
+
+    mmap_weights: the parameters are the memory-mapped model.safetensors, shared by every
+    process that maps it. Only the fp32 torch model keeps them shared: INT8 quantization
+    builds new (smaller) weights per process, and channels_last would copy the convolution
+    weights, so optimized mode skips channels_last while the weights are mapped.
+    """
+    name = "torch"
+
+    def __init__(self, model_path, device="cpu", precision="fp32", mode="eager", mmap_weights=False):
+        import torch
+        from transformers import RTDetrForObjectDetection
+        self.device = device
+        self.model = None
+        self.weights_shared = False  # Parameters still point into the shared mapping
+        if mmap_weights:
+            # Gate worker processes: one shared physical copy of the weights (see load_mmap_model)
+            try:
+                self.model = load_mmap_model(model_path)
+                self.weights_shared = True
+                logger.info("RT-DETR weights memory-mapped from %s", SAFETENSORS_FILE)
+            except Exception:
+                logger.exception("Memory-mapped weight loading failed, using from_pretrained")
+        if self.model is None:
+            self.model = RTDetrForObjectDetection.from_pretrained(model_path)
+        self.model = self.model.to(device)
+        self.model.eval()
+        self.eager_model = self.model
+        self.optimized = False
+        self.channels_last = False
+        self.autocast_dtype = None
+        self.self_test_path = None
+        # The self-test runs in the model loader thread while the inference worker is already serving
+        self._lock = threading.Lock()
+
+        if precision == "int8":
+            if device != "cpu":
+                logger.warning("INT8 dynamic quantization is CPU-only, keeping fp32 on %s", device)
+            else:
+                # Dynamic INT8: Linear layers (encoder/decoder) use int8 weights, activations quantized on the fly
+                if self.weights_shared:
+                    logger.warning("INT8 quantization copies the memory-mapped weights: every process keeps "
+                                   "its own (int8) copy instead of sharing one; use fp32 to share them")
+                    self.weights_shared = False
+                self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+                self.eager_model = self.model
+                self.name = "torch-int8"
+
+        if mode not in TORCH_MODES:
+            logger.warning("Unknown torch mode '%s', using eager", mode)
+        elif mode == "optimized":
+            if device != "cpu":
+                logger.warning("Optimized torch mode targets the CPU, running eager on %s", device)
+            else:
+                self._optimize(model_path, quantized=(precision == "int8"))
+
+    def _optimize(self, model_path, quantized=False):
+        import torch
+        self.optimized = True
+        self.name += "-optimized"
+        cache_dir = os.path.abspath(os.path.join(model_path, TORCH_COMPILE_CACHE_DIR))
+        self.self_test_path = os.path.join(cache_dir, SELF_TEST_FILE)
+        self.weights_path = os.path.join(model_path, SAFETENSORS_FILE)
+
+        # 1. channels_last: the ResNet backbone convolutions run faster on NHWC in oneDNN,
+        #    but converting them makes private copies of memory-mapped weights
+        if self.weights_shared:
+            logger.info("Weights are memory-mapped: optimized mode skips channels_last to keep them shared")
+        else:
+            self.model = self.model.to(memory_format=torch.channels_last)
+            self.eager_model = self.model
+            self.channels_last = True
+
+        if quantized:
+            # Dynamically quantized Linear layers neither compile nor autocast; keep them eager
+            logger.info("INT8 torch model: optimized mode uses inference_mode + channels_last only")
+            return
+
+        # 2. bf16 autocast only where the hardware has it (emulated bf16 is slower than fp32)
+        if cpu_supports_bf16():
+            self.autocast_dtype = torch.bfloat16
+        else:
+            logger.info("CPU has no native bf16 support, optimized mode stays in fp32")
+
+        # 3. torch.compile, with the Inductor caches on disk
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Assigned, not setdefault: importing torch/transformers may already have filled in /tmp
+            os.environ["TORCHINDUCTOR_CACHE_DIR"] = cache_dir
+            import torch._inductor.config as inductor_config
+            inductor_config.fx_graph_cache = True
+            self.model = torch.compile(self.eager_model)
+        except Exception:
+            logger.exception("torch.compile unavailable, optimized mode runs uncompiled")
+            self.model = self.eager_model
+
+    def _forward(self, model, pixel_values, optimized):
+        import torch
+        pixel_values = pixel_values.to(self.device)
+        if not optimized:
+            with torch.no_grad():
+                outputs = model(pixel_values=pixel_values)
+            return outputs.logits.cpu(), outputs.pred_boxes.cpu()
+
+        if self.channels_last:
+            pixel_values = pixel_values.contiguous(memory_format=torch.channels_last)
+        with torch.inference_mode(), torch.autocast("cpu", dtype=self.autocast_dtype or torch.float32,
+                                                    enabled=self.autocast_dtype is not None):
+            outputs = model(pixel_values=pixel_values)
+        # Post-processing expects fp32 (bf16 logits would also lose precision in the sigmoid)
+        return outputs.logits.float().cpu(), outputs.pred_boxes.float().cpu()
+
+    def __call__(self, pixel_values):
+        """pixel_values: float tensor [N,3,H,W]. Returns: (logits, pred_boxes) as CPU tensors"""
+        with self._lock:
+            if not self.optimized:
+                return self._forward(self.model, pixel_values, optimized=False)
+            try:
+                return self._forward(self.model, pixel_values, optimized=True)
+            except Exception:
+                if self.model is self.eager_model:
+                    raise
+                # torch.compile fails lazily (missing C++ compiler, unsupported op, ...): stay eager from now on
+                logger.exception("Compiled model failed, falling back to the eager model")
+                self.model = self.eager_model
+                return self._forward(self.model, pixel_values, optimized=True)
+
+    def use_eager(self):
+        """Leave the optimized mode for good (plain fp32 eager from the next call)"""
+        with self._lock:
+            self.model = self.eager_model
+            self.optimized = False
+            self.autocast_dtype = None
+            self.name = self.name.replace("-optimized", "")
+
+    def _self_test_key(self):
+        import torch
+        weights = self.weights_path if os.path.exists(self.weights_path) else os.path.dirname(self.weights_path)
+        return {"torch": torch.__version__, "bf16": self.autocast_dtype is not None,
+                "weights_mtime": os.path.getmtime(weights)}
+
+    def load_self_test(self):
+        """
+        Result of an earlier self-test with this torch build and weights, or None.
+        A stored failure switches to eager right away.
+        """
+        if not self.optimized or self.self_test_path is None or not os.path.exists(self.self_test_path):
+            return None
+        try:
+            with open(self.self_test_path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get("key") != self._self_test_key():
+            return None
+        if not stored["result"]["passed"]:
+            logger.warning("Optimized mode failed its self-test on an earlier start: running eager")
+            self.use_eager()
+        return stored["result"]
+
+    @staticmethod
+    def _top_detections(outputs, k):
+        """(scores, boxes) of the k best queries, best first. Query order itself is not stable:
+        RT-DETR picks its queries by top-k, so tiny numeric differences can reorder them."""
+        import torch
+        logits, boxes = outputs
+        scores = torch.sigmoid(logits[0]).max(dim=-1).values
+        top = scores.topk(min(k, scores.numel())).indices
+        return scores[top], boxes[0][top]
+
+    def self_test(self, pixel_values, runs=10):
+        """
+        Time the optimized model against plain eager fp32 on the same input.
+        Returns a dict with both latencies (ms), the speedup and the largest output
+        deviation, or None when the optimized mode is not active. Outputs that deviate
+        beyond the tolerance switch the detector back to eager. The result is saved
+        next to the compile cache (see load_self_test).
+        """
+        import time
+        import torch
+        if not self.optimized:
+            return None
+
+        def eager():
+            with self._lock:
+                return self._forward(self.eager_model, pixel_values, optimized=False)
+
+        candidates = (("eager", eager), ("optimized", lambda: self(pixel_values)))
+        timings, outputs = {}, {}
+        for label, run in candidates:
+            outputs[label] = run()  # Also the warm-up (and the compile, on a cold cache)
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                run()
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[label] = sorted(samples)[len(samples) // 2]
+
+        # Same detections? Top scores compared in rank order, every top eager box matched to the
+        # nearest optimized box
+        eager_scores, eager_boxes = self._top_detections(outputs["eager"], SELF_TEST_TOP_K)
+        opt_scores, _ = self._top_detections(outputs["optimized"], SELF_TEST_TOP_K)
+        max_score_diff = (eager_scores - opt_scores).abs().max().item()
+        opt_boxes = outputs["optimized"][1][0]
+        max_box_diff = torch.cdist(eager_boxes, opt_boxes, p=float("inf")).min(dim=1).values.max().item()
+        result = {
+            "eager_ms": timings["eager"],
+            "optimized_ms": timings["optimized"],
+            "speedup": timings["eager"] / max(timings["optimized"], 1e-6),
+            "max_box_diff": max_box_diff,
+            "max_score_diff": max_score_diff,
+            "bf16": self.autocast_dtype is not None,
+            "compiled": self.model is not self.eager_model,
+            "passed": max_score_diff <= SELF_TEST_MAX_SCORE_DIFF and max_box_diff <= SELF_TEST_MAX_BOX_DIFF,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.self_test_path), exist_ok=True)
+            with open(self.self_test_path, "w", encoding="utf-8") as f:
+                json.dump({"key": self._self_test_key(), "result": result}, f, indent=2)
+        except OSError:
+            logger.exception("Could not save the self-test result")
+        if not result["passed"]:
+            logger.error("Optimized mode deviates from eager (score %.4f, box %.4f): switching to eager",
+                         max_score_diff, max_box_diff)
+            self.use_eager()
+        return result
+
+
+class OnnxDetector:
+    """RT-DETR exported to ONNX, run on ONNX Runtime's CPU execution provider."""
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=0, precision="fp32"):
+        import onnxruntime as ort
+
+        if precision == "int8":
+            onnx_path = os.path.join(model_path, ONNX_INT8_FILE)
+            if not os.path.exists(onnx_path):
+                raise FileNotFoundError(f"{onnx_path} not found. Run: python export_model.py --quantize dynamic")
+            self.name = "onnx-int8"
+        else:
+            onnx_path = os.path.join(model_path, ONNX_FILE)
+            if not os.path.exists(onnx_path):
+                raise FileNotFoundError(f"{onnx_path} not found. Run: python export_model.py --format onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = int(num_threads)  # 0 = let ORT pick (physical cores)
+        options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, pixel_values):
+        import torch
+        logits, pred_boxes = self.session.run(["logits", "pred_boxes"],
+                                              {self.input_name: pixel_values.numpy()})
+        return torch.from_numpy(logits), torch.from_numpy(pred_boxes)
+
+
+class OpenVinoDetector:
+    """RT-DETR converted to OpenVINO IR, compiled for the CPU with a latency hint."""
+    name = "openvino"
+
+    def __init__(self, model_path, num_threads=0):
+        import openvino as ov
+
+        xml_path = os.path.join(model_path, OPENVINO_FILE)
+        if not os.path.exists(xml_path):
+            raise FileNotFoundError(f"{xml_path} not found. Run: python export_model.py --format openvino")
+
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if num_threads:
+            config["INFERENCE_NUM_THREADS"] = int(num_threads)
+
+        core = ov.Core()
+        self.compiled = core.compile_model(core.read_model(xml_path), "CPU", config)
+        self.request = self.compiled.create_infer_request()
+        self.out_logits = self.compiled.output("logits")
+        self.out_boxes = self.compiled.output("pred_boxes")
+
+    def __call__(self, pixel_values):
+        import torch
+        results = self.request.infer([pixel_values.numpy()])
+        return torch.from_numpy(results[self.out_logits].copy()), torch.from_numpy(results[self.out_boxes].copy())
+
+
+def load_detector(backend, model_path, device="cpu", num_threads=0, precision="fp32", torch_mode="eager",
+                  mmap_weights=False):
+    """
+    Build the requested detector backend. Any failure (runtime not installed,
+    model not exported yet, ...) falls back to the PyTorch model.
+    precision="int8" picks the quantized ONNX model, or dynamic INT8 on the PyTorch backend.
+    torch_mode / mmap_weights only apply to the PyTorch model (see TorchDetector).
+    """
+    if backend not in BACKENDS:
+        logger.warning("Unknown backend '%s', using torch", backend)
+        backend = "torch"
+    if precision not in PRECISIONS:
+        logger.warning("Unknown precision '%s', using fp32", precision)
+        precision = "fp32"
+
+    if backend == "onnx":
+        try:
+            return OnnxDetector(model_path, num_threads, precision)
+        except Exception:
+            logger.exception("ONNX Runtime backend unavailable, falling back to PyTorch")
+    elif backend == "openvino":
+        if precision == "int8":
+            logger.warning("No INT8 OpenVINO model is exported, running the OpenVINO model in fp32")
+        try:
+            return OpenVinoDetector(model_path, num_threads)
+        except Exception:
+            logger.exception("OpenVINO backend unavailable, falling back to PyTorch")
+
+    return TorchDetector(model_path, device, precision, mode=torch_mode, mmap_weights=mmap_weights)
@@ -0,0 +1,238 @@
+import threading
+import queue
+import time
+import logging
+from metrics import REGISTRY
+from profiler import PROFILER
+logger = logging.getLogger(__name__)
+
+
+# Request kinds
+READ = "read"       # Frame -> detector + filters + OCR of the best plate (detect_and_read)
+READ_ALL = "read_all"  # Frame -> every valid plate, all crops OCR'd in one batch (detect_and_read_all)
+DETECT = "detect"   # Frame -> detector + filters only (plate candidates for the tracker)
+OCR = "ocr"         # Plate crop -> OCR only
+
+_EMPTY_RESULTS = {READ: (None, 0, None), READ_ALL: [], DETECT: [], OCR: (None, 0, [])}
+
+# A gate never waits longer than this for a result (a stuck or dead worker must not freeze it)
+REQUEST_TIMEOUT = 30.0
+
+
+class InferenceRequest:
+    """One frame (or plate crop) submitted by a gate. The caller waits on it for the result."""
+
+    def __init__(self, gate_name, frame, roi=None, kind=READ):
+        self.gate_name = gate_name
+        self.frame = frame
+        self.roi = roi
+        self.kind = kind
+        self.result = _EMPTY_RESULTS[kind]
+        self._done = threading.Event()
+
+    def set_result(self, result):
+        if self._done.is_set():
+            return  # Cancelled (timed out / service stopped) before the worker got to it
+        self.result = result
+        self._done.set()
+
+    def cancel(self):
+        self.set_result(_EMPTY_RESULTS[self.kind])
+
+    def wait(self, timeout=REQUEST_TIMEOUT):
+        """Blocks until the batch containing this request is processed (empty result after `timeout` s).
+        Returns: READ   -> (detected_text, confidence, cropped_plate_image)
+                 READ_ALL -> list of plates (see AIEngine.detect_and_read_all)
+                 DETECT -> list of plate candidates (see AIEngine.detect_plates_batch)
+                 OCR    -> (clean_text, ocr_confidence, char_confidences)
+        """
+        if not self._done.wait(timeout):
+            logger.warning("Inference request from %s timed out after %.0f s", self.gate_name, timeout)
+            self.cancel()  # A late result from the worker is ignored
+            return _EMPTY_RESULTS[self.kind]
+        return self.result
+
+
+class InferenceService:
+    """
+    Shares ONE AIEngine (RT-DETR + EasyOCR) between all camera threads.
+
+    VideoThreads submit frames; a single worker thread collects whatever is pending
+    from all gates (up to max_batch, waiting at most max_wait_ms after the first frame)
+    and runs them through one batched forward pass. Results are routed back per request.
+    EasyOCR is not thread-safe, so OCR-only requests go through the same worker.
+
+    The engine can be attached later (set_engine) by the background ModelLoader;
+    until then requests return empty results immediately and cameras just preview.
+    """
+
+    def __init__(self, engine=None, max_batch=6, max_wait_ms=30):
+        self.engine = engine
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._running = False
+        self._worker = None
+        self.native_id = None      # OS thread id of the worker (CPU pinning)
+        self._num_threads = None   # torch intra-op threads requested by the CoreScheduler
+        self._metrics_handle = None
+        self._gates = set()        # Gates that submitted something (reported with depth 0 when idle)
+
+    @property
+    def ready(self):
+        return self.engine is not None
+
+    def set_engine(self, engine):
+        self.engine = engine
+
+    def set_num_threads(self, num_threads):
+        """Torch thread count for the worker. Applied by the worker itself before its next batch."""
+        self._num_threads = max(1, int(num_threads))
+
+    def _apply_num_threads(self):
+        num_threads, self._num_threads = self._num_threads, None
+        if num_threads is None:
+            return
+        import torch  # Already loaded by the engine at this point
+        if num_threads == torch.get_num_threads():
+            return  # Resizing rebuilds the OpenMP pool: only when it really changes
+        torch.set_num_threads(num_threads)
+        try:
+            # One inter-op thread: batching across gates already gives the parallelism
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Can only be set once per process
+        logger.info("Inference worker uses %d torch threads", num_threads)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name="InferenceService", daemon=True)
+        self._worker.start()
+        self._metrics_handle = REGISTRY.gauge_callback("smartgate_inference_queue_depth",
+                                                       "Requests waiting for the inference worker, per gate",
+                                                       self.queue_depth)
+        logger.info("Inference service started (max_batch=%d, max_wait=%.0f ms)",
+                    self.max_batch, self.max_wait * 1000)
+
+    def stop(self):
+        self._running = False
+        if self._metrics_handle is not None:
+            REGISTRY.remove_callback(self._metrics_handle)
+            self._metrics_handle = None
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+            self._worker = None
+
+        # Release anyone still waiting
+        while True:
+            try:
+                self._queue.get_nowait().cancel()
+            except queue.Empty:
+                break
+
+    def queue_depth(self):
+        """Pending requests per gate, as {(("gate", name),): count}"""
+        with self._queue.mutex:
+            gates = [request.gate_name for request in self._queue.queue]
+        depth = {(("gate", gate),): 0 for gate in tuple(self._gates)}
+        for gate in gates:
+            key = (("gate", gate),)
+            depth[key] = depth.get(key, 0) + 1
+        return depth
+
+    def submit(self, gate_name, frame, roi=None, kind=READ):
+        """Queue a frame (optionally limited to the gate ROI) for detection. Returns an InferenceRequest to wait on."""
+        request = InferenceRequest(gate_name, frame, roi, kind)
+        self._gates.add(gate_name)
+        if not self._running or self.engine is None:
+            request.cancel()
+            return request
+        self._queue.put(request)
+        return request
+
+    def detect_and_read(self, frame, gate_name="", roi=None):
+        """Blocking convenience wrapper with the same return value as AIEngine.detect_and_read"""
+        return self.submit(gate_name, frame, roi).wait()
+
+    def detect_and_read_all(self, frame, gate_name="", roi=None):
+        """Blocking: every valid plate in the frame (text, score, ocr_conf, box, crop)"""
+        return self.submit(gate_name, frame, roi, READ_ALL).wait()
+
+    def detect(self, frame, gate_name="", roi=None):
+        """Blocking: plate candidates (box, score, blur, crop) without OCR"""
+        return self.submit(gate_name, frame, roi, DETECT).wait()
+
+    def read_plate(self, plate_crop, gate_name=""):
+        """Blocking: OCR a single plate crop. Returns (clean_text, ocr_confidence, char_confidences)"""
+        return self.submit(gate_name, plate_crop, kind=OCR).wait()
+
+    def read_plates(self, plate_crops, gate_name=""):
+        """Blocking: OCR several crops. Submitted together so they land in the same recognizer batch."""
+        requests = [self.submit(gate_name, crop, kind=OCR) for crop in plate_crops]
+        return [request.wait() for request in requests]
+
+    def _collect_batch(self):
+        # 1. Wait for the first frame
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return []
+
+        # 2. Coalesce frames from other gates until the batch is full or the window closes
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        self.native_id = threading.get_native_id()
+        while self._running:
+            batch = []
+            try:
+                PROFILER.poll()  # Joins / leaves an on-demand profiling session
+                batch = self._collect_batch()
+                if batch:
+                    self._apply_num_threads()
+                    self._process(batch)
+            except Exception:
+                logger.exception("Batched inference failed (%d requests)", len(batch))
+            finally:
+                for request in batch:
+                    if not request._done.is_set():
+                        request.cancel()
+
+    def _process(self, batch):
+        # 1. All frame requests share ONE detector forward pass
+        frame_requests = [r for r in batch if r.kind in (READ, READ_ALL, DETECT)]
+        if frame_requests:
+            all_candidates = self.engine.detect_plates_batch([r.frame for r in frame_requests],
+                                                             [r.roi for r in frame_requests])
+            read_all = []
+            for request, candidates in zip(frame_requests, all_candidates):
+                if request.kind == DETECT:
+                    request.set_result(candidates)
+                elif request.kind == READ:
+                    request.set_result(self.engine.read_best_plate(candidates))
+                else:
+                    read_all.append((request, candidates))
+
+            # Every crop of every READ_ALL frame in one recognizer batch
+            if read_all:
+                all_plates = self.engine.read_all_plates([candidates for _, candidates in read_all])
+                for (request, _), plates in zip(read_all, all_plates):
+                    request.set_result(plates)
+
+        # 2. OCR-only requests (plate crops from the tracker), all gates in ONE recognizer batch
+        ocr_requests = [r for r in batch if r.kind == OCR]
+        if ocr_requests:
+            for request, result in zip(ocr_requests, self.engine.read_plates([r.frame for r in ocr_requests])):
+                request.set_result(result)
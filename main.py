@@ -2,80 +2,182 @@ import sys
 import os
 import cv2
 import logging
+from collections import deque
 from app_logging import setup_logging, enable_file_logging 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QLabel, QVBoxLayout, QHBoxLayout, 
     QWidget, QPushButton, QFrame, QStackedWidget, QListWidget, 
     QSpacerItem, QSizePolicy, QMessageBox, QLineEdit, QDateEdit, 
-    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFormLayout, QCheckBox
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFormLayout, QCheckBox, QComboBox, QSpinBox
 )
 from PyQt6.QtGui import QImage, QPixmap, QFont, QIcon, QAction
-from PyQt6.QtCore import QThread, pyqtSignal, Qt, QSize, QDate, QSettings 
+from PyQt6.QtCore import QThread, pyqtSignal, Qt, QSize, QDate, QSettings, QTimer
 
 # Import our custom modules
-from database_manager import init_db, search_entry_logs, get_all_gates
+from database_manager import init_db, search_entry_logs, get_all_gates, get_gate_settings
 from login_ui import LoginWindow
 from change_pass_ui import ChangePasswordDialog
-from detection_engine import AIEngine
+from inference_service import InferenceService
+from model_loader import ModelLoader
+from inference_backends import BACKENDS, PRECISIONS, TORCH_MODES
 from entry_dialog import EntryDialog
 import time
+import threading
 from camera_setup_ui import CameraSetupDialog
+from gate_pipeline import GatePipeline
+from frame_grabber import FrameGrabber
+from stream_reader import StreamReader
+from camera_grid import CameraGrid
+from preview_buffer import PreviewBufferPool
+from gate_process import GateSupervisor, GateProcessHandle
+from cpu_scheduler import CoreScheduler, available_cpus
+from metrics import REGISTRY, diagnostics_report
+from profiler import PROFILER, MODES, install_signal_handler
 
 logger = logging.getLogger(__name__)
 
+# Pipeline metrics in the Prometheus text format (e.g. for node_exporter's textfile collector)
+METRICS_FILE = os.path.join("logs", "smartgate_metrics.prom")
+METRICS_INTERVAL_MS = 5000
+
 # --- WORKER THREAD (Handles Camera) ---
 class VideoThread(QThread):
-    change_pixmap_signal = pyqtSignal(QImage)
+    change_pixmap_signal = pyqtSignal(object, str)  # PreviewFrame, gate_name
     plate_detected_signal = pyqtSignal(str, object, str) # Sends Text and Image
     running = True
-    current_frame = None
 
-    def __init__(self, source, gate_name):
+    def __init__(self, source, gate_name, ai_service, scheduler=None):
         super().__init__()
-        # Check if source is digit (0,1) or string (RTSP)
-        self.source = int(source) if source.isdigit() else source
+        # USB index ('0', '1'), RTSP URL or a local video file (see StreamReader)
+        self.source = source
         self.gate_name = gate_name
-        self.ai = AIEngine() # Each camera gets its own AI instance (Heavy, but necessary for parallel)
-        # Optimization: You can share one AI instance across threads if GPU VRAM is tight, 
-        # using a Queue system. For now, let's keep it simple.
+        # All cameras share ONE AI instance. Frames are batched across gates by the service.
+        self.ai_service = ai_service
+
+        # Motion gate -> detector -> tracker -> OCR (shared with the gate worker processes)
+        self.settings = get_gate_settings(gate_name)
+        self.pipeline = GatePipeline(gate_name, ai_service, self.settings)
+        self.roi = self.pipeline.roi
+
+        # CPU budget: gates with activity get priority (see CoreScheduler)
+        self.scheduler = scheduler
+        self.native_id = None
+        self.active = False
+
+        # Capture runs in its own thread (latest frame wins) and decodes into a shared frame ring
+        self.reader = None
+        self.grabber = None
+        self.ring_slots = 8
+        # Set by the live view (set_preview): nothing is rendered until its tile is on screen
+        self.preview_fps = 0
+        self.preview_size = (800, 600)
+        self.preview_pool = PreviewBufferPool()  # Used from the grabber thread
+
+        # Replays / load tests (replay_harness.py): extra StreamReader options (speed, timestamps,
+        # replay), lockstep capture, and a hook on_analyzed(gate_name, seq, capture_time, plates)
+        self.reader_options = {}
+        self.lockstep = False
+        self.on_analyzed = None
 
     def run(self):
-        
-        
-        
-        cap = cv2.VideoCapture(0)
-        
-        last_detection_time = 0
-        cooldown_seconds = 5 # Wait 5 seconds before detecting same car again
-
+        self.native_id = threading.get_native_id()
+        threading.current_thread().name = f"Video-{self.gate_name}"  # For profiles and thread dumps
+
+        # Reconnects on its own (exponential backoff) instead of ending the gate on a failed read.
+        # Every (re)connect re-pins the capture thread, whose decoder threads inherit its cores.
+        options = dict(self.reader_options)
+        if self.scheduler:
+            options.setdefault("decode_threads", self.scheduler.decode_threads())
+        self.reader = StreamReader(self.source, self.settings["rtsp_transport"], name=f"Camera {self.gate_name}",
+                                   on_status=self.stream_status, **options)
+
+        # Capture thread keeps draining the camera; the preview is fed from there, not after inference
+        self.grabber = FrameGrabber(self.reader, self.ring_slots, self.preview_fps, on_preview=self.update_preview,
+                                    analysis_fps=self.settings["analysis_fps"], name=f"Capture-{self.gate_name}",
+                                    lockstep=self.lockstep)
+        self.grabber.start()
+        if self.scheduler:
+            self.scheduler.thread_started(self)  # Both threads exist now
+
+        seq = 0
         while self.running:
-            ret, frame = cap.read()
-            if ret:
-                self.current_frame = frame.copy()
-                # 1. AI DETECTION LOGIC
-                # Only run AI if cooldown passed
-                if time.time() - last_detection_time > cooldown_seconds:
-                    
-                    # Run Detection
-                    text, conf, crop_img = self.ai.detect_and_read(frame)
-                    
-                    if text:
-                        logger.info("Detected plate: %s", text)
-                        last_detection_time = time.time()
-                        # Emit Signal to Main Thread to show Popup
-                        self.plate_detected_signal.emit(text, crop_img, self.gate_name)
-
-                # 2. Update GUI Video Feed
-                rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                h, w, ch = rgb_image.shape
-                bytes_per_line = ch * w
-                convert_to_qt_format = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-                p = convert_to_qt_format.scaled(800, 600, Qt.AspectRatioMode.KeepAspectRatio)
-                self.change_pixmap_signal.emit(p)
-            else:
-                break
-        cap.release()
+            # 1. Newest frame at the barrier (whatever arrived while the AI was busy is skipped)
+            new_seq, frame = self.grabber.latest(seq)
+            if frame is None:
+                if self.grabber.ended:
+                    break
+                continue
+            seq = new_seq
+
+            # 2. AI DETECTION LOGIC (the slot is held, capture writes around it)
+            try:
+                PROFILER.poll()  # Joins / leaves an on-demand profiling session
+                # Lockstep replays run on the recording's clock, so results do not depend on speed
+                now = self.grabber.media_time(seq) if self.lockstep else None
+                has_motion, plates = self.pipeline.process(frame, now)
+                if self.on_analyzed is not None:
+                    self.on_analyzed(self.gate_name, seq, self.grabber.capture_time(seq), plates)
+            except Exception:
+                # One bad frame (or hook) must not end the gate
+                logger.exception("Camera %s: processing frame %d failed", self.gate_name, seq)
+                continue
+            finally:
+                self.grabber.release(seq)
+            if has_motion != self.active and self.scheduler:
+                self.scheduler.set_active(self.gate_name, has_motion)
+            self.active = has_motion
+
+            for text, crop in plates:
+                # Emit Signal to Main Thread to show Popup
+                self.plate_detected_signal.emit(text, crop, self.gate_name)  # Crops are private copies
+
+        logger.info("Camera %s stopped (%d frames, %d skipped by the analysis rate, %d dropped as stale; %d previews, "
+                    "%d skipped while the GUI was busy)",
+                    self.gate_name, self.grabber.frames_grabbed, self.grabber.frames_skipped, self.grabber.frames_dropped,
+                    self.preview_pool.frames_rendered, self.preview_pool.frames_skipped)
+        self.reader.stop()  # Wakes the grabber if it is waiting to reconnect
+        self.grabber.stop()
+        if not self.grabber.is_alive():
+            self.reader.release()
+
+    @property
+    def capture_native_id(self):
+        """OS thread id of the capture thread (CPU pinning, see CoreScheduler)"""
+        return self.grabber.native_id if self.grabber is not None else None
+
+    def stream_status(self, status):
+        """StreamReader callback (capture thread)"""
+        if status == "connected" and self.scheduler:
+            self.scheduler.thread_started(self)
+
+    def update_preview(self, seq, frame):
+        """Update GUI Video Feed (called from the capture thread at preview_fps)"""
+        # Downscaled to the tile, then converted into a pooled buffer (no per-frame allocation)
+        preview = self.preview_pool.render(frame, self.preview_size)
+        if preview is not None:
+            self.change_pixmap_signal.emit(preview, self.gate_name)
+
+    def set_preview(self, fps, size):
+        """Live view tile state: fps 0 while hidden, size = tile size in pixels"""
+        self.preview_size = size
+        self.preview_fps = fps
+        if self.grabber is not None:
+            self.grabber.set_preview_fps(fps)
+
+    @property
+    def frames_dropped(self):
+        return self.grabber.frames_dropped if self.grabber else 0
     
+    def recapture(self):
+        """Fresh read of the latest frame (EntryDialog 'Recapture'). Returns (image, text)"""
+        # Own copy: the capture loop keeps recycling slots while the AI and the dialog use it
+        ring = self.grabber.ring if self.grabber else None
+        frame = ring.copy(ring.latest_seq) if ring is not None else None
+        if frame is None:
+            return None, None
+        # Goes through the shared service so it is batched with the live gates
+        return self.pipeline.recapture(frame)
+
     def stop(self):
         self.running = False
         self.wait()
@@ -112,10 +214,28 @@ class SidebarButton(QPushButton):
 
 # --- MAIN DASHBOARD WINDOW ---
 class SmartGateApp(QMainWindow):
-    def __init__(self, username, role):
+    profile_finished_signal = pyqtSignal(list)  # Paths written by an on-demand profiling session
+
+    def __init__(self, username, role, ai_service=None, model_loader=None):
         super().__init__()
         self.username = username
         self.role = role
+
+        self.settings = QSettings("SmartGateCorp", "SmartGateApp")
+
+        # One shared AI engine for every gate (re-used across logout/login).
+        # Normally the loader was already started behind the login screen.
+        if ai_service is None:
+            ai_service, model_loader = start_model_loader(self.settings)
+        self.ai_service = ai_service
+        self.ai_service.start()
+        self.model_loader = model_loader
+        self.gate_supervisor = None  # Multiprocess mode only
+
+        # Splits the CPU between the inference worker and the camera threads
+        self.scheduler = CoreScheduler(core_budget=self.settings.value("cpu_core_budget", 0, type=int),
+                                       pin_threads=self.settings.value("cpu_pin_threads", False, type=bool))
+        self.scheduler.attach_inference(self.ai_service)
         
         self.setWindowTitle("Smart Gate ANPR System")
         self.setGeometry(50, 50, 1280, 720)
@@ -147,6 +267,17 @@ class SmartGateApp(QMainWindow):
         self.pages.addWidget(self.page_logs)
         self.pages.addWidget(self.page_settings)
 
+        # Diagnostics panel + metrics file, refreshed periodically
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.refresh_metrics)
+        self.metrics_timer.start(METRICS_INTERVAL_MS)
+
+        # On-demand profiling: Settings page button, or `kill -USR1 <pid>` on a kiosk without a keyboard
+        self.profile_timer = QTimer(self)
+        self.profile_timer.timeout.connect(PROFILER.poll)  # The UI thread joins deterministic sessions
+        self.profile_finished_signal.connect(self.profiling_finished)
+        install_signal_handler(self.toggle_profiling)
+
         
 
         # Start Video
@@ -156,12 +287,17 @@ class SmartGateApp(QMainWindow):
         #self.thread.start()
 
         self.camera_threads = [] 
+
+        # Detections waiting for the guard (one Entry Dialog at a time)
+        self.pending_detections = deque()
+        self.entry_dialog_open = False
         
         # Start configured cameras
         self.start_all_cameras()
 
     def start_all_cameras(self):
         # 1. Clear existing
+        self.stop_gate_processes()
         for t in self.camera_threads:
             t.stop()
             t.wait()
@@ -170,18 +306,70 @@ class SmartGateApp(QMainWindow):
         # 2. Get from DB
         gates = get_all_gates()
         
+        self.camera_grid.set_gates([name for g_id, name, source in gates])
         if not gates:
+            self.scheduler.set_gates([])
             logger.warning("No cameras configured.")
             return
 
-        # 3. Start a thread for each
-        for g_id, name, source in gates:
-            thread = VideoThread(source, name)
-            thread.change_pixmap_signal.connect(self.update_image) # NOTE: This logic needs update for multi-view
-            thread.plate_detected_signal.connect(self.handle_detection)
-            thread.start()
-            self.camera_threads.append(thread)
-            logger.info("Started Camera: %s on %s", name, source)
+        if self.settings.value("multiprocess_gates", False, type=bool):
+            self.start_gate_processes(gates)
+            if self.model_loader is None:
+                self.update_ai_status("AI engine runs in the gate processes", 100)
+        else:
+            # 3. Start a thread for each (they share the UI process's engine)
+            self.load_engine_if_needed()
+            for g_id, name, source in gates:
+                thread = VideoThread(source, name, self.ai_service, self.scheduler)
+                thread.change_pixmap_signal.connect(self.camera_grid.update_tile)
+                thread.plate_detected_signal.connect(self.handle_detection)
+                thread.start()
+                self.camera_threads.append(thread)
+                logger.info("Started Camera: %s on %s", name, source)
+
+            # 4. Re-split the core budget for the new set of gates
+            self.scheduler.set_gates(self.camera_threads)
+
+        # 5. Tell the new producers which tiles are on screen, and at what size
+        self.camera_grid.refresh()
+
+    def load_engine_if_needed(self):
+        """Threaded gates need the UI process's engine; a multiprocess boot skipped loading it"""
+        if self.ai_service.ready or self.model_loader is not None:
+            return
+        self.model_loader = create_model_loader(self.ai_service, self.settings)
+        self.model_loader.progress_signal.connect(self.update_ai_status)
+        self.model_loader.start()
+
+    def start_gate_processes(self, gates):
+        """Multiprocess mode: one supervised worker process per gate (see GateSupervisor)"""
+        # Workers own their cores; the in-process scheduler only sizes the UI's inference service
+        self.scheduler.set_gates([])
+        threads_per_gate = max(1, len(self.scheduler.cpus) // len(gates))
+        configs = [{
+            "gate_name": name,
+            "source": str(source),
+            "settings": get_gate_settings(name),
+            "backend": self.settings.value("ai_backend", "torch", type=str),
+            "precision": self.settings.value("ai_precision", "fp32", type=str),
+            "torch_mode": self.settings.value("ai_torch_mode", "eager", type=str),
+            "num_threads": threads_per_gate,
+            "preview_fps": 0,  # Until the live view reports the tile as visible
+            "ring_slots": 8,
+        } for g_id, name, source in gates]
+
+        self.gate_supervisor = GateSupervisor(configs)
+        self.gate_supervisor.change_pixmap_signal.connect(self.camera_grid.update_tile)
+        self.gate_supervisor.status_signal.connect(self.camera_grid.set_status)
+        self.gate_supervisor.plate_detected_signal.connect(self.handle_detection)
+        self.gate_supervisor.start()
+        self.camera_threads = [GateProcessHandle(self.gate_supervisor, name) for g_id, name, source in gates]
+        logger.info("Started %d gate worker processes (%d threads each)", len(gates), threads_per_gate)
+
+    def stop_gate_processes(self):
+        if self.gate_supervisor is not None:
+            self.gate_supervisor.stop()
+            self.gate_supervisor = None
 
     def handle_detection(self, text, crop_img):
         """
@@ -239,6 +427,7 @@ class SmartGateApp(QMainWindow):
         # 4. Settings
         self.btn_settings = SidebarButton("  ⚙  Settings")
         self.btn_settings.clicked.connect(lambda: self.pages.setCurrentIndex(2))
+        self.btn_settings.clicked.connect(self.refresh_metrics)  # Diagnostics panel up to date right away
 
         layout.addWidget(self.btn_home)
         layout.addWidget(self.btn_manual) # Added here
@@ -270,17 +459,32 @@ class SmartGateApp(QMainWindow):
         layout = QVBoxLayout()
         
         # Header
+        header_layout = QHBoxLayout()
         lbl_head = QLabel("Live Camera Feed")
         lbl_head.setStyleSheet("color: white; font-size: 18px; font-weight: bold; padding: 10px;")
-        layout.addWidget(lbl_head)
-        
-        # Video Area (Now Full Width)
-        self.lbl_video = QLabel()
-        self.lbl_video.setStyleSheet("background-color: black; border-radius: 8px; border: 2px solid #333;")
-        self.lbl_video.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.lbl_video.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        header_layout.addWidget(lbl_head)
+        header_layout.addStretch()
+
+        # AI Engine status (models load in the background while cameras already preview)
+        self.lbl_ai_status = QLabel()
+        self.lbl_ai_status.setStyleSheet("color: #ffaa00; font-size: 12px; padding: 10px;")
+        header_layout.addWidget(self.lbl_ai_status)
+        layout.addLayout(header_layout)
+
+        if self.model_loader is not None and not self.model_loader.isFinished():
+            self.model_loader.progress_signal.connect(self.update_ai_status)
+            self.update_ai_status(self.model_loader.status_text, self.model_loader.status_percent)
+        elif self.model_loader is not None:
+            self.update_ai_status(self.model_loader.status_text, 100)
+        else:
+            self.update_ai_status("AI engine ready" if self.ai_service.ready else "AI engine not loaded", 100)
         
-        layout.addWidget(self.lbl_video)
+        # Video Area: one tile per gate (previews pause while this page is hidden)
+        self.camera_grid = CameraGrid(max_fps=self.settings.value("preview_fps", 10, type=int))
+        self.camera_grid.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.camera_grid.preview_changed.connect(self.update_preview_target)
+
+        layout.addWidget(self.camera_grid)
         page.setLayout(layout)
         return page
 
@@ -470,7 +674,6 @@ class SmartGateApp(QMainWindow):
         """)
         
         # Load saved setting (Default: True)
-        self.settings = QSettings("SmartGateCorp", "SmartGateApp")
         is_logging_enabled = self.settings.value("logging_enabled", True, type=bool)
         
         # Apply logic immediately
@@ -483,6 +686,171 @@ class SmartGateApp(QMainWindow):
         layout.addWidget(self.chk_logging)
         # ---------------------------------------------------------
 
+        # ---------------------------------------------------------
+        # 5. AI ENGINE SETTINGS
+        # ---------------------------------------------------------
+        layout.addSpacing(20)
+        lbl_ai = QLabel("AI Engine")
+        lbl_ai.setStyleSheet("color: #aaa; font-weight: bold; border-bottom: 1px solid #333; padding-bottom: 5px;")
+        layout.addWidget(lbl_ai)
+
+        ai_form = QFormLayout()
+        self.combo_backend = QComboBox()
+        self.combo_backend.addItems(BACKENDS)
+        self.combo_backend.setCurrentText(self.settings.value("ai_backend", "torch", type=str))
+        self.combo_backend.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.combo_backend.setFixedWidth(200)
+        self.combo_backend.currentTextChanged.connect(self.change_backend_handler)
+
+        lbl_backend = QLabel("Detection Backend:")
+        lbl_backend.setStyleSheet("color: white;")
+        ai_form.addRow(lbl_backend, self.combo_backend)
+
+        self.combo_precision = QComboBox()
+        self.combo_precision.addItems(PRECISIONS)
+        self.combo_precision.setCurrentText(self.settings.value("ai_precision", "fp32", type=str))
+        self.combo_precision.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.combo_precision.setFixedWidth(200)
+        self.combo_precision.currentTextChanged.connect(self.change_precision_handler)
+
+        lbl_precision = QLabel("Model Precision:")
+        lbl_precision.setStyleSheet("color: white;")
+        ai_form.addRow(lbl_precision, self.combo_precision)
+
+        self.combo_torch_mode = QComboBox()
+        self.combo_torch_mode.addItems(TORCH_MODES)
+        self.combo_torch_mode.setCurrentText(self.settings.value("ai_torch_mode", "eager", type=str))
+        self.combo_torch_mode.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.combo_torch_mode.setFixedWidth(200)
+        self.combo_torch_mode.currentTextChanged.connect(self.change_torch_mode_handler)
+
+        lbl_torch_mode = QLabel("PyTorch Mode:")
+        lbl_torch_mode.setStyleSheet("color: white;")
+        ai_form.addRow(lbl_torch_mode, self.combo_torch_mode)
+        layout.addLayout(ai_form)
+
+        lbl_backend_hint = QLabel("ONNX / OpenVINO / INT8 need 'python export_model.py' first. "
+                                  "Optimized PyTorch mode compiles the model on its first start. Applies after restart.")
+        lbl_backend_hint.setStyleSheet("color: #666; font-size: 11px;")
+        layout.addWidget(lbl_backend_hint)
+
+        cpu_form = QFormLayout()
+        self.spin_core_budget = QSpinBox()
+        self.spin_core_budget.setRange(0, len(available_cpus()))
+        self.spin_core_budget.setSpecialValueText("All cores")
+        self.spin_core_budget.setValue(self.settings.value("cpu_core_budget", 0, type=int))
+        self.spin_core_budget.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.spin_core_budget.setFixedWidth(200)
+        self.spin_core_budget.valueChanged.connect(self.change_cpu_budget_handler)
+
+        lbl_core_budget = QLabel("CPU Core Budget:")
+        lbl_core_budget.setStyleSheet("color: white;")
+        cpu_form.addRow(lbl_core_budget, self.spin_core_budget)
+
+        self.chk_pin_threads = QCheckBox("Pin threads to CPU cores")
+        self.chk_pin_threads.setChecked(self.settings.value("cpu_pin_threads", False, type=bool))
+        self.chk_pin_threads.setStyleSheet("color: white;")
+        self.chk_pin_threads.toggled.connect(self.change_cpu_budget_handler)
+        cpu_form.addRow("", self.chk_pin_threads)
+        layout.addLayout(cpu_form)
+
+        self.chk_multiprocess = QCheckBox("Run each gate in its own process (isolates stream crashes)")
+        self.chk_multiprocess.setChecked(self.settings.value("multiprocess_gates", False, type=bool))
+        self.chk_multiprocess.setStyleSheet("color: white;")
+        self.chk_multiprocess.toggled.connect(self.toggle_multiprocess_handler)
+        layout.addWidget(self.chk_multiprocess)
+        # ---------------------------------------------------------
+
+        # ---------------------------------------------------------
+        # 6. LIVE MONITOR
+        # ---------------------------------------------------------
+        layout.addSpacing(20)
+        lbl_live = QLabel("Live Monitor")
+        lbl_live.setStyleSheet("color: #aaa; font-weight: bold; border-bottom: 1px solid #333; padding-bottom: 5px;")
+        layout.addWidget(lbl_live)
+
+        live_form = QFormLayout()
+        self.spin_preview_fps = QSpinBox()
+        self.spin_preview_fps.setRange(1, 30)
+        self.spin_preview_fps.setSuffix(" fps")
+        self.spin_preview_fps.setValue(self.settings.value("preview_fps", 10, type=int))
+        self.spin_preview_fps.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.spin_preview_fps.setFixedWidth(200)
+        self.spin_preview_fps.valueChanged.connect(self.change_preview_fps_handler)
+
+        lbl_preview_fps = QLabel("Preview Frame Rate:")
+        lbl_preview_fps.setStyleSheet("color: white;")
+        live_form.addRow(lbl_preview_fps, self.spin_preview_fps)
+        layout.addLayout(live_form)
+        # ---------------------------------------------------------
+
+        # ---------------------------------------------------------
+        # 7. DIAGNOSTICS
+        # ---------------------------------------------------------
+        layout.addSpacing(20)
+        lbl_diag = QLabel("Diagnostics")
+        lbl_diag.setStyleSheet("color: #aaa; font-weight: bold; border-bottom: 1px solid #333; padding-bottom: 5px;")
+        layout.addWidget(lbl_diag)
+
+        self.lbl_metrics = QLabel("No frames analyzed yet")
+        self.lbl_metrics.setStyleSheet("color: #ccc; font-family: Consolas, monospace; font-size: 11px;")
+        self.lbl_metrics.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.lbl_metrics)
+
+        lbl_metrics_hint = QLabel(f"Latencies since start. Also written every {METRICS_INTERVAL_MS // 1000}s "
+                                  f"to {METRICS_FILE} (Prometheus text format).")
+        lbl_metrics_hint.setStyleSheet("color: #666; font-size: 11px;")
+        layout.addWidget(lbl_metrics_hint)
+        # ---------------------------------------------------------
+
+        # ---------------------------------------------------------
+        # 8. PROFILING
+        # ---------------------------------------------------------
+        layout.addSpacing(20)
+        lbl_prof = QLabel("Profiling")
+        lbl_prof.setStyleSheet("color: #aaa; font-weight: bold; border-bottom: 1px solid #333; padding-bottom: 5px;")
+        layout.addWidget(lbl_prof)
+
+        prof_form = QFormLayout()
+        self.combo_profile_mode = QComboBox()
+        self.combo_profile_mode.addItems(MODES)
+        self.combo_profile_mode.setCurrentText(self.settings.value("profile_mode", MODES[0], type=str))
+        self.combo_profile_mode.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.combo_profile_mode.setFixedWidth(200)
+
+        lbl_profile_mode = QLabel("Profiler:")
+        lbl_profile_mode.setStyleSheet("color: white;")
+        prof_form.addRow(lbl_profile_mode, self.combo_profile_mode)
+
+        self.spin_profile_duration = QSpinBox()
+        self.spin_profile_duration.setRange(5, 600)
+        self.spin_profile_duration.setSuffix(" s")
+        self.spin_profile_duration.setValue(self.settings.value("profile_duration", 30, type=int))
+        self.spin_profile_duration.setStyleSheet("padding: 5px; color: white; background: #444;")
+        self.spin_profile_duration.setFixedWidth(200)
+
+        lbl_profile_duration = QLabel("Duration:")
+        lbl_profile_duration.setStyleSheet("color: white;")
+        prof_form.addRow(lbl_profile_duration, self.spin_profile_duration)
+
+        self.chk_profile_alloc = QCheckBox("Track allocations (tracemalloc)")
+        self.chk_profile_alloc.setChecked(self.settings.value("profile_allocations", False, type=bool))
+        self.chk_profile_alloc.setStyleSheet("color: white;")
+        prof_form.addRow("", self.chk_profile_alloc)
+        layout.addLayout(prof_form)
+
+        self.btn_profile = QPushButton("Start Profiling")
+        self.btn_profile.setFixedSize(200, 40)
+        self.btn_profile.setStyleSheet("background-color: #444; color: white; border-radius: 5px;")
+        self.btn_profile.clicked.connect(self.toggle_profiling)
+        layout.addWidget(self.btn_profile)
+
+        self.lbl_profile_status = QLabel("Results are saved to the logs folder. Also started by SIGUSR1.")
+        self.lbl_profile_status.setStyleSheet("color: #666; font-size: 11px;")
+        self.lbl_profile_status.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.lbl_profile_status)
+        # ---------------------------------------------------------
+
         layout.addStretch()
         page.setLayout(layout)
         return page
@@ -498,21 +866,105 @@ class SmartGateApp(QMainWindow):
         status = "enabled" if checked else "disabled"
         print(f"Logging {status}") # Console confirmation
 
+    def change_backend_handler(self, backend):
+        """Callback when user picks a different detection backend"""
+        self.settings.setValue("ai_backend", backend)
+        logger.info("Detection backend set to %s (applies after restart)", backend)
+
+    def change_precision_handler(self, precision):
+        """Callback when user switches between the fp32 and INT8 detector"""
+        self.settings.setValue("ai_precision", precision)
+        logger.info("Detection precision set to %s (applies after restart)", precision)
+
+    def change_cpu_budget_handler(self, *_):
+        """Callback for the core budget / pinning controls (applied immediately)"""
+        budget = self.spin_core_budget.value()
+        pin = self.chk_pin_threads.isChecked()
+        self.settings.setValue("cpu_core_budget", budget)
+        self.settings.setValue("cpu_pin_threads", pin)
+        self.scheduler.configure(budget, pin)
+
+    def toggle_multiprocess_handler(self, checked):
+        """Callback for the multiprocess checkbox: restarts the gates in the new mode"""
+        self.settings.setValue("multiprocess_gates", checked)
+        logger.info("Multiprocess gates %s", "enabled" if checked else "disabled")
+        self.start_all_cameras()
+
+    def change_torch_mode_handler(self, mode):
+        """Callback when user switches the PyTorch backend between eager and optimized execution"""
+        self.settings.setValue("ai_torch_mode", mode)
+        logger.info("PyTorch mode set to %s (applies after restart)", mode)
+
     
+    def change_preview_fps_handler(self, fps):
+        self.settings.setValue("preview_fps", fps)
+        self.camera_grid.set_max_fps(fps)  # Applies to visible tiles right away
+        logger.info("Live preview capped at %d fps", fps)
+
+    def refresh_metrics(self):
+        """Timer: metrics file for scrapers, and the diagnostics panel while the Settings page is shown"""
+        try:
+            REGISTRY.write_prometheus(METRICS_FILE)
+        except OSError as e:
+            logger.warning("Could not write %s: %s", METRICS_FILE, e)
+        if self.pages.currentWidget() is self.page_settings:
+            self.lbl_metrics.setText(diagnostics_report())
+
+    def toggle_profiling(self):
+        """Settings button / SIGUSR1: start a profiling session, or end the running one early"""
+        if PROFILER.active:
+            PROFILER.stop()
+            return
+        mode = self.combo_profile_mode.currentText()
+        duration = self.spin_profile_duration.value()
+        allocations = self.chk_profile_alloc.isChecked()
+        self.settings.setValue("profile_mode", mode)
+        self.settings.setValue("profile_duration", duration)
+        self.settings.setValue("profile_allocations", allocations)
+
+        if not PROFILER.start(mode, duration, allocations, out_dir="logs", tag="app",
+                              on_done=self.profile_finished_signal.emit):
+            return
+        session = PROFILER.session
+        mode = session.mode if session is not None else mode  # Deterministic falls back on Python 3.12+
+        if self.gate_supervisor is not None:
+            self.gate_supervisor.start_profiling(mode, duration, allocations)
+        self.profile_timer.start(200)
+        self.btn_profile.setText("Stop Profiling")
+        self.lbl_profile_status.setText(f"Profiling ({mode}) for {duration} s...")
+        self.lbl_profile_status.setStyleSheet("color: #ffaa00; font-size: 11px;")
+
+    def profiling_finished(self, paths):
+        self.profile_timer.stop()
+        PROFILER.poll()  # Hand over the UI thread's profile (the session already ended)
+        self.btn_profile.setText("Start Profiling")
+        self.lbl_profile_status.setText("Saved: " + ", ".join(os.path.basename(p) for p in paths) if paths
+                                        else "Profiling produced no output - see the log")
+        self.lbl_profile_status.setStyleSheet("color: #00cc66; font-size: 11px;" if paths
+                                              else "color: #ff4444; font-size: 11px;")
+
     def open_camera_setup(self):
         dialog = CameraSetupDialog()
         dialog.exec()
         # Restart cameras after config changes
         self.start_all_cameras()
 
-    def update_image(self, qt_img):
-        # 1. Always keep the QPixmap ready
-        pixmap = QPixmap.fromImage(qt_img)
-        
-        # 2. Update the label ONLY. 
-        # Since the widget is in a QStackedWidget, it exists but is just hidden.
-        # Updating a hidden widget is cheap.
-        self.lbl_video.setPixmap(pixmap)
+    def update_ai_status(self, message, percent):
+        if percent < 100:
+            self.lbl_ai_status.setText(f"⏳ {message} {percent}%")
+            self.lbl_ai_status.setStyleSheet("color: #ffaa00; font-size: 12px; padding: 10px;")
+        elif self.ai_service.ready or self.gate_supervisor is not None:
+            self.lbl_ai_status.setText(f"🟢 {message}")
+            self.lbl_ai_status.setStyleSheet("color: #00cc66; font-size: 12px; padding: 10px;")
+        else:
+            self.lbl_ai_status.setText(f"🔴 {message}")
+            self.lbl_ai_status.setStyleSheet("color: #ff4444; font-size: 12px; padding: 10px;")
+
+    def update_preview_target(self, gate_name, fps, width, height):
+        """A live view tile was shown / hidden / resized: tell its gate what to render"""
+        for t in self.camera_threads:
+            if t.gate_name == gate_name:
+                t.set_preview(fps, (width, height))
 
     def open_password_dialog(self):
         dialog = ChangePasswordDialog(self.username)
@@ -534,7 +986,9 @@ class SmartGateApp(QMainWindow):
                                      QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
 
         if reply == QMessageBox.StandardButton.Yes:
+            self.metrics_timer.stop()
             # FIX: Stop all camera threads instead of the non-existent 'self.thread'
+            self.stop_gate_processes()
             for t in self.camera_threads:
                 if t.isRunning():
                     t.stop()
@@ -547,9 +1001,11 @@ class SmartGateApp(QMainWindow):
             # Restart Login
             self.login_window = LoginWindow()
             if self.login_window.exec() == 1:
-                self.new_dashboard = SmartGateApp(self.login_window.username, self.login_window.user_role)
+                self.new_dashboard = SmartGateApp(self.login_window.username, self.login_window.user_role,
+                                                 self.ai_service, self.model_loader)
                 self.new_dashboard.show()
             else:
+                self.ai_service.stop()
                 sys.exit(0)
 
 
@@ -561,25 +1017,30 @@ class SmartGateApp(QMainWindow):
         if not target_thread:
             return None, None
 
-        # 1. Get latest frame from the specific thread
-        frame = target_thread.current_frame
-        if frame is None:
-            return None, None
-            
-        # 2. Run AI manually on this frame
-        # We use the AI instance belonging to that thread
-        text, conf, crop_img = target_thread.ai.detect_and_read(frame)
-        
-        # Return the crop if found, else return the full frame as fallback
-        final_img = crop_img if crop_img is not None else frame
-        
-        return final_img, text
+        # Latest frame of that gate through the AI (in-process thread or gate worker process).
+        # Returns the crop if found, else the full frame as fallback
+        return target_thread.recapture()
 
 
     def handle_detection(self, text, crop_img, gate_name):
         
         logger.info("Detection at %s: %s", gate_name, text)
-        
+
+        # Several plates can arrive at once (two lanes, several gates).
+        # dialog.exec() keeps processing signals, so queue them and show one dialog at a time.
+        self.pending_detections.append((text, crop_img, gate_name))
+        if self.entry_dialog_open:
+            logger.info("Entry dialog busy, queued %s (%d waiting)", text, len(self.pending_detections))
+            return
+
+        self.entry_dialog_open = True
+        try:
+            while self.pending_detections:
+                self.show_entry_dialog(*self.pending_detections.popleft())
+        finally:
+            self.entry_dialog_open = False
+
+    def show_entry_dialog(self, text, crop_img, gate_name):
         # 1. Find the thread that triggered this detection
         target_thread = None
         for t in self.camera_threads:
@@ -618,6 +1079,31 @@ class SmartGateApp(QMainWindow):
 
 
 
+def create_model_loader(ai_service, settings):
+    return ModelLoader(
+        ai_service,
+        backend=settings.value("ai_backend", "torch", type=str),
+        precision=settings.value("ai_precision", "fp32", type=str),
+        torch_mode=settings.value("ai_torch_mode", "eager", type=str),
+        # Map the weights so the UI and any gate workers share one copy
+        mmap_weights=settings.value("multiprocess_gates", False, type=bool),
+    )
+
+
+def start_model_loader(settings):
+    """
+    Create the shared inference service and start loading the AI engine in the background.
+    Multiprocess mode: every gate worker loads its own engine, so the UI loads none
+    (model_loader is None) until the gates are switched back to threads.
+    """
+    ai_service = InferenceService()
+    if settings.value("multiprocess_gates", False, type=bool):
+        return ai_service, None
+    model_loader = create_model_loader(ai_service, settings)
+    model_loader.start()
+    return ai_service, model_loader
+
+
 if __name__ == '__main__':
     setup_logging(
         log_dir="logs",
@@ -629,8 +1115,11 @@ if __name__ == '__main__':
 
     logger = logging.getLogger(__name__)
     logger.info("Application starting")
-    init_db()
     app = QApplication(sys.argv)
+    init_db()
+
+    # Start loading the AI models NOW, while the guard types credentials
+    ai_service, model_loader = start_model_loader(QSettings("SmartGateCorp", "SmartGateApp"))
     
     # Set global font
     font = QFont("Segoe UI", 10)
@@ -638,7 +1127,7 @@ if __name__ == '__main__':
 
     login = LoginWindow()
     if login.exec() == 1:
-        dashboard = SmartGateApp(login.username, login.user_role)
+        dashboard = SmartGateApp(login.username, login.user_role, ai_service, model_loader)
         dashboard.show()
         sys.exit(app.exec())
     else:
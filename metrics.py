@@ -0,0 +1,264 @@
+"""
+Hot-path metrics: per-stage latency histograms, pipeline counters and gauges.
+
+Cheap enough for every frame (a lock and a few additions per observation). Code on the
+hot path creates its metric objects once and keeps them:
+
+    _INFERENCE = REGISTRY.histogram("smartgate_stage_seconds", "...", stage="inference")
+    with _INFERENCE.time():
+        ...
+
+The registry is read by the Settings page diagnostics panel and exported in the Prometheus
+text format (write_prometheus, e.g. for node_exporter's textfile collector). Gate worker
+processes send their snapshot() with the heartbeat; the UI process merges them (set_remote).
+"""
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds (1 ms .. 10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last one: above every bucket (+Inf)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)  # First bucket with value <= le
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {"buckets": self.buckets, "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+def quantile(snapshot, q):
+    """Estimated q-quantile of a histogram snapshot (linear within the bucket, like Prometheus)"""
+    total = snapshot["count"]
+    if not total:
+        return None
+    rank = q * total
+    cumulative, lower = 0, 0.0
+    for upper, count in zip(snapshot["buckets"] + (float("inf"),), snapshot["counts"]):
+        if count and cumulative + count >= rank:
+            if upper == float("inf"):
+                return lower  # Beyond the last bucket: its bound is the best estimate
+            return lower + (upper - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = upper
+    return lower
+
+
+def _merge(kind, a, b):
+    if kind != "histogram":
+        return a + b
+    return {"buckets": a["buckets"], "counts": [x + y for x, y in zip(a["counts"], b["counts"])],
+            "sum": a["sum"] + b["sum"], "count": a["count"] + b["count"]}
+
+
+class MetricsRegistry:
+    """Named metric families with label sets; get-or-create, safe from any thread."""
+
+    def __init__(self):
+        self._families = {}   # name -> {"kind", "help", "series": {label key: metric}}
+        self._callbacks = {}  # handle -> (name, help, fn() -> {label key: value}), gauges computed on read
+        self._remote = {}     # source (gate worker) -> snapshot() from that process
+        self._lock = threading.Lock()
+        self._handles = 0
+
+    def _get(self, cls, name, help_text, labels, *args):
+        key = _label_key(labels)
+        with self._lock:
+            family = self._families.setdefault(name, {"kind": cls.kind, "help": help_text, "series": {}})
+            metric = family["series"].get(key)
+            if metric is None:
+                metric = family["series"][key] = cls(*args)
+            return metric
+
+    def counter(self, name, help_text, **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, **labels):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets)
+
+    def gauge_callback(self, name, help_text, fn):
+        """fn() -> {label dict as tuple(sorted(items)): value}, evaluated at every snapshot. Returns a handle"""
+        with self._lock:
+            self._handles += 1
+            self._callbacks[self._handles] = (name, help_text, fn)
+            return self._handles
+
+    def remove_callback(self, handle):
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+    def set_remote(self, source, snapshot):
+        """Latest snapshot of another process (replaces the previous one from the same source)"""
+        with self._lock:
+            self._remote[source] = snapshot
+
+    def snapshot(self, include_remote=False):
+        """{name: {"kind", "help", "series": {label key: value}}} - plain data, picklable"""
+        with self._lock:
+            families = [(name, dict(f, series=dict(f["series"]))) for name, f in self._families.items()]
+            callbacks = list(self._callbacks.values())
+            remote = list(self._remote.values()) if include_remote else []
+
+        result = {name: {"kind": f["kind"], "help": f["help"],
+                         "series": {key: metric.snapshot() for key, metric in f["series"].items()}}
+                  for name, f in families}
+        for name, help_text, fn in callbacks:
+            family = result.setdefault(name, {"kind": "gauge", "help": help_text, "series": {}})
+            for key, value in fn().items():
+                family["series"][key] = family["series"].get(key, 0) + value
+
+        # Other processes: same series add up (every gate worker has its own engine)
+        for other in remote:
+            for name, f in other.items():
+                family = result.setdefault(name, {"kind": f["kind"], "help": f["help"], "series": {}})
+                for key, value in f["series"].items():
+                    mine = family["series"].get(key)
+                    family["series"][key] = value if mine is None else _merge(f["kind"], mine, value)
+        return result
+
+    def to_prometheus(self):
+        lines = []
+        for name, family in sorted(self.snapshot(include_remote=True).items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for key, value in sorted(family["series"].items()):
+                if family["kind"] != "histogram":
+                    lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for upper, count in zip(value["buckets"] + (float("inf"),), value["counts"]):
+                    cumulative += count
+                    le = "+Inf" if upper == float("inf") else repr(upper)
+                    lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomic write (scrapers never see a half-written file)"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in key)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# One registry per process
+REGISTRY = MetricsRegistry()
+
+# Metric names used across modules
+STAGE_SECONDS = "smartgate_stage_seconds"
+STAGE_HELP = "Time spent per pipeline stage (capture, preprocess, inference, ocr, db_write)"
+
+
+def stage_histogram(stage):
+    return REGISTRY.histogram(STAGE_SECONDS, STAGE_HELP, stage=stage)
+
+
+def diagnostics_report(snapshot=None):
+    """Human readable summary for the diagnostics panel"""
+    snapshot = snapshot or REGISTRY.snapshot(include_remote=True)
+
+    def series(name):
+        return snapshot.get(name, {}).get("series", {})
+
+    lines = [f"{'Stage':12} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}"]
+    for key, value in sorted(series(STAGE_SECONDS).items()):
+        stage = dict(key).get("stage", "?")
+        if not value["count"]:
+            continue
+        p50, p95 = quantile(value, 0.5), quantile(value, 0.95)
+        lines.append(f"{stage:12} {value['count']:8d} {p50 * 1000:8.1f} {p95 * 1000:8.1f} "
+                     f"{value['sum'] / value['count'] * 1000:8.1f}")
+
+    seen, gated = series("smartgate_frames_seen_total"), series("smartgate_frames_gated_total")
+    depth = series("smartgate_inference_queue_depth")
+    gates = sorted({dict(key).get("gate", "") for key in list(seen) + list(depth)})
+    if gates:
+        lines.append("")
+        lines.append(f"{'Gate':20} {'seen':>9} {'gated':>9} {'queued':>7}")
+        for gate in gates:
+            key = (("gate", gate),)
+            lines.append(f"{gate[:20]:20} {int(seen.get(key, 0)):9d} {int(gated.get(key, 0)):9d} "
+                         f"{int(depth.get(key, 0)):7d}")
+
+    rejected = series("smartgate_detections_rejected_total")
+    if rejected:
+        lines.append("")
+        lines.append("Rejected detections: " + ", ".join(
+            f"{dict(key).get('filter', '?')} {int(value)}" for key, value in sorted(rejected.items())))
+    ocr_rejects = series("smartgate_ocr_rejects_total")
+    if ocr_rejects:
+        lines.append(f"OCR rejects: {int(sum(ocr_rejects.values()))}")
+    return "\n".join(lines)
@@ -0,0 +1,95 @@
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap change detector that runs before RT-DETR.
+
+    Works on a small grayscale copy of the frame, compares it against a slowly
+    updated background and only lets frames through when enough pixels in the
+    gate zone changed. Once motion is seen, frames keep flowing for hold_seconds
+    so a car that stops at the barrier still gets read.
+    """
+
+    def __init__(self, enabled=True, threshold=0.02, downscale_width=160,
+                 pixel_delta=25, hold_seconds=2.0, learning_rate=0.05):
+        self.enabled = enabled
+        self.threshold = threshold            # Fraction of zone pixels that must change
+        self.downscale_width = downscale_width
+        self.pixel_delta = pixel_delta        # Gray level difference counted as "changed"
+        self.hold_seconds = hold_seconds
+        self.learning_rate = learning_rate    # Background adaptation speed (lighting changes)
+
+        # Gate zone as fractions of the frame (x1, y1, x2, y2). Default: the same center band
+        # the plate filter uses.
+        self.zone = (0.20, 0.0, 0.80, 1.0)
+
+        self.background = None
+        self.last_motion_time = 0.0
+        self.last_ratio = 0.0
+        self.frames_seen = 0
+        self.frames_gated = 0
+
+    def set_zone_from_roi(self, roi):
+        """Watch only the bounding box of the gate ROI (list of (x, y) fractions)."""
+        if roi:
+            xs = [x for x, _ in roi]
+            ys = [y for _, y in roi]
+            self.zone = (min(xs), min(ys), max(xs), max(ys))
+            self.background = None
+
+    def reset(self):
+        self.background = None
+        self.last_motion_time = 0.0
+
+    def _zone_gray(self, frame):
+        frame_h, frame_w = frame.shape[:2]
+        zx1, zy1, zx2, zy2 = self.zone
+        x1, x2 = int(frame_w * zx1), max(int(frame_w * zx2), int(frame_w * zx1) + 1)
+        y1, y2 = int(frame_h * zy1), max(int(frame_h * zy2), int(frame_h * zy1) + 1)
+        zone = frame[y1:y2, x1:x2]
+
+        # Downscale FIRST, so every later step touches a few thousand pixels only
+        zone_h, zone_w = zone.shape[:2]
+        small_w = min(self.downscale_width, zone_w)
+        small_h = max(1, int(zone_h * small_w / zone_w))
+        small = cv2.resize(zone, (small_w, small_h), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def update(self, frame, now=None):
+        """
+        Feed every frame. Returns True when the frame should go to the detector.
+        now: frame time in seconds (default: wall clock)
+        """
+        self.frames_seen += 1
+        if not self.enabled:
+            return True
+
+        gray = self._zone_gray(frame)
+        now = time.time() if now is None else now
+
+        # 1. First frame (or zone size changed): learn the background, let it through
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.last_motion_time = now
+            return True
+
+        # 2. Changed pixels vs the background
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, mask = cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)
+        self.last_ratio = cv2.countNonZero(mask) / mask.size
+
+        # 3. Slowly adapt to lighting changes (clouds, headlights, dusk)
+        cv2.accumulateWeighted(gray, self.background, self.learning_rate)
+
+        if self.last_ratio >= self.threshold:
+            self.last_motion_time = now
+
+        if now - self.last_motion_time <= self.hold_seconds:
+            return True
+
+        self.frames_gated += 1
+        return False
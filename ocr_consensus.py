@@ -0,0 +1,68 @@
+import time
+
+
+class PlateConsensus:
+    """
+    Fuses OCR reads of the SAME vehicle from several frames.
+
+    Every read adds a weighted vote per character position (weight = OCR confidence of
+    that character). Reads are grouped by length so a read with a dropped/extra character
+    does not shift every position. The fused plate is ready once enough reads agree with
+    high confidence, or when the time budget for this vehicle runs out.
+    """
+
+    def __init__(self, min_reads=2, confidence_threshold=0.75, time_budget=2.0, min_length=5):
+        self.min_reads = min_reads
+        self.confidence_threshold = confidence_threshold
+        self.time_budget = time_budget
+        self.min_length = min_length
+
+        self.first_read_time = None
+        self.num_reads = 0
+        # length -> list (per position) of {char: summed confidence}
+        self._votes = {}
+        # length -> summed confidence of the reads with that length
+        self._length_weight = {}
+
+    def add(self, text, char_confs, now=None):
+        """text: cleaned plate string, char_confs: one confidence (0-1) per character"""
+        if not text or len(text) < self.min_length:
+            return
+        now = time.time() if now is None else now
+        if self.first_read_time is None:
+            self.first_read_time = now
+        self.num_reads += 1
+
+        positions = self._votes.setdefault(len(text), [dict() for _ in text])
+        for pos, (char, conf) in enumerate(zip(text, char_confs)):
+            positions[pos][char] = positions[pos].get(char, 0.0) + conf
+        self._length_weight[len(text)] = self._length_weight.get(len(text), 0.0) + sum(char_confs) / len(text)
+
+    def fused(self):
+        """Returns (plate_text, confidence) from the votes so far, or (None, 0.0)"""
+        if not self._votes:
+            return None, 0.0
+
+        # 1. Most supported plate length
+        length = max(self._length_weight, key=self._length_weight.get)
+        positions = self._votes[length]
+
+        # 2. Per position: winning character; its confidence is the summed confidence of the
+        #    reads that agree, averaged over ALL reads (disagreeing / other-length reads count as 0)
+        chars, confidences = [], []
+        for votes in positions:
+            char, weight = max(votes.items(), key=lambda kv: kv[1])
+            chars.append(char)
+            confidences.append(weight / self.num_reads)
+
+        # The plate is only as certain as its weakest character
+        return "".join(chars), min(confidences)
+
+    def is_ready(self, now=None):
+        if self.num_reads == 0:
+            return False
+        now = time.time() if now is None else now
+        if now - self.first_read_time >= self.time_budget:
+            return True
+        _, confidence = self.fused()
+        return self.num_reads >= self.min_reads and confidence >= self.confidence_threshold
@@ -0,0 +1,94 @@
+import math
+import re
+import cv2
+from easyocr.config import imgH
+from easyocr.recognition import get_text
+from easyocr.utils import compute_ratio_and_resize
+
+# Indian plates only use these characters
+PLATE_CHARSET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+class PlateRecognizer:
+    """
+    Recognition-only OCR for plate crops.
+
+    RT-DETR has already localized the plate, so EasyOCR's CRAFT text detector
+    (what readtext() runs first) is skipped: every crop goes straight to the
+    recognizer, either as one line or split in two for two-row plates. All lines
+    of all crops are recognized in ONE batched call, restricted to A-Z0-9.
+    """
+
+    def __init__(self, reader, min_height=24, two_row_max_aspect=2.5, min_line_conf=0.3, batch_size=16):
+        self.reader = reader
+        self.min_height = min_height                  # Upscale crops smaller than this (px)
+        self.two_row_max_aspect = two_row_max_aspect  # w/h below this = square two-row plate
+        self.min_line_conf = min_line_conf            # Same garbage filter as the old readtext path
+        self.batch_size = batch_size
+        self.ignore_char = "".join(set(reader.character) - set(PLATE_CHARSET))
+
+    def _split_lines(self, gray):
+        """Single-row plates -> [plate]; two-row plates -> [top half, bottom half]"""
+        h, w = gray.shape[:2]
+        if w / h >= self.two_row_max_aspect:
+            return [gray]
+        overlap = max(1, h // 20)
+        return [gray[: h // 2 + overlap], gray[h // 2 - overlap:]]
+
+    def read_batch(self, crops):
+        """
+        crops: list of BGR plate crops
+        Returns: list (one per crop) of (clean_text, ocr_confidence, char_confidences),
+                 or (None, 0, []) when nothing valid was read
+        """
+        results = [(None, 0, []) for _ in crops]
+        if not crops:
+            return results
+
+        # 1. Build the recognizer input: grayscale lines resized to the model height
+        image_list, owners, max_ratio = [], [], 1.0
+        for idx, crop in enumerate(crops):
+            if crop is None or crop.size == 0:
+                continue
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+
+            # Only upscale genuinely small crops (the recognizer resizes to imgH anyway)
+            if gray.shape[0] < self.min_height:
+                scale = self.min_height / gray.shape[0]
+                gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+            for line in self._split_lines(gray):
+                h, w = line.shape[:2]
+                if h == 0 or w == 0:
+                    continue
+                resized, ratio = compute_ratio_and_resize(line, w, h, imgH)
+                image_list.append(([[0, 0], [w, 0], [w, h], [0, h]], resized))
+                owners.append(idx)
+                max_ratio = max(max_ratio, ratio)
+
+        if not image_list:
+            return results
+
+        # 2. ONE recognizer pass for every line of every crop
+        max_width = math.ceil(max_ratio) * imgH
+        predictions = get_text(
+            self.reader.character, imgH, int(max_width), self.reader.recognizer, self.reader.converter,
+            image_list, self.ignore_char, "greedy", 5, self.batch_size,
+            0.1, 0.5, 0.003, 0, self.reader.device,
+        )
+
+        # 3. Re-assemble lines per crop (top line first), keep per-character confidences
+        texts = {}
+        for owner, (_, text, prob) in zip(owners, predictions):
+            if prob <= self.min_line_conf:  # Filter garbage reads
+                continue
+            clean_line = re.sub(r'[^A-Z0-9]', '', text.upper())
+            entry = texts.setdefault(owner, ["", [], []])
+            entry[0] += clean_line
+            entry[1].extend([float(prob)] * len(clean_line))
+            entry[2].append(float(prob))
+
+        for owner, (clean_text, char_confs, line_confs) in texts.items():
+            if len(clean_text) > 4:
+                results[owner] = (clean_text, sum(line_confs) / len(line_confs), char_confs)
+        return results
@@ -0,0 +1,185 @@
+import time
+import itertools
+from ocr_consensus import PlateConsensus
+
+
+def box_iou(a, b):
+    """IoU of two (x1, y1, x2, y2) boxes."""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _center(box):
+    return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+
+
+class PlateTrack:
+    """One vehicle (plate) followed across frames."""
+
+    def __init__(self, track_id, candidate, now):
+        self.track_id = track_id
+        self.box = candidate["box"]
+        self.score = candidate["score"]
+        self.crop = candidate["crop"]
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        self.misses = 0
+        self.ocr_attempts = 0
+        self.text = None
+        self.confidence = 0.0
+        self.emitted = False
+        self.consensus = PlateConsensus()
+        # Sharpest crop seen so far, shown to the guard
+        self.best_crop = candidate["crop"]
+        self.best_blur = candidate.get("blur", 0.0)
+
+    def update(self, candidate, now):
+        self.box = candidate["box"]
+        self.score = candidate["score"]
+        self.crop = candidate["crop"]
+        self.last_seen = now
+        self.hits += 1
+        self.misses = 0
+        if candidate.get("blur", 0.0) > self.best_blur:
+            self.best_crop = candidate["crop"]
+            self.best_blur = candidate["blur"]
+
+    def add_read(self, text, char_confs, now=None):
+        """Add one OCR read. Sets self.text once the multi-frame consensus is confident enough."""
+        self.ocr_attempts += 1
+        self.consensus.add(text, char_confs, now)
+        self.try_finalize(now, force=False)
+
+    def try_finalize(self, now=None, force=False):
+        """force=True: vehicle is gone, take the best fused guess available"""
+        if self.text is not None or self.consensus.num_reads == 0:
+            return
+        if force or self.consensus.is_ready(now):
+            self.text, self.confidence = self.consensus.fused()
+
+
+class PlateTracker:
+    """
+    Lightweight IoU / centroid tracker over detector boxes.
+
+    Gives every plate a track ID so OCR runs a bounded number of times per vehicle and
+    exactly one event is emitted per vehicle (replaces the old global 5 second cooldown,
+    which ignored a second car right behind the first).
+    """
+
+    def __init__(self, iou_threshold=0.3, max_center_shift=1.0, max_misses=8, max_idle_seconds=2.0,
+                 max_ocr_attempts=6, repeat_suppress_seconds=30.0):
+        self.iou_threshold = iou_threshold
+        self.max_center_shift = max_center_shift  # Fallback match: center moved < N plate widths
+        self.max_misses = max_misses              # Analyzed frames without the plate before the track ends
+        # ... or seconds without it, also while the detector does not run at all (motion gate)
+        self.max_idle_seconds = max_idle_seconds
+        self.max_ocr_attempts = max_ocr_attempts
+        self.repeat_suppress_seconds = repeat_suppress_seconds
+
+        self.tracks = []
+        self.finished = []  # Tracks that ended in the last update (vehicle left)
+        self._ids = itertools.count(1)
+        self._recent_plates = {}  # text -> time it was last emitted
+
+    def update(self, candidates, now=None):
+        """
+        Feed the plate candidates of one analyzed frame.
+        Returns: the tracks that were matched or created in this frame.
+        """
+        now = time.time() if now is None else now
+
+        # 1. Score every (track, candidate) pair: IoU first, center distance as fallback for fast cars
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for ci, cand in enumerate(candidates):
+                iou = box_iou(track.box, cand["box"])
+                if iou >= self.iou_threshold:
+                    pairs.append((1.0 + iou, ti, ci))
+                    continue
+                (tx, ty), (cx, cy) = _center(track.box), _center(cand["box"])
+                width = max(track.box[2] - track.box[0], 1)
+                shift = ((tx - cx) ** 2 + (ty - cy) ** 2) ** 0.5 / width
+                if shift <= self.max_center_shift:
+                    pairs.append((1.0 - shift / (self.max_center_shift + 1e-9), ti, ci))
+
+        # 2. Greedy assignment, best pairs first
+        matched_tracks, matched_cands, active = set(), set(), []
+        for _, ti, ci in sorted(pairs, reverse=True):
+            if ti in matched_tracks or ci in matched_cands:
+                continue
+            matched_tracks.add(ti)
+            matched_cands.add(ci)
+            self.tracks[ti].update(candidates[ci], now)
+            active.append(self.tracks[ti])
+
+        # 3. Age unmatched tracks, drop the ones that are gone
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self._end_tracks(now)
+
+        # 4. New vehicles
+        for ci, cand in enumerate(candidates):
+            if ci not in matched_cands:
+                track = PlateTrack(next(self._ids), cand, now)
+                self.tracks.append(track)
+                active.append(track)
+
+        return active
+
+    def expire(self, now=None):
+        """
+        For frames the detector did not run on (motion gate closed): ends the tracks not seen
+        for max_idle_seconds, so a vehicle that stopped being visible is still reported.
+        """
+        self._end_tracks(time.time() if now is None else now)
+
+    def _end_tracks(self, now):
+        def gone(track):
+            return track.misses > self.max_misses or now - track.last_seen > self.max_idle_seconds
+        self.finished = [t for t in self.tracks if gone(t)]
+        self.tracks = [t for t in self.tracks if not gone(t)]
+
+    def needs_ocr(self, track):
+        return track.text is None and track.ocr_attempts < self.max_ocr_attempts
+
+    def ready_tracks(self, now=None):
+        """
+        Tracks whose plate should be reported now: consensus reached or its time budget
+        used up (also for a track not matched in this frame), OCR budget used up, or the
+        vehicle left before the consensus was confident.
+        """
+        ready = []
+        for track in self.tracks:
+            # Time budget / consensus check; force the best guess once the OCR budget is used up
+            track.try_finalize(now, force=track.ocr_attempts >= self.max_ocr_attempts)
+            if not track.emitted and track.text:
+                ready.append(track)
+        for track in self.finished:
+            if not track.emitted:
+                track.try_finalize(now, force=True)
+                if track.text:
+                    ready.append(track)
+        return ready
+
+    def mark_emitted(self, track, now=None):
+        """
+        Called when the track's plate is about to be reported.
+        Returns False if the same plate was already reported very recently
+        (e.g. the track was lost for a moment while the car idles at the barrier).
+        """
+        now = time.time() if now is None else now
+        track.emitted = True
+
+        # Forget old plates
+        self._recent_plates = {t: ts for t, ts in self._recent_plates.items()
+                               if now - ts < self.repeat_suppress_seconds}
+        if track.text in self._recent_plates:
+            return False
+        self._recent_plates[track.text] = now
+        return True
@@ -0,0 +1,124 @@
+import os
+import json
+import cv2
+import numpy as np
+import torch
+import logging
+logger = logging.getLogger(__name__)
+
+# PIL resample codes (as stored in preprocessor_config.json) -> OpenCV interpolation
+_PIL_TO_CV2_INTERP = {
+    0: cv2.INTER_NEAREST,   # NEAREST
+    1: cv2.INTER_LANCZOS4,  # LANCZOS
+    2: cv2.INTER_LINEAR,    # BILINEAR
+    3: cv2.INTER_CUBIC,     # BICUBIC
+    4: cv2.INTER_AREA,      # BOX
+    5: cv2.INTER_LINEAR,    # HAMMING (no OpenCV equivalent)
+}
+
+
+class FramePreprocessor:
+    """
+    Native replacement for RTDetrImageProcessor.
+
+    Goes straight from OpenCV BGR frames to a preallocated float32 NCHW tensor:
+    cv2.resize into a reusable buffer, then ONE copy that swaps BGR->RGB, transposes
+    to CHW and rescales. No PIL, no per-frame buffer allocation.
+    Honors the settings in the model's preprocessor_config.json.
+    """
+
+    def __init__(self, model_path, max_batch=1):
+        config_path = os.path.join(model_path, "preprocessor_config.json")
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        size = config.get("size", {"height": 640, "width": 640})
+        self.height = int(size["height"])
+        self.width = int(size["width"])
+        self.interpolation = _PIL_TO_CV2_INTERP.get(config.get("resample", 2), cv2.INTER_LINEAR)
+        # PIL antialiases bilinear/box/hamming when shrinking; cv2 only does that with INTER_AREA
+        self.downscale_interpolation = (cv2.INTER_AREA if self.interpolation == cv2.INTER_LINEAR
+                                        or self.interpolation == cv2.INTER_AREA else self.interpolation)
+        self.do_resize = config.get("do_resize", True)
+        self.do_rescale = config.get("do_rescale", True)
+        self.rescale_factor = np.float32(config.get("rescale_factor", 1 / 255))
+        self.do_normalize = config.get("do_normalize", False)
+        self.mean = np.array(config.get("image_mean", [0.0, 0.0, 0.0]), dtype=np.float32).reshape(3, 1, 1)
+        self.std = np.array(config.get("image_std", [1.0, 1.0, 1.0]), dtype=np.float32).reshape(3, 1, 1)
+
+        if not self.do_resize:
+            # Without a fixed size we cannot preallocate; the model was exported at 640x640 anyway
+            logger.warning("preprocessor_config has do_resize=false, resizing to %dx%d regardless",
+                           self.width, self.height)
+
+        self._resize_buf = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        self._allocate(max_batch)
+
+    def _allocate(self, batch_size):
+        self._tensor = torch.empty((batch_size, 3, self.height, self.width), dtype=torch.float32)
+        self._array = self._tensor.numpy()  # Shares memory with the tensor
+
+    def __call__(self, frames):
+        """
+        frames: list of BGR uint8 ndarrays (any resolution)
+        Returns: (pixel_values tensor [N,3,H,W], target_sizes tensor [N,2] as (h, w))
+        """
+        n = len(frames)
+        if n > self._tensor.shape[0]:
+            self._allocate(n)
+
+        for i, frame in enumerate(frames):
+            # 1. Resize into the reusable buffer (camera frames are almost always larger than the input)
+            frame_h, frame_w = frame.shape[:2]
+            shrinking = frame_w >= self.width and frame_h >= self.height
+            interpolation = self.downscale_interpolation if shrinking else self.interpolation
+            cv2.resize(frame, (self.width, self.height), dst=self._resize_buf, interpolation=interpolation)
+
+            # 2. BGR->RGB + HWC->CHW are just a strided view; rescale while copying into the batch slot
+            chw_rgb = self._resize_buf[:, :, ::-1].transpose(2, 0, 1)
+            out = self._array[i]
+            if self.do_rescale:
+                np.multiply(chw_rgb, self.rescale_factor, out=out, dtype=np.float32)
+            else:
+                np.copyto(out, chw_rgb, casting="unsafe")
+
+            # 3. Optional normalization (in place)
+            if self.do_normalize:
+                out -= self.mean
+                out /= self.std
+
+        target_sizes = torch.tensor([frame.shape[:2] for frame in frames], dtype=torch.float32)
+        # NOTE: the returned tensor is a view of the shared buffer, valid until the next call
+        return self._tensor[:n], target_sizes
+
+
+def post_process_detections(logits, pred_boxes, target_sizes, threshold=0.5):
+    """
+    Tensor-only equivalent of RTDetrImageProcessor.post_process_object_detection (focal loss variant).
+
+    logits: [N, Q, C], pred_boxes: [N, Q, 4] (normalized cx, cy, w, h), target_sizes: [N, 2] (h, w)
+    Returns: list of dicts {"scores", "labels", "boxes"} with boxes as absolute (x1, y1, x2, y2),
+             sorted by descending score.
+    """
+    num_queries, num_classes = logits.shape[1], logits.shape[2]
+
+    # 1. Top-k over (query, class) pairs
+    scores = torch.sigmoid(logits).flatten(1)
+    scores, index = torch.topk(scores, num_queries, dim=-1)
+    labels = index % num_classes
+    index = index // num_classes
+    boxes = pred_boxes.gather(1, index.unsqueeze(-1).expand(-1, -1, 4))
+
+    # 2. (cx, cy, w, h) -> (x1, y1, x2, y2), scaled to the original frame size
+    cx, cy, w, h = boxes.unbind(-1)
+    boxes = torch.stack([cx - 0.5 * w, cy - 0.5 * h, cx + 0.5 * w, cy + 0.5 * h], dim=-1)
+    img_h, img_w = target_sizes.to(boxes.dtype).unbind(1)
+    scale = torch.stack([img_w, img_h, img_w, img_h], dim=1)
+    boxes = boxes * scale[:, None, :]
+
+    # 3. Confidence threshold
+    keep = scores > threshold
+    return [
+        {"scores": s[k], "labels": l[k], "boxes": b[k]}
+        for s, l, b, k in zip(scores, labels, boxes, keep)
+    ]
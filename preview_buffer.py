@@ -0,0 +1,102 @@
+import threading
+import logging
+import cv2
+import numpy as np
+from PyQt6.QtGui import QImage
+logger = logging.getLogger(__name__)
+
+
+def fit_size(width, height, box_w, box_h):
+    """Largest size with the frame's aspect ratio that fits the box (never upscaled)"""
+    scale = min(1.0, box_w / width, box_h / height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+class PreviewFrame:
+    """
+    A preview on its way to the GUI. image references a pooled buffer, so the receiver must
+    call release() once it has drawn it (QPixmap.fromImage copies the pixels).
+    """
+    __slots__ = ("image", "_buffer", "_pool", "_index", "_generation")
+
+    def __init__(self, image, buffer, pool, index, generation):
+        self.image = image
+        self._buffer = buffer  # Keeps the pixels alive even if the pool re-sizes meanwhile
+        self._pool = pool
+        self._index = index
+        self._generation = generation
+
+    def release(self):
+        if self._pool is not None:
+            self._pool._release(self._index, self._generation)
+            self._pool = None
+
+
+class PreviewBufferPool:
+    """
+    Allocation-free preview rendering for one producer thread.
+
+    A few persistent RGB buffers, each wrapped once in a QImage. render() resizes the frame
+    straight to the tile size (fast interpolation, into a persistent scratch buffer), then
+    converts to RGB into a free buffer - no per-frame numpy arrays, no QImage.copy() and no
+    QImage.scaled(). A buffer stays reserved until the GUI releases its PreviewFrame; if the
+    GUI falls that far behind, the preview is skipped instead of allocating more.
+    New buffers are only allocated when the tile (or stream) size changes
+    (tests/test_preview_buffer.py checks this with tracemalloc).
+    """
+
+    def __init__(self, slots=3, interpolation=cv2.INTER_LINEAR):
+        self.slots = slots
+        self.interpolation = interpolation
+        self.size = None
+        self._generation = 0
+        self._scratch = None
+        self._buffers = []
+        self._images = []
+        self._busy = []
+        self._lock = threading.Lock()  # render() vs. release() from the GUI thread
+
+        self.frames_rendered = 0
+        self.frames_skipped = 0      # GUI still held every buffer
+
+    def render(self, frame, box):
+        """BGR frame -> PreviewFrame fitted into box (w, h), or None if no buffer is free"""
+        size = fit_size(frame.shape[1], frame.shape[0], *box)
+        if size != self.size:
+            self._allocate(size)
+
+        with self._lock:
+            index = next((i for i, busy in enumerate(self._busy) if not busy), None)
+            if index is None:
+                self.frames_skipped += 1
+                return None
+            self._busy[index] = True
+
+        # 1. Resize first: the colour conversion only touches preview pixels
+        if size != (frame.shape[1], frame.shape[0]):
+            cv2.resize(frame, size, dst=self._scratch, interpolation=self.interpolation)
+            small = self._scratch
+        else:
+            small = frame
+        # 2. Straight into the buffer the QImage already wraps
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self._buffers[index])
+
+        self.frames_rendered += 1
+        return PreviewFrame(self._images[index], self._buffers[index], self, index, self._generation)
+
+    def _allocate(self, size):
+        w, h = size
+        with self._lock:
+            # Frames still in flight keep their old buffers alive (PreviewFrame holds them)
+            self._generation += 1
+            self._scratch = np.empty((h, w, 3), dtype=np.uint8)
+            self._buffers = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(self.slots)]
+            self._images = [QImage(buf.data, w, h, 3 * w, QImage.Format.Format_RGB888) for buf in self._buffers]
+            self._busy = [False] * self.slots
+            self.size = size
+        logger.debug("Preview buffers: %d x %dx%d", self.slots, w, h)
+
+    def _release(self, index, generation):
+        with self._lock:
+            if generation == self._generation:
+                self._busy[index] = False
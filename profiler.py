@@ -0,0 +1,305 @@
+"""
+On-demand profiling of the running app (Settings page / SIGUSR1), results saved to logs/.
+
+Two modes, for a chosen duration:
+    sampling       a background thread samples the stack of every thread every few ms
+                   -> <name>.folded (collapsed stacks: flamegraph.pl, speedscope, inferno)
+                   -> <name>.txt (functions by own / total samples)
+    deterministic  cProfile in every thread that calls PROFILER.poll() from its loop
+                   (VideoThreads, capture, inference worker, UI timer), merged
+                   -> <name>.pstats (python -m pstats, snakeviz) and <name>.txt
+Optionally tracemalloc snapshots at start and end -> <name>_alloc.txt (top allocations
+and top growth) and <name>.tracemalloc (Snapshot.load for offline analysis).
+
+Sampling has a fixed, low overhead and sees every thread; deterministic gives exact call
+counts but slows Python code down noticeably while it runs. From Python 3.12 cProfile is
+process-wide (sys.monitoring allows one profiler at a time), so a deterministic request
+runs as a sampling session there.
+"""
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import logging
+from collections import Counter
+from datetime import datetime
+logger = logging.getLogger(__name__)
+
+SAMPLING = "sampling"
+DETERMINISTIC = "deterministic"
+MODES = (SAMPLING, DETERMINISTIC)
+
+# One cProfile per thread only works before sys.monitoring (3.12)
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """One profiling run; finished sessions write their files and call on_done(list of paths)"""
+
+    def __init__(self, mode, duration, allocations, out_dir, tag, interval, on_done):
+        self.mode = mode
+        self.duration = duration
+        self.allocations = allocations
+        self.interval = interval
+        self.on_done = on_done
+        self.base_path = os.path.join(out_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{tag}_{mode}")
+        self.started = time.monotonic()
+        self.active = True
+        self.paths = []
+
+        self.stacks = Counter()           # Sampling: collapsed stack -> samples
+        self.samples = 0
+        self.thread_stats = []            # Deterministic: (thread name, cProfile.Profile)
+        self.joined = 0                   # Threads that started a cProfile for this session
+        self._reported = threading.Condition()
+        self._alloc_start = None
+        self._started_tracemalloc = False
+        self.stop_event = None
+
+    # --- Sampling ---
+
+    def sample_loop(self, stop_event):
+        me = threading.get_ident()
+        while not stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or names.get(ident) == "ProfileSession":
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    # --- Deterministic ---
+
+    def add_thread_stats(self, thread_name, profile):
+        with self._reported:
+            self.thread_stats.append((thread_name, profile))
+            self._reported.notify_all()
+
+    def wait_for_threads(self, timeout):
+        """Threads hand their profiles over on their next poll(); one stuck in I/O is skipped"""
+        deadline = time.monotonic() + timeout
+        with self._reported:
+            while len(self.thread_stats) < self.joined:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("Profiling: %d thread(s) did not report back", self.joined - len(self.thread_stats))
+                    break
+                self._reported.wait(remaining)
+
+    # --- tracemalloc ---
+
+    def start_allocations(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self._started_tracemalloc = True
+        self._alloc_start = tracemalloc.take_snapshot()
+
+    def finish_allocations(self, top=40):
+        snapshot = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>")]
+        snapshot = snapshot.filter_traces(ignore)
+        start = self._alloc_start.filter_traces(ignore)
+
+        path = f"{self.base_path}_alloc.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            total = sum(stat.size for stat in snapshot.statistics("filename"))
+            f.write(f"Traced memory at the end: {total / 1024 / 1024:.1f} MB\n\n")
+            f.write(f"Top {top} allocations (by line):\n")
+            for stat in snapshot.statistics("lineno")[:top]:
+                f.write(f"  {stat}\n")
+            f.write(f"\nTop {top} growth during the session (by line):\n")
+            for stat in snapshot.compare_to(start, "lineno")[:top]:
+                f.write(f"  {stat}\n")
+            f.write("\nLargest allocation tracebacks:\n")
+            for stat in snapshot.statistics("traceback")[:5]:
+                f.write(f"\n  {stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+                for line in stat.traceback.format():
+                    f.write(f"    {line}\n")
+        snapshot.dump(f"{self.base_path}.tracemalloc")
+        self.paths += [path, f"{self.base_path}.tracemalloc"]
+
+    # --- Output ---
+
+    def write(self):
+        if self.mode == SAMPLING:
+            self._write_sampling()
+        else:
+            self._write_deterministic()
+
+    def _write_sampling(self, top=40):
+        folded = f"{self.base_path}.folded"
+        with open(folded, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]  # First entry is the thread
+            if frames:
+                own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+
+        summary = f"{self.base_path}.txt"
+        with open(summary, "w", encoding="utf-8") as f:
+            f.write(f"{self.samples} samples every {self.interval * 1000:.0f} ms over {self.duration:.0f} s\n\n")
+            f.write(f"Top {top} by own samples (where the time is spent):\n")
+            for label, count in own.most_common(top):
+                f.write(f"  {count:7d}  {100.0 * count / max(1, sum(own.values())):5.1f}%  {label}\n")
+            f.write(f"\nTop {top} by total samples (including callees):\n")
+            for label, count in total.most_common(top):
+                f.write(f"  {count:7d}  {label}\n")
+        self.paths += [folded, summary]
+
+    def _write_deterministic(self, top=40):
+        if not self.thread_stats:
+            logger.warning("Profiling: no thread was profiled")
+            return
+        stats = None
+        for _, profile in self.thread_stats:
+            profile.create_stats()
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        path = f"{self.base_path}.pstats"
+        stats.dump_stats(path)
+
+        summary = f"{self.base_path}.txt"
+        with open(summary, "w", encoding="utf-8") as f:
+            f.write("Threads: " + ", ".join(name for name, _ in self.thread_stats) + "\n\n")
+            stats.stream = f
+            stats.sort_stats("cumulative").print_stats(top)
+            stats.sort_stats("tottime").print_stats(top)
+        self.paths += [path, summary]
+
+
+class Profiler:
+    """Process-wide profiler control. One session at a time."""
+
+    def __init__(self):
+        self.session = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def active(self):
+        return self.session is not None
+
+    def start(self, mode=SAMPLING, duration=30.0, allocations=False, out_dir="logs", tag="app",
+              interval=0.005, on_done=None):
+        """Starts a session that stops itself after `duration` s. Returns False if one is already running"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode}")
+        if mode == DETERMINISTIC and not PER_THREAD_CPROFILE:
+            logger.warning("Deterministic profiling needs one cProfile per thread (Python < 3.12); sampling instead")
+            mode = SAMPLING
+        with self._lock:
+            if self.session is not None:
+                return False
+            os.makedirs(out_dir, exist_ok=True)
+            session = ProfileSession(mode, duration, allocations, out_dir, tag, interval, on_done)
+            if allocations:
+                session.start_allocations()
+            self.session = session
+
+        stop_event = session.stop_event = threading.Event()
+        if mode == SAMPLING:
+            threading.Thread(target=session.sample_loop, args=(stop_event,), name="ProfileSampler",
+                             daemon=True).start()
+        threading.Thread(target=self._finish, args=(session, stop_event), name="ProfileSession",
+                         daemon=True).start()
+        logger.info("Profiling started: %s for %.0f s%s", mode, duration, " with tracemalloc" if allocations else "")
+        return True
+
+    def stop(self):
+        """End the running session early (its files are still written)"""
+        session = self.session
+        if session is not None:
+            session.stop_event.set()
+
+    def poll(self):
+        """
+        Called from long-running loops (once per iteration): in deterministic mode the calling
+        thread starts / stops its own cProfile here. Costs one attribute check otherwise.
+        Never raises: a profiler problem must not end a camera or the inference worker.
+        """
+        try:
+            self._poll()
+        except Exception:
+            logger.exception("Profiling: %s could not join / leave the session", threading.current_thread().name)
+            self._local.session = self._local.profile = None
+
+    def _poll(self):
+        session = self.session
+        local = self._local
+        current = getattr(local, "session", None)
+        if current is session:
+            return
+        if current is not None:
+            profile, local.session, local.profile = local.profile, None, None
+            if profile is not None:
+                profile.disable()
+                current.add_thread_stats(threading.current_thread().name, profile)
+        if session is not None and session.active and session.mode == DETERMINISTIC:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:  # Another profiler / tracer is active in this thread
+                logger.warning("Profiling: %s not profiled (%s)", threading.current_thread().name, e)
+                local.session, local.profile = session, None
+                return
+            local.profile = profile
+            local.session = session
+            with session._reported:
+                session.joined += 1
+
+    def _finish(self, session, stop_event):
+        stop_event.wait(session.duration)
+        stop_event.set()
+        session.active = False
+        with self._lock:
+            self.session = None  # Threads see this on their next poll() and hand over their profiles
+        try:
+            if session.mode == DETERMINISTIC:
+                session.wait_for_threads(timeout=10.0)
+            session.write()
+            if session.allocations:
+                session.finish_allocations()
+            logger.info("Profiling finished: %s", ", ".join(session.paths) or "no output")
+        except Exception:
+            logger.exception("Could not write the profiling results")
+        if session.on_done is not None:
+            session.on_done(session.paths)
+
+
+# One profiler per process
+PROFILER = Profiler()
+
+
+def install_signal_handler(callback, signum=None):
+    """
+    Run callback() on SIGUSR1 (POSIX only; returns False elsewhere). Must be called from the
+    main thread. Python runs the handler between bytecodes of the main thread, so under a Qt
+    event loop it fires on the next Python callback (e.g. a QTimer).
+    """
+    import signal
+    signum = signum or getattr(signal, "SIGUSR1", None)
+    if signum is None:
+        return False
+    signal.signal(signum, lambda *_: callback())
+    return True
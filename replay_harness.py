@@ -0,0 +1,347 @@
+"""
+Record camera streams, then replay them as simulated gates through the real pipeline.
+
+Usage:
+    python replay_harness.py record --source rtsp://cam1/stream --source 0 --duration 300 --output-dir recordings/
+    python replay_harness.py replay --recording recordings/gate1.avi --gates 8 --speed 1 --duration 120
+    python replay_harness.py replay --recording recordings/gate1.avi --deterministic --speed 0 --reads golden.json
+    python replay_harness.py replay --recording recordings/gate1.avi --deterministic --speed 0 --expect golden.json
+
+record: every source is captured through a StreamReader (reconnects included) into an MJPG
+file, with the capture time of every frame in <file>.timestamps.json, so a replay has the
+original frame timing, stalls and all.
+
+replay: N VideoThreads (the in-process gate path: StreamReader -> FrameGrabber -> GatePipeline
+-> shared InferenceService -> AIEngine) read the recordings (gate i plays recording i mod R)
+at --speed times real time (0 = as fast as they decode). Reported per gate: grabbed /
+analyzed / dropped frames and fps, analysis latency (frame grabbed -> pipeline done) and
+detection latency (the same, for frames that produced a plate); for the process: CPU and RSS.
+
+--deterministic runs the grabbers in lockstep (every sampled frame is analyzed, none is
+dropped as stale) on the recording's clock instead of the wall clock, so the plate reads
+do not depend on machine load or speed. --reads saves them, --expect compares against a
+saved run (exit 1 on any difference). For bit-identical detector outputs across runs also
+pass --max-batch 1 (batch composition across gates otherwise depends on timing).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import logging
+from datetime import datetime
+import cv2
+import numpy as np
+from inference_backends import BACKENDS, PRECISIONS, TORCH_MODES
+logger = logging.getLogger(__name__)
+
+TIMESTAMPS_SUFFIX = ".timestamps.json"
+
+
+# --- Process resources ---
+
+def process_sample():
+    """CPU seconds, RSS (MB), OS threads and open fds of this process (Linux /proc, best effort elsewhere)"""
+    times = os.times()
+    sample = {"time": time.monotonic(), "cpu_s": times.user + times.system, "rss_mb": None,
+              "threads": threading.active_count(), "fds": None}
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    sample["rss_mb"] = int(line.split()[1]) / 1024
+                elif line.startswith("Threads:"):
+                    sample["threads"] = int(line.split()[1])
+        sample["fds"] = len(os.listdir("/proc/self/fd"))
+    except OSError:
+        import resource
+        # Peak, not current, RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        sample["rss_mb"] = peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return sample
+
+
+class ResourceSampler(threading.Thread):
+    """Samples process_sample() every `interval` seconds until stop()"""
+
+    def __init__(self, interval=1.0):
+        super().__init__(name="ResourceSampler", daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            self.samples.append(process_sample())
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append(process_sample())
+
+    def summary(self):
+        first, last = self.samples[0], self.samples[-1]
+        wall = max(last["time"] - first["time"], 1e-9)
+        rss = [s["rss_mb"] for s in self.samples if s["rss_mb"] is not None]
+        return {"cpu_percent": round(100.0 * (last["cpu_s"] - first["cpu_s"]) / wall, 1),
+                "rss_mb_start": round(rss[0], 1) if rss else None,
+                "rss_mb_peak": round(max(rss), 1) if rss else None,
+                "rss_mb_end": round(rss[-1], 1) if rss else None,
+                "threads": last["threads"], "fds": last["fds"]}
+
+
+# --- Recording ---
+
+def load_timestamps(path):
+    """Per-frame capture offsets (s) recorded next to a video, or None (native fps is used)"""
+    sidecar = path + TIMESTAMPS_SUFFIX
+    if not os.path.exists(sidecar):
+        return None
+    with open(sidecar, "r", encoding="utf-8") as f:
+        return json.load(f)["timestamps"]
+
+
+def record(source, path, duration, transport="tcp", stop_event=None):
+    """Capture `source` for `duration` seconds into `path` (+ timestamps sidecar). Returns frames written"""
+    from stream_reader import StreamReader
+    reader = StreamReader(source, transport, replay=False, name=f"Record {os.path.basename(path)}")
+    stop_event = stop_event or threading.Event()
+    timer = threading.Timer(duration, lambda: (stop_event.set(), reader.stop()))
+    timer.start()
+
+    writer, timestamps, started, t0 = None, [], None, None
+    try:
+        while not stop_event.is_set() and reader.grab():
+            now = time.monotonic()
+            ret, frame = reader.retrieve()
+            if not ret:
+                continue
+            if writer is None:
+                t0, started = now, datetime.now()
+                height, width = frame.shape[:2]
+                # MJPG: cheap to decode, so replays of many gates measure the pipeline, not the codec
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), reader.fps, (width, height))
+                if not writer.isOpened():
+                    raise RuntimeError(f"Cannot write {path}")
+            writer.write(frame)
+            timestamps.append(round(now - t0, 4))
+    finally:
+        timer.cancel()
+        reader.release()
+        if writer is not None:
+            writer.release()
+
+    if timestamps:
+        with open(path + TIMESTAMPS_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump({"source": reader._display_source(), "started": started.isoformat(timespec="seconds"),
+                       "fps": reader.fps, "reconnects": reader.reconnects, "timestamps": timestamps}, f)
+    logger.info("Recorded %d frames (%.1fs) to %s", len(timestamps), timestamps[-1] if timestamps else 0, path)
+    return len(timestamps)
+
+
+# --- Replay ---
+
+class ReplayStats:
+    """Per-gate counters fed from the VideoThreads (VideoThread.on_analyzed)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}  # gate -> [ms], every analyzed frame
+        self.detection_latencies = {}  # gate -> [ms], frames that produced a plate
+        self.reads = {}  # gate -> [[seq, plate], ...]
+
+    def on_analyzed(self, gate_name, seq, capture_time, plates):
+        latency = (time.monotonic() - capture_time) * 1000
+        with self.lock:
+            self.latencies.setdefault(gate_name, []).append(latency)
+            if plates:
+                self.detection_latencies.setdefault(gate_name, []).append(latency)
+                self.reads.setdefault(gate_name, []).extend([seq, text] for text, _ in plates)
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    lat = np.array(samples)
+    return {"p50_ms": round(float(np.percentile(lat, 50)), 1), "p95_ms": round(float(np.percentile(lat, 95)), 1),
+            "max_ms": round(float(lat.max()), 1)}
+
+
+def replay(args):
+    from PyQt6.QtCore import QCoreApplication
+    import torch
+    from database_manager import init_db
+    from detection_engine import AIEngine
+    from inference_service import InferenceService
+    from main import VideoThread
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    init_db()  # Simulated gates use the default gate settings
+
+    # 1. One shared engine, as in the app
+    torch.set_num_threads(args.threads)
+    engine = AIEngine(args.model, backend=args.backend, precision=args.precision, torch_mode=args.torch_mode)
+    if engine.model is None:
+        raise RuntimeError("Could not load the detector")
+    engine.warmup()
+    service = InferenceService(engine, max_batch=args.max_batch)
+    service.start()
+
+    # 2. N simulated gates over the recordings
+    sampler, replay_stats = ResourceSampler(), ReplayStats()
+    threads = []
+    for i in range(args.gates):
+        recording = args.recording[i % len(args.recording)]
+        thread = VideoThread(recording, f"Replay-{i + 1}", service)
+        thread.reader_options = {"speed": args.speed, "timestamps": load_timestamps(recording),
+                                 "replay": args.loop}
+        thread.lockstep = args.deterministic
+        if args.analysis_fps is not None:
+            thread.settings["analysis_fps"] = args.analysis_fps
+        thread.on_analyzed = replay_stats.on_analyzed
+        threads.append(thread)
+
+    sampler.start()
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+
+    # 3. Until every recording ended (or --duration)
+    deadline = start + args.duration if args.duration else None
+    while any(thread.isRunning() for thread in threads):
+        if deadline and time.monotonic() >= deadline:
+            break
+        app.processEvents()
+        time.sleep(0.1)
+    for thread in threads:
+        thread.stop()
+    elapsed = time.monotonic() - start
+    sampler.stop()
+    service.stop()
+
+    # 4. Report
+    gates = {}
+    for thread in threads:
+        name, grabber = thread.gate_name, thread.grabber
+        gates[name] = {"recording": thread.source,
+                       "frames_grabbed": grabber.frames_grabbed, "frames_analyzed": grabber.frames_analyzed,
+                       "frames_skipped": grabber.frames_skipped, "frames_dropped": grabber.frames_dropped,
+                       "grab_fps": round(grabber.frames_grabbed / elapsed, 2),
+                       "analysis_fps": round(grabber.frames_analyzed / elapsed, 2),
+                       "reconnects": thread.reader.reconnects,
+                       "plates": len(replay_stats.reads.get(name, [])),
+                       "analysis_latency": percentiles(replay_stats.latencies.get(name, [])),
+                       "detection_latency": percentiles(replay_stats.detection_latencies.get(name, []))}
+    report = {"gates": gates, "seconds": round(elapsed, 1), "speed": args.speed,
+              "deterministic": args.deterministic, "backend": engine.model.name, "threads": args.threads,
+              "process": sampler.summary()}
+    reads = {name: replay_stats.reads.get(name, []) for name in gates}
+    return report, reads
+
+
+def compare_reads(reads, expected):
+    """Differences between two read sets, as human readable lines"""
+    problems = []
+    for gate in sorted(set(reads) | set(expected)):
+        got, want = reads.get(gate), expected.get(gate)
+        if got is None or want is None:
+            problems.append(f"{gate}: {'missing' if got is None else 'unexpected'} gate")
+        elif got != want:
+            first = next((i for i, (a, b) in enumerate(zip(got, want)) if a != b), min(len(got), len(want)))
+            problems.append(f"{gate}: {len(got)} reads vs {len(want)} expected, first difference at #{first}: "
+                            f"{got[first] if first < len(got) else None} vs {want[first] if first < len(want) else None}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record camera streams / replay them as simulated gates")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="Capture sources to MJPG files with per-frame timestamps")
+    rec.add_argument("--source", action="append", required=True,
+                     help="USB index, RTSP/HTTP URL or video file (repeat for several cameras)")
+    rec.add_argument("--duration", type=float, required=True, help="Seconds to record")
+    rec.add_argument("--output-dir", default="recordings")
+    rec.add_argument("--transport", default="tcp", choices=["tcp", "udp"])
+
+    rep = commands.add_parser("replay", help="Run recordings through N simulated gates")
+    rep.add_argument("--recording", action="append", required=True, help="Recorded file (repeat for several)")
+    rep.add_argument("--gates", type=int, default=0, help="Simulated gates (default: one per recording)")
+    rep.add_argument("--speed", type=float, default=1.0, help="Replay speed vs real time (0 = unthrottled)")
+    rep.add_argument("--loop", action="store_true", help="Loop the recordings (stop with --duration)")
+    rep.add_argument("--duration", type=float, default=0, help="Stop after N seconds (0 = end of recordings)")
+    rep.add_argument("--deterministic", action="store_true",
+                     help="Lockstep capture on the recording's clock (reproducible plate reads)")
+    rep.add_argument("--analysis-fps", type=float, help="Override the gates' analysis rate cap (0 = every frame)")
+    rep.add_argument("--model", default="./models/rtdetr_best")
+    rep.add_argument("--backend", default="torch", choices=BACKENDS)
+    rep.add_argument("--precision", default="fp32", choices=PRECISIONS)
+    rep.add_argument("--torch-mode", default="eager", choices=TORCH_MODES)
+    rep.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="torch intra-op threads")
+    rep.add_argument("--max-batch", type=int, default=6, help="Inference service batch size across gates")
+    rep.add_argument("--output", help="Write the report as JSON")
+    rep.add_argument("--reads", help="Write the plate reads as JSON (a golden file for --expect)")
+    rep.add_argument("--expect", help="Golden reads to compare against (exit 1 on any difference)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    if args.command == "record":
+        os.makedirs(args.output_dir, exist_ok=True)
+        stop_event = threading.Event()
+        workers = [threading.Thread(target=record, name=f"Record-{i + 1}",
+                                    args=(source, os.path.join(args.output_dir, f"gate{i + 1}.avi"),
+                                          args.duration, args.transport, stop_event))
+                   for i, source in enumerate(args.source)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            stop_event.set()  # Each recorder finishes its current frame and writes its timestamps
+            for worker in workers:
+                worker.join()
+        return 0
+
+    for path in args.recording:
+        if not os.path.isfile(path):
+            logger.error("No such recording: %s", path)
+            return 1
+    args.gates = args.gates or len(args.recording)
+    try:
+        report, reads = replay(args)
+    except RuntimeError as e:
+        logger.error("%s", e)
+        return 1
+
+    print(f"{'gate':14} {'grabbed':>8} {'analyzed':>9} {'dropped':>8} {'an. fps':>8} {'p50 ms':>8} {'p95 ms':>8} {'plates':>7}")
+    for name, g in report["gates"].items():
+        lat = g["analysis_latency"] or {"p50_ms": 0, "p95_ms": 0}
+        print(f"{name:14} {g['frames_grabbed']:8d} {g['frames_analyzed']:9d} {g['frames_dropped']:8d} "
+              f"{g['analysis_fps']:8.2f} {lat['p50_ms']:8.1f} {lat['p95_ms']:8.1f} {g['plates']:7d}")
+    print(json.dumps(report["process"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.reads:
+        with open(args.reads, "w", encoding="utf-8") as f:
+            json.dump(reads, f, indent=2)
+
+    if args.expect:
+        with open(args.expect, "r", encoding="utf-8") as f:
+            problems = compare_reads(reads, json.load(f))
+        for problem in problems:
+            logger.error("Read mismatch - %s", problem)
+        if problems:
+            return 1
+        logger.info("Plate reads match %s", args.expect)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Endurance soak test: the full app on replayed streams, for hours, failing on resource growth.
+
+Usage:
+    python soak_test.py --recording recordings/gate1.avi --gates 4 --speed 8 --hours 4
+    python soak_test.py --recording recordings/gate1.avi --recording recordings/gate2.avi --multiprocess --hours 12
+    python soak_test.py --recording recordings/gate1.avi --hours 1 --max-rss-slope 10 --output soak.json
+
+The real SmartGateApp (camera grid, VideoThreads or gate worker processes, shared inference
+service, Entry Dialogs, database) runs headless (QT_QPA_PLATFORM=offscreen unless --show) in
+a scratch directory (--workdir: its own smartgate.db, logs, logs_images and Qt settings, so
+the installation is not touched). Gate i loops recording i mod R at --speed times real time,
+so a few hours cover days of traffic. Every Entry Dialog is approved after --approve-after
+seconds, which exercises the crop display, image saving and the entry log.
+
+Every --sample-interval seconds the process is sampled: RSS, open fds, OS threads, live
+QImage / QPixmap objects (Python side), SQLite handles (fds on the database files and open
+sqlite3 connections) and, in multiprocess mode, the RSS of the gate workers. The series is
+appended to <workdir>/soak_samples.csv as it runs. At the end a line is fitted to every
+series after --warmup minutes; any slope (per wall-clock hour) above its limit fails the
+run (exit 1). Caches and pools fill up during the warmup, a leak keeps growing after it.
+"""
+import os
+import sys
+import csv
+import gc
+import json
+import time
+import sqlite3
+import argparse
+import logging
+import numpy as np
+from inference_backends import BACKENDS, PRECISIONS, TORCH_MODES
+from replay_harness import process_sample
+from stream_reader import REPLAY_SPEED_ENV
+logger = logging.getLogger(__name__)
+
+SAMPLES_FILE = "soak_samples.csv"
+SERIES = ("rss_mb", "workers_rss_mb", "fds", "threads", "qimages", "qpixmaps", "sqlite_fds", "sqlite_connections")
+
+
+# --- Sampling ---
+
+def children_rss_mb():
+    """Summed RSS of the child processes (gate workers), or None where /proc is not available"""
+    try:
+        pids = set()
+        for task in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{task}/children", "r", encoding="ascii") as f:
+                pids.update(f.read().split())
+    except OSError:
+        return None
+    total = 0.0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) / 1024
+        except OSError:
+            pass  # Exited (restarted by the supervisor) in the meantime
+    return total
+
+
+def sqlite_fds(db_name):
+    """Open fds on the database and its journal / WAL files (Linux), or None"""
+    try:
+        fds = os.listdir("/proc/self/fd")
+    except OSError:
+        return None
+    count = 0
+    for fd in fds:
+        try:
+            target = os.readlink(f"/proc/self/fd/{fd}")
+        except OSError:
+            continue
+        if os.path.basename(target).startswith(db_name):
+            count += 1
+    return count
+
+
+def live_objects():
+    """Live QImage / QPixmap wrappers and sqlite3 connections (one gc walk)"""
+    from PyQt6.QtGui import QImage, QPixmap
+    counts = {"qimages": 0, "qpixmaps": 0, "sqlite_connections": 0}
+    for obj in gc.get_objects():
+        if isinstance(obj, QImage):
+            counts["qimages"] += 1
+        elif isinstance(obj, QPixmap):
+            counts["qpixmaps"] += 1
+        elif isinstance(obj, sqlite3.Connection):
+            counts["sqlite_connections"] += 1
+    return counts
+
+
+def soak_sample(start, db_name):
+    from metrics import REGISTRY
+    sample = process_sample()
+    seen = REGISTRY.snapshot(include_remote=True).get("smartgate_frames_seen_total", {}).get("series", {})
+    sample.update(live_objects())
+    sample.update({"hours": (sample["time"] - start) / 3600, "workers_rss_mb": children_rss_mb(),
+                   "sqlite_fds": sqlite_fds(db_name), "frames_seen": int(sum(seen.values()))})
+    return sample
+
+
+# --- Trend check ---
+
+def slopes(samples, warmup_hours):
+    """Per series: least-squares slope per hour over the samples after the warmup (None if too few)"""
+    steady = [s for s in samples if s["hours"] >= warmup_hours]
+    result = {}
+    for name in SERIES:
+        points = [(s["hours"], s[name]) for s in steady if s[name] is not None]
+        if len(points) < 3 or points[-1][0] - points[0][0] <= 0:
+            result[name] = None
+            continue
+        hours, values = np.array(points, dtype=float).T
+        result[name] = float(np.polyfit(hours, values, 1)[0])
+    return result
+
+
+def check_slopes(measured, limits):
+    """Human readable violations"""
+    return [f"{name} grows {slope:+.2f}/h (limit {limits[name]:.2f}/h)"
+            for name, slope in measured.items() if slope is not None and slope > limits[name]]
+
+
+# --- Run ---
+
+def prepare_workdir(args):
+    """Scratch directory with its own database, logs, Qt settings and gates"""
+    from PyQt6.QtCore import QSettings
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    # The app (and every gate worker) loads ./models/rtdetr_best
+    os.makedirs("models", exist_ok=True)
+    link = os.path.join("models", "rtdetr_best")
+    if os.path.islink(link):
+        os.remove(link)
+    os.symlink(args.model, link, target_is_directory=True)
+
+    # Before any QSettings is created: the app's settings live in the scratch directory
+    for fmt in (QSettings.Format.NativeFormat, QSettings.Format.IniFormat):
+        QSettings.setPath(fmt, QSettings.Scope.UserScope, os.path.abspath("settings"))
+    settings = QSettings("SmartGateCorp", "SmartGateApp")
+    settings.setValue("multiprocess_gates", args.multiprocess)
+    settings.setValue("ai_backend", args.backend)
+    settings.setValue("ai_precision", args.precision)
+    settings.setValue("ai_torch_mode", args.torch_mode)
+    settings.sync()
+
+    from database_manager import init_db, get_all_gates, delete_gate, add_or_update_gate
+    init_db()
+    for g_id, name, source in get_all_gates():
+        delete_gate(g_id)
+    for i in range(args.gates):
+        add_or_update_gate(f"Soak-{i + 1}", args.recording[i % len(args.recording)],
+                           analysis_fps=args.analysis_fps)
+
+
+def soak(args):
+    from PyQt6.QtCore import QSettings, QTimer
+    from PyQt6.QtWidgets import QApplication
+    import database_manager
+    from entry_dialog import EntryDialog
+    from main import SmartGateApp, start_model_loader
+
+    # 1. Scratch installation, replays looping at --speed (gate worker processes inherit it)
+    os.environ[REPLAY_SPEED_ENV] = str(args.speed)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    prepare_workdir(args)
+
+    # 2. The app as the guard sees it, once the engine is ready
+    ai_service, model_loader = start_model_loader(QSettings("SmartGateCorp", "SmartGateApp"))
+    if model_loader is not None:  # None in multiprocess mode: the gate workers load their own
+        model_loader.wait()
+        if not model_loader.ready:
+            raise RuntimeError(f"Could not load the detector: {model_loader.status_text}")
+    window = SmartGateApp("soak", "admin", ai_service, model_loader)
+    window.show()
+
+    # 3. Approve every Entry Dialog (they run in a nested event loop, timers keep firing)
+    approved = [0]
+
+    def approve():
+        dialog = QApplication.activeModalWidget()
+        if isinstance(dialog, EntryDialog):
+            dialog.approve_entry()
+            approved[0] += 1
+
+    approve_timer = QTimer()
+    approve_timer.timeout.connect(approve)
+    approve_timer.start(int(args.approve_after * 1000))
+
+    # 4. Sample into the CSV as the run goes (the data survives a crash)
+    start = time.monotonic()
+    samples = []
+    columns = ["hours", *SERIES, "cpu_s", "frames_seen", "approved"]
+    csv_file = open(SAMPLES_FILE, "w", newline="", encoding="utf-8")
+    writer = csv.DictWriter(csv_file, columns, extrasaction="ignore")
+    writer.writeheader()
+
+    def sample():
+        s = soak_sample(start, database_manager.DB_NAME)
+        s["approved"] = approved[0]
+        samples.append(s)
+        writer.writerow({k: round(v, 4) if isinstance(v, float) else v for k, v in s.items()})
+        csv_file.flush()
+        logger.info("Soak %.2f h: RSS %.0f MB, fds %s, threads %d, QImage %d, QPixmap %d, SQLite fds %s, "
+                    "frames %d, entries %d", s["hours"], s["rss_mb"] or 0, s["fds"], s["threads"],
+                    s["qimages"], s["qpixmaps"], s["sqlite_fds"], s["frames_seen"], s["approved"])
+
+    sample_timer = QTimer()
+    sample_timer.timeout.connect(sample)
+    sample_timer.start(int(args.sample_interval * 1000))
+    sample()
+
+    # 5. Run, then shut down the way logout does
+    QTimer.singleShot(int(args.hours * 3600 * 1000), app.quit)
+    app.exec()
+    approve_timer.stop()
+    sample_timer.stop()
+    sample()
+    csv_file.close()
+    window.metrics_timer.stop()
+    window.stop_gate_processes()
+    for thread in window.camera_threads:
+        if thread.isRunning():
+            thread.stop()
+            thread.wait()
+    ai_service.stop()
+
+    # 6. Trends after the warmup
+    measured = slopes(samples, args.warmup / 60)
+    first, last = samples[0], samples[-1]
+    report = {"hours": round(last["hours"], 3), "speed": args.speed, "gates": args.gates,
+              "multiprocess": args.multiprocess, "samples": len(samples),
+              "frames_seen": last["frames_seen"], "entries_approved": approved[0],
+              "start": {name: first[name] for name in SERIES}, "end": {name: last[name] for name in SERIES},
+              "slopes_per_hour": {name: None if v is None else round(v, 3) for name, v in measured.items()},
+              "limits_per_hour": args.limits}
+    problems = check_slopes(measured, args.limits)
+    if last["frames_seen"] == first["frames_seen"]:
+        problems.append("no frame was analyzed - the soak did not exercise the pipeline")
+    if all(v is None for v in measured.values()):
+        problems.append("too few samples after the warmup to fit a trend")
+    report["problems"] = problems
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test: the full app on replayed streams, fails on resource growth")
+    parser.add_argument("--recording", action="append", required=True, help="Recorded file (repeat for several)")
+    parser.add_argument("--gates", type=int, default=0, help="Gates (default: one per recording)")
+    parser.add_argument("--speed", type=float, default=4.0, help="Replay speed vs real time")
+    parser.add_argument("--hours", type=float, default=4.0, help="Wall-clock duration")
+    parser.add_argument("--warmup", type=float, default=10.0, help="Minutes excluded from the trend fit")
+    parser.add_argument("--sample-interval", type=float, default=30.0, help="Seconds between samples")
+    parser.add_argument("--approve-after", type=float, default=0.5, help="Seconds before an Entry Dialog is approved")
+    parser.add_argument("--analysis-fps", type=float, default=5.0, help="Gates' analysis rate cap")
+    parser.add_argument("--multiprocess", action="store_true", help="One worker process per gate")
+    parser.add_argument("--workdir", default="soak_run", help="Scratch directory (database, logs, settings)")
+    parser.add_argument("--show", action="store_true", help="Show the window instead of running offscreen")
+    parser.add_argument("--model", default="./models/rtdetr_best")
+    parser.add_argument("--backend", default="torch", choices=BACKENDS)
+    parser.add_argument("--precision", default="fp32", choices=PRECISIONS)
+    parser.add_argument("--torch-mode", default="eager", choices=TORCH_MODES)
+    parser.add_argument("--max-rss-slope", type=float, default=20.0, help="MB per hour (UI process and gate workers)")
+    parser.add_argument("--max-fd-slope", type=float, default=2.0, help="Open fds per hour")
+    parser.add_argument("--max-thread-slope", type=float, default=1.0, help="OS threads per hour")
+    parser.add_argument("--max-qt-slope", type=float, default=5.0, help="Live QImage / QPixmap objects per hour")
+    parser.add_argument("--max-sqlite-slope", type=float, default=0.5, help="SQLite fds / connections per hour")
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    for path in args.recording:
+        if not os.path.isfile(path):
+            logger.error("No such recording: %s", path)
+            return 1
+    # Paths as seen from the scratch directory
+    args.recording = [os.path.abspath(path) for path in args.recording]
+    args.model = os.path.abspath(args.model)
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.gates = args.gates or len(args.recording)
+    args.limits = {"rss_mb": args.max_rss_slope, "workers_rss_mb": args.max_rss_slope,
+                   "fds": args.max_fd_slope, "threads": args.max_thread_slope,
+                   "qimages": args.max_qt_slope, "qpixmaps": args.max_qt_slope,
+                   "sqlite_fds": args.max_sqlite_slope, "sqlite_connections": args.max_sqlite_slope}
+    if not args.show:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    try:
+        report = soak(args)
+    except RuntimeError as e:
+        logger.error("%s", e)
+        return 1
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    for problem in report["problems"]:
+        logger.error("Soak failed - %s", problem)
+    if report["problems"]:
+        return 1
+    logger.info("Soak passed: no resource grows beyond its limit")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import logging
+from types import SimpleNamespace
+import pytest
+import cpu_scheduler
+from cpu_scheduler import CoreScheduler
+
+
+class FakeInference:
+    def __init__(self):
+        self.thread_counts = []
+
+    def set_num_threads(self, num_threads):
+        self.thread_counts.append(num_threads)
+
+
+def gate(name):
+    return SimpleNamespace(gate_name=name, native_id=None)
+
+
+@pytest.fixture
+def cpus(monkeypatch):
+    """Pretends the process may use `n` CPUs"""
+    def use(n):
+        monkeypatch.setattr(cpu_scheduler, "available_cpus", lambda: list(range(n)))
+    return use
+
+
+@pytest.fixture
+def pinned(monkeypatch):
+    calls = []
+    monkeypatch.setattr(CoreScheduler, "_set_affinity", lambda self, thread, cpus: calls.append(
+        (getattr(thread, "gate_name", "inference"), cpus)))
+    return calls
+
+
+def test_motion_toggles_only_repin_and_log_at_debug(cpus, pinned, caplog):
+    cpus(8)
+    scheduler = CoreScheduler(pin_threads=True)
+    inference = FakeInference()
+    scheduler.attach_inference(inference)
+    scheduler.set_gates([gate("A"), gate("B")])
+    assert inference.thread_counts == [8, 6]
+    pinned.clear()
+
+    with caplog.at_level(logging.DEBUG, logger="cpu_scheduler"):
+        scheduler.set_active("A", True)
+    assert inference.thread_counts == [8, 6]  # No torch pool resize for a passing car
+    assert pinned == [("A", [0]), ("B", [1])]
+    assert [r.levelno for r in caplog.records] == [logging.DEBUG]
+
+    # B gets its own core too: the same assignment, so nothing is applied or logged
+    pinned.clear()
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG, logger="cpu_scheduler"):
+        scheduler.set_active("B", True)
+    assert scheduler.plan["gates"] == {"A": [0], "B": [1]}
+    assert pinned == []
+    assert caplog.records == []
+
+def test_new_threads_are_always_applied(cpus, pinned):
+    cpus(4)
+    scheduler = CoreScheduler(pin_threads=True)
+    scheduler.set_gates([gate("A")])
+    pinned.clear()
+    scheduler.set_gates([gate("A")])  # Restarted camera: same plan, new thread
+    assert pinned == [("A", [0])]
+
+
+@pytest.mark.parametrize("budget,gates,active,expected", [
+    # Single core: everything shares it
+    (1, ["A"], [], {"inference_cpus": [0], "inference_threads": 1,
+                    "gates": {"A": [0]}, "opencv_threads": 1}),
+    # Two cores, one gate: inference keeps one core of its own
+    (2, ["A"], ["A"], {"inference_cpus": [1], "inference_threads": 1,
+                       "gates": {"A": [0]}, "opencv_threads": 1}),
+    # A quarter of 8 cores for 4 gates, all idle: they share the capture cores
+    (8, ["A", "B", "C", "D"], [], {"inference_cpus": [2, 3, 4, 5, 6, 7], "inference_threads": 6,
+                                   "gates": {n: [0, 1] for n in "ABCD"}, "opencv_threads": 1}),
+    # One active gate gets a dedicated core, the idle ones share the other
+    (8, ["A", "B", "C", "D"], ["C"], {"inference_cpus": [2, 3, 4, 5, 6, 7], "inference_threads": 6,
+                                      "gates": {"A": [1], "B": [1], "C": [0], "D": [1]},
+                                      "opencv_threads": 1}),
+    # More active gates than spare cores: the last active gate shares with the idle ones
+    (8, ["A", "B", "C"], ["A", "B"], {"inference_cpus": [2, 3, 4, 5, 6, 7], "inference_threads": 6,
+                                      "gates": {"A": [0], "B": [1], "C": [1]}, "opencv_threads": 1}),
+    # Never more than one capture core per gate
+    (16, ["A"], [], {"inference_cpus": list(range(1, 16)), "inference_threads": 15,
+                     "gates": {"A": [0]}, "opencv_threads": 1}),
+    # Big budget, two active gates: a core each, and OpenCV stays single-threaded per gate
+    (16, ["A", "B"], ["A", "B"], {"inference_cpus": list(range(2, 16)), "inference_threads": 14,
+                                  "gates": {"A": [0], "B": [1]}, "opencv_threads": 1}),
+    # No gates yet: the whole budget goes to inference
+    (4, [], [], {"inference_cpus": [0, 1, 2, 3], "inference_threads": 4, "gates": {}, "opencv_threads": 1}),
+])
+def test_compute_plan(cpus, budget, gates, active, expected):
+    cpus(budget)
+    scheduler = CoreScheduler()
+    scheduler.gate_threads = [gate(name) for name in gates]
+    scheduler.active_gates = set(active)
+    assert scheduler._compute_plan() == expected
+
+
+def test_core_budget_is_capped_by_the_available_cpus(cpus):
+    cpus(4)
+    assert CoreScheduler(core_budget=2).cpus == [0, 1]
+    assert CoreScheduler(core_budget=64).cpus == [0, 1, 2, 3]
+    assert CoreScheduler(core_budget=0).cpus == [0, 1, 2, 3]
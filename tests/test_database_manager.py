@@ -0,0 +1,34 @@
+import sqlite3
+import pytest
+import database_manager
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "smartgate.db")
+    monkeypatch.setattr(database_manager, "DB_NAME", path)
+    return path
+
+
+def test_existing_gates_keep_analysing_every_frame_after_the_upgrade(db_path):
+    # A database from before the per-gate pipeline settings existed
+    conn = sqlite3.connect(db_path)
+    conn.execute("""CREATE TABLE gates (id INTEGER PRIMARY KEY AUTOINCREMENT, gate_name TEXT UNIQUE,
+                    camera_source TEXT, is_active INTEGER DEFAULT 1)""")
+    conn.execute("INSERT INTO gates (gate_name, camera_source) VALUES ('Main', '0')")
+    conn.commit()
+    conn.close()
+
+    database_manager.init_db()
+    settings = database_manager.get_gate_settings("Main")
+    assert settings["analysis_fps"] == 0
+    assert settings["motion_enabled"] is True
+    assert settings["rtsp_transport"] == "tcp"
+
+
+def test_new_gates_default_to_five_fps(db_path):
+    database_manager.init_db()
+    assert database_manager.add_or_update_gate("Side", "rtsp://cam/stream")
+    assert database_manager.get_gate_settings("Side")["analysis_fps"] == 5.0
+    assert database_manager.add_or_update_gate("Side", "rtsp://cam/stream", analysis_fps=0)
+    assert database_manager.get_gate_settings("Side")["analysis_fps"] == 0
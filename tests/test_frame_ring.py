@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from frame_grabber import FrameGrabber
+from frame_ring import FrameRing, read_into_ring
+
+
+class FakeCap:
+    """cv2.VideoCapture stand-in: retrieve(image) fills the given buffer when the size matches"""
+
+    def __init__(self, shape=(4, 6, 3)):
+        self.shape = shape
+        self.value = 0
+
+    def grab(self):
+        return True
+
+    def retrieve(self, image=None):
+        self.value += 1
+        if image is None or image.shape != self.shape:
+            return True, np.full(self.shape, self.value % 256, np.uint8)
+        image[...] = self.value % 256
+        return True, image
+
+    def read(self, image=None):
+        return self.retrieve(image)
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing((4, 6, 3), slots=4)
+    yield ring
+    ring.close()
+
+
+def write(ring, value):
+    seq, slot = ring.begin_write()
+    slot[...] = value
+    ring.commit(seq)
+    return seq
+
+
+def test_views_are_invalidated_when_the_slot_is_recycled(ring):
+    first = write(ring, 1)
+    view = ring.get(first)
+    assert ring.is_valid(first) and view[0, 0, 0] == 1
+    for value in range(2, 2 + ring.slots):
+        write(ring, value)
+    assert not ring.is_valid(first)
+    assert ring.get(first) is None
+    assert ring.copy(first) is None
+
+
+def test_slot_being_written_is_invalid_until_commit(ring):
+    first = write(ring, 1)
+    for value in range(2, ring.slots + 1):
+        write(ring, value)
+    seq, _ = ring.begin_write()  # Reuses the oldest slot
+    assert seq % ring.slots == first % ring.slots
+    assert not ring.is_valid(first) and not ring.is_valid(seq)
+    ring.commit(seq)
+    assert ring.latest()[0] == seq
+
+
+def test_held_slot_is_skipped_by_the_writer(ring):
+    held = write(ring, 7)
+    assert ring.acquire(held) is not None
+    for value in range(3 * ring.slots):
+        write(ring, value)
+    assert ring.is_valid(held)
+    assert ring.get(held)[0, 0, 0] == 7
+    ring.release(held)
+    for value in range(ring.slots):
+        write(ring, value)
+    assert not ring.is_valid(held)
+
+
+def test_hold_counts_never_go_negative(ring):
+    seq = write(ring, 1)
+    ring.release(seq)  # Never acquired
+    ring.release(seq)
+    assert (ring._holds >= 0).all()
+    # A later holder is still protected
+    assert ring.acquire(seq) is not None
+    for value in range(3 * ring.slots):
+        write(ring, value)
+    assert ring.is_valid(seq)
+    ring.release(seq)
+
+
+def test_resized_ring_continues_the_frame_numbers():
+    cap = FakeCap((4, 6, 3))
+    ring, first, _ = read_into_ring(None, cap, slots=4)
+    ring, second, _ = read_into_ring(ring, cap, slots=4)
+    cap.shape = (8, 12, 3)
+    resized, third, frame = read_into_ring(ring, cap, slots=4)
+    try:
+        assert resized is not ring
+        assert frame.shape == (8, 12, 3)
+        assert first < second < third
+    finally:
+        resized.close()
+
+
+def test_grabber_releases_on_the_ring_the_frame_came_from():
+    cap = FakeCap((4, 6, 3))
+    grabber = FrameGrabber(cap, ring_slots=4, preview_fps=0)
+    grabber.ring, seq, _ = read_into_ring(None, cap, slots=4)
+    grabber.latest_seq = seq
+    held_seq, frame = grabber.latest(0, timeout=0.1)
+    assert held_seq == seq and frame is not None
+
+    # Resolution change while the analysis loop holds the frame
+    cap.shape = (8, 12, 3)
+    grabber.ring, new_seq, _ = read_into_ring(grabber.ring, cap, slots=4)
+    grabber.latest_seq = new_seq
+    grabber.release(held_seq)
+    try:
+        assert (grabber.ring._holds >= 0).all() and not grabber.ring._holds.any()
+        # The new ring's frames are newer than anything seen before
+        next_seq, next_frame = grabber.latest(held_seq, timeout=0.1)
+        assert next_seq == new_seq and next_frame.shape == (8, 12, 3)
+        grabber.release(next_seq)
+        assert not grabber.ring._holds.any()
+    finally:
+        grabber.ring.close()
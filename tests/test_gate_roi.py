@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from gate_roi import format_roi, parse_roi, roi_bounds, roi_contour
+
+
+@pytest.mark.parametrize("text", [None, "", "   ", "0.1,0.2", "a,b;c,d", "0.1,0.2,0.3;0.4,0.5", "0.5,0.1;0.5,0.9"])
+def test_parse_roi_rejects_empty_and_invalid_text(text):
+    assert parse_roi(text) is None
+
+
+def test_two_points_become_a_normalized_rectangle():
+    assert parse_roi("0.8,0.9;0.2,0.1") == [(0.2, 0.1), (0.8, 0.1), (0.8, 0.9), (0.2, 0.9)]
+
+
+def test_polygon_points_are_clamped_to_the_frame():
+    assert parse_roi("-0.5,0.2; 0.5,1.5 ;0.9,0.3;") == [(0.0, 0.2), (0.5, 1.0), (0.9, 0.3)]
+
+
+def test_format_roi_round_trips():
+    points = [(0.1, 0.2), (0.6, 0.25), (0.5, 0.9)]
+    assert format_roi(None) == ""
+    assert parse_roi(format_roi(points)) == points
+
+
+def test_roi_bounds_cover_the_polygon_and_stay_inside_the_frame():
+    points = [(0.0, 0.25), (0.501, 0.25), (1.0, 1.0)]
+    assert roi_bounds(points, 640, 480) == (0, 120, 640, 480)
+    # A degenerate ROI still yields a non-empty crop
+    assert roi_bounds([(0.5, 0.5), (0.5, 0.5)], 640, 480) == (320, 240, 321, 241)
+
+
+def test_roi_contour_is_in_crop_coordinates():
+    contour = roi_contour([(0.25, 0.5), (0.75, 0.5), (0.75, 1.0)], 400, 200, offset=(100, 100))
+    assert contour.dtype == np.float32
+    np.testing.assert_allclose(contour, [[0, 0], [200, 0], [200, 100]])
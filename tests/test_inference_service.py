@@ -0,0 +1,136 @@
+import threading
+import pytest
+from inference_service import DETECT, OCR, READ, READ_ALL, InferenceService
+
+
+class FakeEngine:
+    """Records the batches it is given; frames are strings, candidates echo them back"""
+
+    def __init__(self):
+        self.detect_batches = []
+        self.ocr_batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+        self.fail = False
+
+    def detect_plates_batch(self, frames, rois):
+        self.entered.set()
+        self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("detector failed")
+        self.detect_batches.append(list(frames))
+        return [[{"frame": frame, "roi": roi}] for frame, roi in zip(frames, rois)]
+
+    def read_best_plate(self, candidates):
+        return f"best:{candidates[0]['frame']}", 0.9, None
+
+    def read_all_plates(self, candidates_per_frame):
+        return [[f"all:{c['frame']}" for c in candidates] for candidates in candidates_per_frame]
+
+    def read_plates(self, crops):
+        self.ocr_batches.append(list(crops))
+        return [(f"ocr:{crop}", 0.8, []) for crop in crops]
+
+
+@pytest.fixture
+def engine():
+    return FakeEngine()
+
+
+@pytest.fixture
+def service(engine):
+    service = InferenceService(engine, max_batch=8, max_wait_ms=100)
+    service.start()
+    yield service
+    engine.gate.set()
+    service.stop()
+
+
+def test_requests_from_several_gates_share_one_batch_and_get_their_own_results(service, engine):
+    # Hold the worker on a first frame so the other gates' requests queue up behind it
+    engine.gate.clear()
+    first = service.submit("A", "a0")
+    assert engine.entered.wait(5)
+
+    requests = {
+        "read": service.submit("B", "b0", roi="lane", kind=READ),
+        "read_all": service.submit("C", "c0", kind=READ_ALL),
+        "detect": service.submit("D", "d0", kind=DETECT),
+        "ocr_1": service.submit("B", "crop1", kind=OCR),
+        "ocr_2": service.submit("C", "crop2", kind=OCR),
+    }
+    engine.gate.set()
+
+    assert first.wait(5) == ("best:a0", 0.9, None)
+    assert requests["read"].wait(5) == ("best:b0", 0.9, None)
+    assert requests["read_all"].wait(5) == ["all:c0"]
+    assert requests["detect"].wait(5) == [{"frame": "d0", "roi": None}]
+    assert requests["ocr_1"].wait(5) == ("ocr:crop1", 0.8, [])
+    assert requests["ocr_2"].wait(5) == ("ocr:crop2", 0.8, [])
+
+    # One forward pass for the three queued frames, one recognizer batch for both crops
+    assert engine.detect_batches == [["a0"], ["b0", "c0", "d0"]]
+    assert engine.ocr_batches == [["crop1", "crop2"]]
+
+
+def test_batches_are_capped_at_max_batch(engine):
+    service = InferenceService(engine, max_batch=2, max_wait_ms=100)
+    service.start()
+    try:
+        engine.gate.clear()
+        service.submit("A", "x")
+        assert engine.entered.wait(5)
+        requests = [service.submit(gate, frame, kind=DETECT) for gate, frame in zip("BCD", "bcd")]
+        engine.gate.set()
+        for request in requests:
+            request.wait(5)
+        assert engine.detect_batches == [["x"], ["b", "c"], ["d"]]
+    finally:
+        engine.gate.set()
+        service.stop()
+
+
+def test_a_timed_out_request_returns_empty_and_ignores_the_late_result(service, engine):
+    engine.gate.clear()
+    request = service.submit("A", "slow", kind=READ_ALL)
+    assert engine.entered.wait(5)
+
+    assert request.wait(timeout=0.05) == []
+    engine.gate.set()
+    # The worker finishing later does not overwrite the cancelled result
+    service.submit("A", "next", kind=DETECT).wait(5)
+    assert request.result == []
+
+
+def test_a_failed_batch_cancels_its_requests_and_the_worker_keeps_going(service, engine):
+    engine.fail = True
+    assert service.submit("A", "f", kind=READ).wait(5) == (None, 0, None)
+    engine.fail = False
+    assert service.submit("A", "ok", kind=DETECT).wait(5) == [{"frame": "ok", "roi": None}]
+
+
+def test_without_an_engine_requests_return_empty_immediately():
+    service = InferenceService()
+    service.start()
+    try:
+        assert service.detect_and_read("frame", "A") == (None, 0, None)
+        assert service.read_plates(["c1", "c2"], "A") == [(None, 0, []), (None, 0, [])]
+        assert not service.ready
+    finally:
+        service.stop()
+
+
+def test_stop_releases_queued_requests(engine):
+    service = InferenceService(engine, max_batch=1, max_wait_ms=0)
+    service.start()
+    engine.gate.clear()
+    service.submit("A", "busy")
+    assert engine.entered.wait(5)
+    queued = service.submit("B", "waiting", kind=DETECT)
+    assert service.queue_depth()[(("gate", "B"),)] == 1
+
+    service._running = False  # What stop() does first; the worker is stuck in the engine
+    engine.gate.set()
+    service.stop()
+    assert queued.wait(timeout=1) == []
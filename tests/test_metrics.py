@@ -0,0 +1,81 @@
+import pickle
+import pytest
+from metrics import Histogram, MetricsRegistry, diagnostics_report, quantile
+
+
+def test_histogram_buckets_are_inclusive_upper_bounds():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["counts"] == [2, 1, 1, 1]
+    assert snapshot["count"] == 5
+    assert snapshot["sum"] == pytest.approx(5.565)
+
+
+def test_quantile_interpolates_inside_the_bucket():
+    snapshot = {"buckets": (0.01, 0.1), "counts": [0, 10, 0], "sum": 0.5, "count": 10}
+    assert quantile(snapshot, 0.5) == pytest.approx(0.055)
+    assert quantile({"buckets": (0.01,), "counts": [0, 3], "sum": 9.0, "count": 3}, 0.99) == 0.01
+    assert quantile({"buckets": (0.01,), "counts": [0, 0], "sum": 0.0, "count": 0}, 0.5) is None
+
+
+def test_registry_returns_the_same_series_for_the_same_labels():
+    registry = MetricsRegistry()
+    a = registry.counter("frames_total", "Frames", gate="A")
+    assert registry.counter("frames_total", "Frames", gate="A") is a
+    assert registry.counter("frames_total", "Frames", gate="B") is not a
+
+
+def test_remote_snapshots_add_up_with_local_series():
+    local, worker = MetricsRegistry(), MetricsRegistry()
+    local.counter("frames_total", "Frames", gate="A").inc(2)
+    worker.counter("frames_total", "Frames", gate="A").inc(3)
+    local.histogram("stage_seconds", "Stage", stage="ocr").observe(0.02)
+    worker.histogram("stage_seconds", "Stage", stage="ocr").observe(0.2)
+
+    snapshot = worker.snapshot()
+    local.set_remote("gate-A", pickle.loads(pickle.dumps(snapshot)))  # Crosses the process boundary
+    merged = local.snapshot(include_remote=True)
+    assert merged["frames_total"]["series"][(("gate", "A"),)] == 5
+    assert merged["stage_seconds"]["series"][(("stage", "ocr"),)]["count"] == 2
+    assert local.snapshot()["frames_total"]["series"][(("gate", "A"),)] == 2
+
+
+def test_gauge_callbacks_are_evaluated_at_snapshot_time():
+    registry = MetricsRegistry()
+    depth = {"value": 1}
+    handle = registry.gauge_callback("queue_depth", "Queued", lambda: {(("gate", "A"),): depth["value"]})
+    depth["value"] = 4
+    assert registry.snapshot()["queue_depth"]["series"][(("gate", "A"),)] == 4
+    registry.remove_callback(handle)
+    assert "queue_depth" not in registry.snapshot()
+
+
+def test_prometheus_text_format(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames seen", gate='Gate "1"').inc(3)
+    registry.histogram("stage_seconds", "Stage time", buckets=(0.01, 0.1), stage="ocr").observe(0.05)
+    path = tmp_path / "textfile" / "smartgate.prom"
+    registry.write_prometheus(str(path))
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert "# TYPE frames_total counter" in lines
+    assert 'frames_total{gate="Gate \\"1\\""} 3' in lines
+    assert 'stage_seconds_bucket{stage="ocr",le="0.01"} 0' in lines
+    assert 'stage_seconds_bucket{stage="ocr",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="ocr",le="+Inf"} 1' in lines
+    assert 'stage_seconds_count{stage="ocr"} 1' in lines
+    assert not (tmp_path / "textfile" / "smartgate.prom.tmp").exists()
+
+
+def test_diagnostics_report_lists_stages_and_gates():
+    registry = MetricsRegistry()
+    registry.histogram("smartgate_stage_seconds", "Stage", stage="inference").observe(0.04)
+    registry.counter("smartgate_frames_seen_total", "Seen", gate="North").inc(10)
+    registry.counter("smartgate_frames_gated_total", "Gated", gate="North").inc(7)
+
+    report = diagnostics_report(registry.snapshot())
+    assert "inference" in report
+    north = next(line for line in report.splitlines() if line.startswith("North"))
+    assert north.split() == ["North", "10", "7", "0"]
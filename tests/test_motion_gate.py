@@ -0,0 +1,50 @@
+import numpy as np
+from motion_gate import MotionGate
+
+
+def frame(value=80, car=False):
+    image = np.full((360, 640, 3), value, np.uint8)
+    if car:
+        image[120:300, 250:450] = 220
+    return image
+
+
+def test_static_scene_is_gated_after_the_hold_time():
+    gate = MotionGate(hold_seconds=2.0)
+    assert gate.update(frame(), now=0.0)       # First frame learns the background
+    assert gate.update(frame(), now=1.0)       # Still inside the hold window
+    assert not gate.update(frame(), now=3.0)
+    assert gate.frames_seen == 3
+    assert gate.frames_gated == 1
+
+
+def test_motion_in_the_zone_opens_the_gate_and_holds_it():
+    gate = MotionGate(hold_seconds=2.0)
+    gate.update(frame(), now=0.0)
+    assert not gate.update(frame(), now=5.0)
+    assert gate.update(frame(car=True), now=6.0)
+    assert gate.last_ratio >= gate.threshold
+    # The car stopped at the barrier: no new change, but the hold keeps frames flowing
+    assert gate.update(frame(), now=7.5)
+    assert not gate.update(frame(), now=9.0)
+
+
+def test_motion_outside_the_zone_is_ignored():
+    gate = MotionGate(hold_seconds=0.0)
+    gate.set_zone_from_roi([(0.0, 0.0), (0.2, 0.0), (0.2, 0.2)])
+    gate.update(frame(), now=0.0)
+    assert not gate.update(frame(car=True), now=1.0)
+
+
+def test_disabled_gate_passes_everything():
+    gate = MotionGate(enabled=False)
+    assert all(gate.update(frame(), now=t) for t in range(10))
+    assert gate.frames_gated == 0
+
+
+def test_slow_lighting_changes_are_learned():
+    gate = MotionGate(hold_seconds=0.0, learning_rate=0.5)
+    gate.update(frame(80), now=0.0)
+    # Dusk: small steps, each under pixel_delta, never count as motion
+    passed = [gate.update(frame(value), now=t) for t, value in enumerate(range(75, 20, -5), start=1)]
+    assert not any(passed)
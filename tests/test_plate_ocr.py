@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import plate_ocr
+from plate_ocr import PLATE_CHARSET, PlateRecognizer
+
+
+class StubRecognizer:
+    """Stands in for easyocr.recognition.get_text: records the lines, answers from a script"""
+
+    def __init__(self):
+        self.lines = []
+        self.answers = []
+        self.ignore_char = None
+
+    def __call__(self, character, img_h, max_width, recognizer, converter, image_list, ignore_char, *args):
+        self.lines = [image for _, image in image_list]
+        self.ignore_char = ignore_char
+        return [(box, text, prob) for (box, _), (text, prob) in zip(image_list, self.answers)]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = StubRecognizer()
+    monkeypatch.setattr(plate_ocr, "get_text", stub)
+    return stub
+
+
+@pytest.fixture
+def recognizer():
+    reader = SimpleNamespace(character="0123456789abcABCDEFGHIJKLMNOPQRSTUVWXYZ-. ", recognizer=None,
+                             converter=None, device="cpu")
+    return PlateRecognizer(reader)
+
+
+def crop(h, w):
+    return np.full((h, w, 3), 128, np.uint8)
+
+
+def test_only_plate_characters_are_recognized(recognizer):
+    assert set(recognizer.ignore_char) == set("abc-. ")
+    assert not set(recognizer.ignore_char) & set(PLATE_CHARSET)
+
+
+def test_results_map_back_to_their_crops(recognizer, stub):
+    crops = [crop(40, 200), None, crop(40, 160), crop(0, 0), crop(40, 180)]
+    stub.answers = [("mh12 ab-1234", 0.9), ("KA01.xy9", 0.2), ("dl3c:af5", 0.8)]
+    results = recognizer.read_batch(crops)
+
+    assert len(stub.lines) == 3  # One recognizer call for the three usable crops
+    assert results == [
+        ("MH12AB1234", 0.9, [0.9] * 10),
+        (None, 0, []),       # No crop
+        (None, 0, []),       # Under min_line_conf
+        (None, 0, []),       # Empty crop
+        ("DL3CAF5", 0.8, [0.8] * 7),
+    ]
+
+
+def test_two_row_plates_are_split_and_joined_top_first(recognizer, stub):
+    stub.answers = [("MH12", 0.9), ("AB1234", 0.7)]
+    text, conf, char_confs = recognizer.read_batch([crop(100, 200)])[0]
+
+    assert len(stub.lines) == 2
+    assert text == "MH12AB1234"
+    assert conf == pytest.approx(0.8)
+    assert char_confs == [0.9] * 4 + [0.7] * 6
+
+
+def test_short_reads_are_rejected(recognizer, stub):
+    stub.answers = [("AB12", 0.95)]
+    assert recognizer.read_batch([crop(40, 200)]) == [(None, 0, [])]
+    assert recognizer.read_batch([]) == []
+
+
+def test_only_small_crops_are_upscaled_to_the_minimum_height(recognizer, stub, monkeypatch):
+    heights = []
+    resize = plate_ocr.compute_ratio_and_resize
+
+    def record(image, width, height, model_height):
+        heights.append(image.shape[:2])
+        return resize(image, width, height, model_height)
+
+    monkeypatch.setattr(plate_ocr, "compute_ratio_and_resize", record)
+    stub.answers = [("MH12AB1234", 0.9), ("MH12AB1234", 0.9)]
+    recognizer.read_batch([crop(12, 120), crop(40, 200)])
+    assert heights == [(24, 240), (40, 200)]
+    assert all(line.shape[0] == plate_ocr.imgH for line in stub.lines)
@@ -0,0 +1,126 @@
+import numpy as np
+from gate_pipeline import GatePipeline
+from ocr_consensus import PlateConsensus
+from plate_tracker import PlateTracker
+
+PLATE = "MH12AB1234"
+
+
+def candidate(box=(100, 100, 200, 140)):
+    return {"box": box, "score": 0.9, "blur": 100.0, "crop": np.zeros((40, 100, 3), np.uint8)}
+
+
+class FakeAI:
+    """InferenceService stand-in: a plate while `visible`, low-confidence OCR reads"""
+
+    def __init__(self, char_conf=0.3):
+        self.visible = True
+        self.char_conf = char_conf
+
+    def detect(self, frame, gate_name="", roi=None):
+        return [candidate()] if self.visible else []
+
+    def read_plates(self, crops, gate_name=""):
+        return [(PLATE, self.char_conf, [self.char_conf] * len(PLATE)) for _ in crops]
+
+
+def settings(motion_enabled=True):
+    return {"motion_enabled": motion_enabled, "motion_threshold": 0.02, "roi": ""}
+
+
+def frame(car_x=None):
+    image = np.zeros((240, 320, 3), np.uint8)
+    if car_x is not None:
+        image[100:180, car_x:car_x + 80] = 255
+    return image
+
+
+# --- Consensus ---
+
+def test_consensus_fuses_characters_across_reads():
+    consensus = PlateConsensus(min_reads=2)
+    consensus.add("MH12AB1234", [0.9] * 10, now=0.0)
+    consensus.add("MH12A81234", [0.9] * 5 + [0.4] + [0.9] * 4, now=0.1)
+    consensus.add("MH12AB1234", [0.9] * 10, now=0.2)
+    text, confidence = consensus.fused()
+    assert text == "MH12AB1234"
+    assert 0.5 < confidence < 0.9
+    assert consensus.is_ready(now=0.2) is False  # 1.8 / 3 = 0.6 on the disputed character
+    assert consensus.is_ready(now=2.0) is True   # Time budget
+
+
+def test_consensus_ignores_short_reads():
+    consensus = PlateConsensus(min_length=5)
+    consensus.add("AB1", [0.9] * 3, now=0.0)
+    assert consensus.num_reads == 0
+    assert consensus.fused() == (None, 0.0)
+
+
+# --- Tracker ---
+
+def test_confident_reads_report_the_vehicle_once():
+    tracker = PlateTracker()
+    reported = []
+    for i in range(6):
+        now = i * 0.2
+        for track in tracker.update([candidate()], now):
+            if tracker.needs_ocr(track):
+                track.add_read(PLATE, [0.95] * 10, now)
+        reported += [t.text for t in tracker.ready_tracks(now) if tracker.mark_emitted(t, now)]
+    assert reported == [PLATE]
+
+
+def test_unmatched_track_is_finalized_by_its_time_budget():
+    tracker = PlateTracker()
+    track = tracker.update([candidate()], 0.0)[0]
+    track.add_read(PLATE, [0.3] * 10, 0.0)
+    tracker.update([], 0.5)  # Missed, but not gone yet
+    assert tracker.ready_tracks(1.0) == []
+    assert tracker.ready_tracks(2.5) == [track]
+
+
+def test_expire_ends_tracks_not_seen_for_max_idle_seconds():
+    tracker = PlateTracker(max_idle_seconds=2.0)
+    track = tracker.update([candidate()], 0.0)[0]
+    track.add_read(PLATE, [0.3] * 10, 0.0)
+    tracker.expire(1.0)
+    assert tracker.tracks == [track]
+    tracker.expire(2.5)
+    assert tracker.tracks == [] and tracker.finished == [track]
+    assert tracker.ready_tracks(2.5) == [track]
+    assert track.text == PLATE
+
+
+def test_pending_read_is_reported_after_motion_stops():
+    """Brief vehicle, low-confidence reads, then a static scene: the motion gate stops the
+    detector before the track has missed max_misses frames; the plate must still come out."""
+    ai = FakeAI(char_conf=0.3)
+    pipeline = GatePipeline("Gate", ai, settings(motion_enabled=True))
+    reported = []
+    now = 0.0
+    pipeline.process(frame(), now)  # Background
+
+    # Vehicle moves through the zone for 1.5 s at 2 analyzed frames / s
+    for x in (40, 80, 120):
+        now += 0.5
+        reported += pipeline.process(frame(x), now)[1]
+    # Gone; the scene stays static for 30 s
+    ai.visible = False
+    for _ in range(60):
+        now += 0.5
+        reported += pipeline.process(frame(), now)[1]
+
+    assert [text for text, _ in reported] == [PLATE]
+    assert pipeline.frames_gated.value > 0
+
+
+def test_repeat_of_the_same_plate_is_suppressed():
+    tracker = PlateTracker(repeat_suppress_seconds=30.0)
+    first = tracker.update([candidate()], 0.0)[0]
+    first.add_read(PLATE, [0.95] * 10, 0.0)
+    first.add_read(PLATE, [0.95] * 10, 0.1)
+    assert tracker.mark_emitted(first, 0.1) is True
+    second = tracker.update([candidate((400, 100, 500, 140))], 5.0)
+    new = [t for t in second if t is not first][0]
+    new.text = PLATE
+    assert tracker.mark_emitted(new, 5.0) is False
@@ -0,0 +1,95 @@
+import json
+from types import SimpleNamespace
+import numpy as np
+import pytest
+import torch
+from preprocessing import FramePreprocessor, post_process_detections
+
+transformers = pytest.importorskip("transformers")
+from transformers import RTDetrImageProcessor  # noqa: E402
+
+CONFIG = {
+    "do_normalize": False,
+    "do_pad": False,
+    "do_rescale": True,
+    "do_resize": True,
+    "image_processor_type": "RTDetrImageProcessor",
+    "resample": 2,
+    "rescale_factor": 1 / 255,
+    "size": {"height": 640, "width": 640},
+}
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    (tmp_path / "preprocessor_config.json").write_text(json.dumps(CONFIG), encoding="utf-8")
+    return tmp_path
+
+
+def camera_frame(height, width, seed=0):
+    """Smooth gradients plus noise: close enough to a camera frame for resize comparisons"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 / width, y * 255 / height, (x + y) * 127 / (width + height)], axis=-1)
+    return np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+
+
+def reference_pixels(frame):
+    processor = RTDetrImageProcessor(**CONFIG)
+    rgb = np.ascontiguousarray(frame[:, :, ::-1])
+    return processor(images=[rgb], return_tensors="pt")["pixel_values"]
+
+
+@pytest.mark.parametrize("height,width", [(1080, 1920), (720, 1280), (480, 640)])
+def test_preprocessor_matches_rtdetr_image_processor(model_dir, height, width):
+    frame = camera_frame(height, width)
+    pixel_values, target_sizes = FramePreprocessor(str(model_dir))([frame])
+    expected = reference_pixels(frame)
+
+    assert pixel_values.shape == expected.shape == (1, 3, 640, 640)
+    assert target_sizes.tolist() == [[height, width]]
+    # cv2 INTER_AREA vs PIL's antialiased bilinear: about one gray level on average (plain INTER_LINEAR: ~4 at 1080p)
+    diff = (pixel_values - expected).abs()
+    assert float(diff.mean()) < 1.5 / 255
+    assert float(diff.max()) < 16 / 255
+
+
+def test_preprocessor_reuses_its_buffer_and_grows_with_the_batch(model_dir):
+    preprocessor = FramePreprocessor(str(model_dir), max_batch=1)
+    frames = [camera_frame(720, 1280, seed) for seed in range(3)]
+
+    preprocessor(frames[:1])
+    batch, target_sizes = preprocessor(frames)
+    assert batch.shape == (3, 3, 640, 640)
+    assert target_sizes.shape == (3, 2)
+    again, _ = preprocessor(frames[:1])
+    assert again.data_ptr() == batch.data_ptr()
+    torch.testing.assert_close(again[0], preprocessor(frames)[0][0])
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.3, 0.5])
+def test_post_process_matches_rtdetr_image_processor(threshold):
+    generator = torch.Generator().manual_seed(0)
+    logits = torch.randn(2, 300, 3, generator=generator) * 3
+    pred_boxes = torch.rand(2, 300, 4, generator=generator) * 0.5 + 0.25
+    target_sizes = torch.tensor([[1080, 1920], [480, 640]], dtype=torch.float32)
+
+    results = post_process_detections(logits, pred_boxes, target_sizes, threshold=threshold)
+    expected = RTDetrImageProcessor(**CONFIG).post_process_object_detection(
+        SimpleNamespace(logits=logits, pred_boxes=pred_boxes), threshold=threshold, target_sizes=target_sizes)
+
+    assert len(results) == len(expected) == 2
+    for result, reference in zip(results, expected):
+        torch.testing.assert_close(result["scores"], reference["scores"])
+        torch.testing.assert_close(result["labels"], reference["labels"])
+        torch.testing.assert_close(result["boxes"], reference["boxes"])
+
+
+def test_post_process_scores_are_sorted_and_above_threshold():
+    logits = torch.tensor([[[-5.0], [2.0], [0.5], [-1.0]]])
+    pred_boxes = torch.tensor([[[0.5, 0.5, 0.2, 0.4]] * 4])
+    result = post_process_detections(logits, pred_boxes, torch.tensor([[100.0, 200.0]]), threshold=0.5)[0]
+
+    assert result["scores"].tolist() == sorted(result["scores"].tolist(), reverse=True)
+    assert len(result["scores"]) == 2  # sigmoid(2.0), sigmoid(0.5)
+    torch.testing.assert_close(result["boxes"][0], torch.tensor([80.0, 30.0, 120.0, 70.0]))
@@ -0,0 +1,73 @@
+import tracemalloc
+import cv2
+import numpy as np
+import pytest
+from preview_buffer import PreviewBufferPool, fit_size
+
+FRAME = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+BOX = (480, 270)
+
+
+def peak_growth(render, frames=100):
+    """Peak traced memory above the starting point while rendering (catches freed temporaries too)"""
+    tracemalloc.start()
+    try:
+        render()  # Warm-up outside the measurement
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(frames):
+            render()
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def test_fit_size_keeps_the_aspect_ratio_and_never_upscales():
+    assert fit_size(1920, 1080, 480, 480) == (480, 270)
+    assert fit_size(320, 240, 640, 480) == (320, 240)
+
+
+def test_rendering_does_not_allocate_per_frame():
+    pool = PreviewBufferPool()
+
+    def render():
+        preview = pool.render(FRAME, BOX)
+        preview.release()
+
+    tile_bytes = BOX[0] * BOX[1] * 3
+    assert peak_growth(render) < tile_bytes // 4
+
+
+def test_the_measurement_sees_opencv_allocations():
+    # Control: the naive path (cv2 returning new arrays) must show up
+    def render():
+        cv2.cvtColor(cv2.resize(FRAME, BOX), cv2.COLOR_BGR2RGB)
+
+    assert peak_growth(render) >= BOX[0] * BOX[1] * 3
+
+
+def test_busy_buffers_skip_the_preview_and_a_new_size_reallocates():
+    pool = PreviewBufferPool(slots=2)
+    held = [pool.render(FRAME, BOX) for _ in range(2)]
+    assert pool.render(FRAME, BOX) is None
+    assert pool.frames_skipped == 1
+
+    held[0].release()
+    preview = pool.render(FRAME, BOX)
+    assert preview is not None
+    assert (preview.image.width(), preview.image.height()) == BOX
+
+    small = pool.render(FRAME, (320, 320))  # Tile resized: fresh buffers, old frames stay valid
+    assert (small.image.width(), small.image.height()) == (320, 180)
+    assert held[1].image.width() == BOX[0]
+    for frame in (held[1], preview, small):
+        frame.release()
+
+
+@pytest.mark.parametrize("box", [(1280, 720), (1920, 1080)])
+def test_full_size_tiles_convert_without_resizing(box):
+    pool = PreviewBufferPool()
+    preview = pool.render(FRAME, box)
+    pixels = np.asarray(preview._buffer)
+    np.testing.assert_array_equal(pixels, FRAME[:, :, ::-1])
+    preview.release()